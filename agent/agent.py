@@ -6,10 +6,16 @@ import warnings
 from google.adk import Agent
 from .prompts import agent_prompt
 from .config import Config
+from .shared_libraries.concurrency import adaptive_model
 from .shared_libraries.callbacks import (
     before_agent,
+    after_agent,
     before_tool,
+    after_tool,
     before_model,
+    after_model,
+    sub_agent_before_model,
+    sub_agent_after_model,
 )
 
 from .sub_agents.SQL.agent import sql_generator_agent
@@ -18,7 +24,7 @@ from .sub_agents.Rag.agent import rag_agent
 from .sub_agents.add_to_cart.agent import add_to_cart_agent
 from .sub_agents.product_search.product_search_tools import product_similarity
 
-from .tools import get_customer_profile, update_customer_profile
+from .tools import get_customer_profile, get_review_summary, update_customer_profile
 
 warnings.filterwarnings("ignore", category=UserWarning, module=".*pydantic.*")
 
@@ -29,15 +35,17 @@ logger = logging.getLogger(__name__)
 
 search_agent = Agent(
     name="google_search_agent",
-    model=configs.agent_settings.model,
+    model=adaptive_model(configs.agent_settings.model),
     global_instruction="You help a customer of Maisons du Monde to choose furniture and decoration products.",
     instruction="Your job is to provide info from scopes outside Maisons du Monde. Stay focused on the furniture and decoration topics, ignore not related questions.  Always cite your source.",
     tools=[google_search],
-    output_key="search_results"
+    output_key="search_results",
+    before_model_callback=sub_agent_before_model,
+    after_model_callback=sub_agent_after_model,
 )
 
 root_agent = Agent(
-    model=configs.agent_settings.model,
+    model=adaptive_model(configs.agent_settings.model),
     global_instruction="You help a customer of Maisons du Monde to choose and purchase furniture and decoration products.",
     instruction=agent_prompt(),
     name=configs.agent_settings.name,
@@ -49,9 +57,13 @@ root_agent = Agent(
            AgentTool(agent=search_agent),
            product_similarity,
            get_customer_profile,
-           update_customer_profile
+           update_customer_profile,
+           get_review_summary
            ],
     before_tool_callback=before_tool,
+    after_tool_callback=after_tool,
     before_agent_callback=before_agent,
+    after_agent_callback=after_agent,
     before_model_callback=before_model,
+    after_model_callback=after_model,
 )
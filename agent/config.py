@@ -15,6 +15,158 @@ class AgentModel(BaseModel):
     model: str = Field(default="gemini-2.0-flash-001")
 
 
+class ModelConcurrencyModel(BaseModel):
+    """Adaptive concurrency and retry settings for Gemini calls."""
+
+    initial_limit: int = Field(default=8)
+    min_limit: int = Field(default=1)
+    max_limit: int = Field(default=64)
+    decrease_factor: float = Field(default=0.5)
+    max_retries: int = Field(default=4)
+    backoff_base_secs: float = Field(default=0.5)
+    backoff_max_secs: float = Field(default=20.0)
+    # Static per-session quota enforced by rate_limit_callback, 0 disables it
+    rpm_quota: int = Field(default=10)
+    rate_limit_secs: int = Field(default=60)
+
+
+class QueryModel(BaseModel):
+    """Bounds on the SQL results returned to the model."""
+
+    # "connector" lists the tables through the Integration Connector, "client"
+    # runs the generated SQL with the BigQuery client and the caller's credentials
+    executor: str = Field(default="connector")
+    page_size: int = Field(default=25)
+    max_rows: int = Field(default=200)
+    max_bytes_scanned: int = Field(default=200 * 1024 * 1024)
+    query_timeout_secs: float = Field(default=60.0)
+    # Key signing the `next_page` tokens. When empty, a random key is drawn at
+    # startup, before the workers fork, so tokens stay valid across workers
+    page_token_secret: str = Field(default="")
+    table_stats_path: str = Field(
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/table_stats.json"
+        )
+    )
+    allowed_columns: list[str] = Field(
+        default=[
+            "product_id", "ean_id", "label", "category", "colors",
+            "eur_regular_price", "style", "product_type", "main_material",
+            "product_material", "height", "width", "depth", "weight",
+            "global_rating", "quality rating", "verbatim_synthesis",
+        ]
+    )
+
+
+class AnswerCacheModel(BaseModel):
+    """Semantic cache of whole-turn answers to advice questions."""
+
+    enabled: bool = Field(default=True)
+    embedding_model: str = Field(default="text-embedding-004")
+    embedding_timeout_secs: float = Field(default=5.0)
+    similarity_threshold: float = Field(default=0.92)
+    ttl_secs: int = Field(default=24 * 3600)
+    max_entries_per_language: int = Field(default=512)
+    # A turn is only cached if every tool it called is in this list
+    cacheable_tools: list[str] = Field(default=["ask_rag_agent", "google_search_agent"])
+
+
+class BlockingIOModel(BaseModel):
+    """Thread pool and timeouts of the blocking I/O run off the event loop."""
+
+    pool_size: int = Field(default=16)
+    upload_timeout_secs: float = Field(default=30.0)
+    vision_connect_timeout_secs: float = Field(default=5.0)
+    vision_read_timeout_secs: float = Field(default=30.0)
+    barcode_decode_timeout_secs: float = Field(default=5.0)
+
+
+class SessionModel(BaseModel):
+    """Local session service settings, for self-hosted deployments."""
+
+    db_path: str = Field(
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/sessions.db"
+        )
+    )
+    hot_sessions: int = Field(default=1024)
+    # Pending events of a session are written at the end of the turn, or
+    # earlier once this many are buffered
+    flush_max_events: int = Field(default=64)
+    # Check cached sessions against the database, for workers without session affinity
+    validate_hot_sessions: bool = Field(default=False)
+
+
+class PrefetchModel(BaseModel):
+    """Background prefetch of the products referenced by tool responses."""
+
+    enabled: bool = Field(default=True)
+    max_in_flight: int = Field(default=32)
+    max_per_session: int = Field(default=4)
+    max_products_per_response: int = Field(default=20)
+    # Prefetches still pending after this long are cancelled, whatever the
+    # session service, as the next turn of their session is unlikely to come
+    max_age_secs: float = Field(default=30.0)
+    review_cache_ttl_secs: int = Field(default=3600)
+    stock_cache_ttl_secs: int = Field(default=60)
+    product_cache_ttl_secs: int = Field(default=3600)
+    # Unknown product IDs, often made up by the model, are remembered for less long
+    product_negative_ttl_secs: int = Field(default=300)
+    cache_max_size: int = Field(default=10000)
+
+
+class CatalogModel(BaseModel):
+    """Local catalog snapshot settings."""
+
+    snapshot_path: str = Field(
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/catalog_snapshot.jsonl"
+        )
+    )
+    review_store_path: str = Field(
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/review_aggregates.kv"
+        )
+    )
+    review_synthesis_max_chars: int = Field(default=400)
+    # Delay between two incremental refreshes of the snapshot, 0 disables them
+    refresh_interval_secs: int = Field(default=900)
+    # Delay between two checks of the snapshot file by the workers that do not
+    # run the refresher, when served by `agent.serve`
+    reload_check_secs: int = Field(default=30)
+
+
+class ProfilingModel(BaseModel):
+    """On-demand sampling profiler of single turns."""
+
+    enabled: bool = Field(default=True)
+    output_dir: str = Field(
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/profiles"
+        )
+    )
+    interval_ms: float = Field(default=5.0)
+    max_concurrent: int = Field(default=2)
+    max_samples: int = Field(default=20000)
+    max_output_bytes: int = Field(default=1024 * 1024)
+    max_duration_secs: float = Field(default=300.0)
+
+
+class TokenModel(BaseModel):
+    """Token accounting and per-session budgets."""
+
+    # Prompt plus output tokens a session may use, sub-agents included, 0 disables the budget
+    session_budget: int = Field(default=500_000)
+    max_sessions: int = Field(default=10000)
+    # USD per million (input, output) tokens
+    prices_per_million: dict[str, tuple[float, float]] = Field(
+        default={
+            "gemini-2.0-flash": (0.10, 0.40),
+            "gemini-2.0-flash-001": (0.10, 0.40),
+        }
+    )
+
+
 class Config(BaseSettings):
     """Configuration settings for the customer service agent."""
 
@@ -26,6 +178,15 @@ class Config(BaseSettings):
         case_sensitive=True,
     )
     agent_settings: AgentModel = Field(default=AgentModel())
+    concurrency_settings: ModelConcurrencyModel = Field(default=ModelConcurrencyModel())
+    catalog_settings: CatalogModel = Field(default=CatalogModel())
+    query_settings: QueryModel = Field(default=QueryModel())
+    answer_cache_settings: AnswerCacheModel = Field(default=AnswerCacheModel())
+    io_settings: BlockingIOModel = Field(default=BlockingIOModel())
+    session_settings: SessionModel = Field(default=SessionModel())
+    prefetch_settings: PrefetchModel = Field(default=PrefetchModel())
+    profiling_settings: ProfilingModel = Field(default=ProfilingModel())
+    token_settings: TokenModel = Field(default=TokenModel())
     app_name: str = "agent"
     CLOUD_PROJECT: str = Field(default="data-sandbox-410808")
     CLOUD_LOCATION: str = Field(default="europe-west1")
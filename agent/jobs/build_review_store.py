@@ -0,0 +1,53 @@
+"""Offline job precomputing per-product review aggregates.
+
+Usage:
+    python -m agent.jobs.build_review_store [--input reviews.jsonl] [--output path]
+
+Without --input, the reviews are read from BigQuery.
+"""
+
+import argparse
+import json
+import logging
+
+from agent.config import Config
+from agent.shared_libraries.review_store import aggregate_review_row, write_review_store
+
+logger = logging.getLogger(__name__)
+
+configs = Config()
+
+REVIEWS_TABLE = "data-sandbox-410808.datascience_playground.extract_chairs_reviews_adk"
+
+
+def read_reviews_from_file(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_reviews_from_bigquery():
+    from google.cloud import bigquery
+
+    client = bigquery.Client(project=configs.CLOUD_PROJECT)
+    query = f"SELECT * FROM `{REVIEWS_TABLE}`"
+    for row in client.query(query).result():
+        yield dict(row.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", help="JSON lines export of the reviews table.")
+    parser.add_argument("--output", default=configs.catalog_settings.review_store_path)
+    args = parser.parse_args()
+
+    rows = read_reviews_from_file(args.input) if args.input else read_reviews_from_bigquery()
+    max_chars = configs.catalog_settings.review_synthesis_max_chars
+    summaries = (aggregate_review_row(row, max_chars) for row in rows)
+    count = write_review_store(summaries, args.output)
+    logger.info(f"Review store built with {count} products.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Offline job computing the table statistics used by the SQL guard to
+estimate the bytes scanned by a query.
+
+Usage:
+    python -m agent.jobs.build_table_stats [--output path]
+"""
+
+import argparse
+import json
+import logging
+
+from agent.config import Config
+from agent.sub_agents.BigQuery.sql_guard import DATASET, PROJECT, TABLE_SCHEMAS
+
+logger = logging.getLogger(__name__)
+
+configs = Config()
+
+
+def compute_table_stats(client, table: str) -> dict:
+    """
+    Counts the rows of a table and the average size in bytes of each column.
+    """
+    columns = TABLE_SCHEMAS[table]
+    averages = ",\n".join(
+        f"AVG(BYTE_LENGTH(CAST(`{column}` AS STRING))) AS c{i}"
+        for i, column in enumerate(columns)
+    )
+    query = f"SELECT COUNT(*) AS rows, {averages} FROM `{PROJECT}.{DATASET}.{table}`"
+    row = list(client.query(query).result())[0]
+    return {
+        "rows": row["rows"],
+        "columns": {column: round(row[f"c{i}"] or 0, 1) for i, column in enumerate(columns)},
+    }
+
+
+def main():
+    from google.cloud import bigquery
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", default=configs.query_settings.table_stats_path)
+    args = parser.parse_args()
+
+    client = bigquery.Client(project=configs.CLOUD_PROJECT)
+    stats = {table: compute_table_stats(client, table) for table in TABLE_SCHEMAS}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    logger.info(f"Table statistics written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Offline evaluation of the dynamic SQL generator prompt against the full one.
+
+The coverage check runs without any service: for each pair of the eval set,
+every table, column and French value used by the expected SQL must be in the
+prompt assembled for the question. With `--model`, both prompts also generate
+the SQL of each question, compared with the expected SQL after normalization
+(or on their results with `--execute`), along with the generation latency.
+
+Usage:
+    python -m agent.jobs.eval_sql_prompt [--eval-set path] [--model] [--execute]
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import statistics
+import time
+from typing import List, Optional
+
+import sqlglot
+from sqlglot import exp
+
+from agent.config import Config
+from agent.sub_agents.SQL.prompt_builder import build_sql_prompt, full_sql_prompt, select_sections
+from agent.sub_agents.SQL.prompts import COLORS, MAIN_MATERIALS, PRODUCT_MATERIALS, STYLES
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+EVAL_SET_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sub_agents", "SQL", "eval_set.jsonl"
+)
+
+ENUM_VALUES = set(COLORS) | set(STYLES) | set(MAIN_MATERIALS) | set(PRODUCT_MATERIALS)
+
+SQL_BLOCK_PATTERN = re.compile(r"```(?:sql)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+
+def load_eval_set(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def missing_from_prompt(sql: str, prompt: str) -> List[str]:
+    """
+    Lists the tables, columns and French values of a query absent from a prompt.
+    """
+    tree = sqlglot.parse_one(sql, read="bigquery")
+    needed = {f"{table.db}.{table.name}" for table in tree.find_all(exp.Table)}
+    needed |= {f"`{column.name}`" for column in tree.find_all(exp.Column)}
+    needed |= {
+        f"`{literal.this}`" for literal in tree.find_all(exp.Literal)
+        if literal.is_string and literal.this in ENUM_VALUES
+    }
+    return sorted(item for item in needed if item not in prompt)
+
+
+def check_coverage(pairs: List[dict]) -> dict:
+    full_chars = len(full_sql_prompt())
+    sizes, failures, fallbacks = [], [], 0
+    for pair in pairs:
+        if select_sections(pair["question"]) is None:
+            fallbacks += 1
+        prompt = build_sql_prompt(pair["question"])
+        sizes.append(len(prompt))
+        missing = missing_from_prompt(pair["sql"], prompt)
+        if missing:
+            failures.append({"question": pair["question"], "missing": missing})
+    return {
+        "pairs": len(pairs),
+        "covered": len(pairs) - len(failures),
+        "full_prompt_fallbacks": fallbacks,
+        "full_prompt_chars": full_chars,
+        "avg_prompt_chars": round(statistics.mean(sizes)),
+        "max_prompt_chars": max(sizes),
+        "avg_reduction": round(1 - statistics.mean(sizes) / full_chars, 3),
+        "failures": failures,
+    }
+
+
+def normalize_sql(sql: str) -> Optional[str]:
+    try:
+        return sqlglot.parse_one(sql, read="bigquery").sql(dialect="bigquery", normalize=True, pretty=False)
+    except sqlglot.errors.ParseError:
+        return None
+
+
+def extract_sql(text: str) -> str:
+    match = SQL_BLOCK_PATTERN.search(text or "")
+    return (match.group(1) if match else text or "").strip().rstrip(";")
+
+
+def same_results(client, expected_sql: str, generated_sql: str) -> bool:
+    def rows(sql):
+        return sorted(json.dumps(list(row.values()), default=str) for row in client.query(sql).result())
+
+    try:
+        return rows(expected_sql) == rows(generated_sql)
+    except Exception as e:
+        logger.warning(f"Could not compare results: {e}")
+        return False
+
+
+def compare_generation(pairs: List[dict], execute: bool) -> dict:
+    """
+    Generates the SQL of each question with the full and the dynamic prompt.
+    """
+    from google import genai
+    from google.genai import types
+
+    client = genai.Client(vertexai=True, project=configs.CLOUD_PROJECT, location=configs.CLOUD_LOCATION)
+    bq_client = None
+    if execute:
+        from google.cloud import bigquery
+
+        bq_client = bigquery.Client(project=configs.CLOUD_PROJECT)
+
+    results = {}
+    for variant, prompt_of in (("full", lambda question: full_sql_prompt()), ("dynamic", build_sql_prompt)):
+        correct, latencies, prompt_tokens = 0, [], []
+        for pair in pairs:
+            start = time.perf_counter()
+            response = client.models.generate_content(
+                model="gemini-2.0-flash-001",
+                contents=pair["question"],
+                config=types.GenerateContentConfig(system_instruction=prompt_of(pair["question"]), temperature=0),
+            )
+            latencies.append(time.perf_counter() - start)
+            if response.usage_metadata:
+                prompt_tokens.append(response.usage_metadata.prompt_token_count or 0)
+
+            generated = extract_sql(response.text)
+            if bq_client is not None:
+                ok = same_results(bq_client, pair["sql"], generated)
+            else:
+                ok = normalize_sql(generated) == normalize_sql(pair["sql"])
+            correct += ok
+            if not ok:
+                logger.debug(f"[{variant}] {pair['question']}\n  expected: {pair['sql']}\n  got: {generated}")
+
+        results[variant] = {
+            "accuracy": round(correct / len(pairs), 3),
+            "avg_prompt_tokens": round(statistics.mean(prompt_tokens)) if prompt_tokens else None,
+            "p50_latency_ms": round(statistics.median(latencies) * 1000),
+            "avg_latency_ms": round(statistics.mean(latencies) * 1000),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--eval-set", default=EVAL_SET_PATH)
+    parser.add_argument("--model", action="store_true", help="Also compare the SQL generated with both prompts.")
+    parser.add_argument("--execute", action="store_true", help="Compare the query results on BigQuery.")
+    args = parser.parse_args()
+
+    pairs = load_eval_set(args.eval_set)
+    report = {"coverage": check_coverage(pairs)}
+    if args.model:
+        report["generation"] = compare_generation(pairs, execute=args.execute)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
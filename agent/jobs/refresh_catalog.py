@@ -0,0 +1,26 @@
+"""Offline job refreshing the local catalog snapshot, e.g. from a cron when
+the in-process refresher is disabled. The first run downloads the whole table,
+the next ones only the rows that changed.
+
+Usage:
+    python -m agent.jobs.refresh_catalog
+"""
+
+import argparse
+import logging
+
+from agent.shared_libraries.catalog import refresh_catalog
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.parse_args()
+
+    snapshot = refresh_catalog()
+    logger.info(f"Catalog snapshot at version {snapshot.version} with {len(snapshot.products)} products.")
+
+
+if __name__ == "__main__":
+    main()
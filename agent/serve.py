@@ -0,0 +1,178 @@
+"""Preforked multi-worker server for the agent.
+
+The read-only data (agents, catalog snapshot, review aggregates, table
+statistics) is loaded once in the parent process, which then forks the
+workers: their memory pages are shared copy-on-write, and the review store
+is an `mmap` of the same file. Each worker runs its own event loop on the
+shared listening socket, so CPU-bound work is no longer serialized by a
+single GIL. The model concurrency limits are coordinated through shared memory,
+and the slots of a worker that dies are given back by the supervisor. Only
+the first worker refreshes the catalog from BigQuery, the others reload the
+snapshot file it writes.
+
+Usage:
+    python -m agent.serve [--workers 4] [--host 0.0.0.0] [--port 8000] [--web]
+"""
+
+import argparse
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SESSION_SCHEME = "localsqlite"
+
+
+def preload(workers: int):
+    """
+    Loads everything the workers only read, before forking them.
+    Background threads and connections are created after the fork, by each worker.
+    """
+    from agent import agent  # noqa: F401, builds the agents and imports every tool
+    from agent.shared_libraries.catalog import preload_catalog
+    from agent.shared_libraries.concurrency import registered_models
+    from agent.shared_libraries.review_store import get_review_store
+    from agent.shared_libraries.shared_counters import init_shared_counters
+    from agent.sub_agents.BigQuery.sql_guard import load_table_stats
+
+    start = time.perf_counter()
+    preload_catalog()
+    get_review_store()
+    load_table_stats()
+    init_shared_counters(registered_models(), workers)
+
+    # Objects surviving the preload are never collected, keeping them out of
+    # the GC generations avoids writing to (and copying) their pages in workers
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded shared data in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def _session_service_factory(uri: str, **kwargs):
+    from agent.shared_libraries.session_service import SQLiteSessionService
+
+    # Requests of a session can reach any worker
+    return SQLiteSessionService(validate_hot=True)
+
+
+def run_worker(sock: socket.socket, args: argparse.Namespace, index: int):
+    import uvicorn
+    from google.adk.cli.fast_api import get_fast_api_app
+    from google.adk.cli.service_registry import get_service_registry
+
+    from agent.shared_libraries import metrics
+    from agent.shared_libraries.catalog import start_catalog_refresher, start_catalog_watcher
+    from agent.shared_libraries.shared_counters import get_shared_slots
+    from agent.shared_libraries.token_usage import token_ledger
+
+    random.seed()
+    get_shared_slots().worker_index = index
+    # A single worker queries BigQuery, so every worker serves the same versions
+    if index == 0:
+        start_catalog_refresher()
+    else:
+        start_catalog_watcher()
+    get_service_registry().register_session_service(SESSION_SCHEME, _session_service_factory)
+    app = get_fast_api_app(
+        agents_dir=AGENTS_DIR,
+        session_service_uri=f"{SESSION_SCHEME}://",
+        web=args.web,
+        host=args.host,
+        port=args.port,
+    )
+
+    @app.get("/debug/metrics")
+    def metrics_snapshot():
+        return metrics.snapshot()
+
+    @app.get("/debug/token-usage")
+    def token_usage_report():
+        return {"worker_pid": os.getpid(), **token_ledger.report()}
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def spawn_worker(sock: socket.socket, args: argparse.Namespace, index: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(sock, args, index)
+        except Exception:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    from agent.shared_libraries.shared_counters import get_shared_slots
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--web", action="store_true", help="Also serve the ADK web UI.")
+    args = parser.parse_args()
+
+    preload(args.workers)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers: Dict[int, int] = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(args.workers):
+        workers[spawn_worker(sock, args, index)] = index
+    logger.info(f"Serving on {args.host}:{args.port} with {args.workers} workers")
+
+    # Replaces the workers that die, until asked to stop
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = workers.pop(pid, None)
+        if index is None:
+            continue
+        # Model calls in flight when the worker died never released their slots
+        reclaimed = get_shared_slots().reclaim(index)
+        if reclaimed:
+            logger.warning(f"Gave back {reclaimed} model slots held by worker {index}")
+        if not stopping:
+            logger.warning(f"Worker {index} (pid {pid}) exited with status {status}, restarting it")
+            workers[spawn_worker(sock, args, index)] = index
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
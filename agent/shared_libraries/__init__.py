@@ -1,12 +1,18 @@
 from .callbacks import rate_limit_callback
 from .callbacks import before_tool
 from .callbacks import before_agent
+from .callbacks import after_agent
+from .callbacks import after_model
 from .image_tools import extract_image_part
+from .image_tools import extract_image_parts
 
 
 __all__ = [
     "rate_limit_callback",
     "before_tool",
     "before_agent",
+    "after_agent",
+    "after_model",
     "extract_image_part",
+    "extract_image_parts",
     ]
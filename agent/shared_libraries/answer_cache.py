@@ -0,0 +1,292 @@
+import json
+import logging
+import math
+import operator
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from google import genai
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from agent.config import Config
+from agent.shared_libraries import metrics
+from agent.shared_libraries.blocking_io import run_blocking
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+# Words of the decoration and styling questions answered by the RAG and search
+# agents, in English and French. Only those questions go through the cache
+ADVICE_WORDS = {
+    "advice", "advise", "idea", "ideas", "inspiration", "tip", "tips", "how to", "how do i", "how can i",
+    "mix", "match", "combine", "pair", "decorate", "decoration", "decor", "styling", "trend", "trends",
+    "arrange", "layout", "room", "living room", "dining room", "bedroom", "office", "cosy", "cozy",
+    "conseil", "conseils", "astuce", "astuces", "comment", "associer", "marier", "decorer", "deco",
+    "tendance", "tendances", "amenager", "piece", "salon", "salle a manger", "chambre", "bureau",
+}
+
+# Words of requests about the customer or specific products, answered from
+# their data: never looked up nor stored
+PERSONAL_WORDS = {
+    "my basket", "my cart", "basket", "cart", "panier", "add", "ajoute", "ajouter", "buy", "order",
+    "commande", "acheter", "purchase", "my profile", "profil", "my account", "compte", "price",
+    "prix", "cost", "stock", "review", "reviews", "avis", "rating", "barcode", "ean",
+}
+
+PRODUCT_ID_PATTERN = re.compile(r"\b\d{6,13}\b")
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    embedding: List[float]
+    content: types.Content
+    grounding_metadata: Optional[types.GroundingMetadata]
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class PendingTurn:
+    language: str
+    question: str
+    embedding: List[float]
+    tools: List[str] = field(default_factory=list)
+
+
+class SemanticAnswerCache:
+    """
+    Caches final answers by question embedding, partitioned by language,
+    with TTL and LRU eviction.
+    """
+
+    def __init__(self, similarity_threshold: float, ttl_secs: int, max_entries_per_language: int):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_secs = ttl_secs
+        self.max_entries_per_language = max_entries_per_language
+        self._partitions: Dict[str, OrderedDict] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _record(self, language: str, hit: bool):
+        if hit:
+            self._hits += 1
+        else:
+            self._misses += 1
+        metrics.inc_counter("answer_cache_hits" if hit else "answer_cache_misses", language=language)
+        metrics.set_gauge("answer_cache_hit_rate", self._hits / (self._hits + self._misses))
+
+    def lookup(self, language: str, embedding: List[float]) -> Optional[CachedAnswer]:
+        with self._lock:
+            partition = self._partitions.get(language)
+            if not partition:
+                self._record(language, hit=False)
+                return None
+
+            now = time.time()
+            for key in [k for k, entry in partition.items() if now - entry.created_at > self.ttl_secs]:
+                del partition[key]
+                metrics.inc_counter("answer_cache_expirations", language=language)
+
+            best_key, best_score = None, -1.0
+            for key, entry in partition.items():
+                score = sum(map(operator.mul, entry.embedding, embedding))
+                if score > best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None or best_score < self.similarity_threshold:
+                self._record(language, hit=False)
+                return None
+
+            partition.move_to_end(best_key)
+            self._record(language, hit=True)
+            logger.info(f"Answer cache hit (similarity {best_score:.3f}) for: {partition[best_key].question}")
+            return partition[best_key]
+
+    def store(self, language: str, answer: CachedAnswer):
+        with self._lock:
+            partition = self._partitions.setdefault(language, OrderedDict())
+            partition[answer.question] = answer
+            partition.move_to_end(answer.question)
+            while len(partition) > self.max_entries_per_language:
+                partition.popitem(last=False)
+                metrics.inc_counter("answer_cache_evictions", language=language)
+            metrics.inc_counter("answer_cache_stores", language=language)
+            metrics.set_gauge("answer_cache_entries", len(partition), language=language)
+
+
+answer_cache = SemanticAnswerCache(
+    similarity_threshold=configs.answer_cache_settings.similarity_threshold,
+    ttl_secs=configs.answer_cache_settings.ttl_secs,
+    max_entries_per_language=configs.answer_cache_settings.max_entries_per_language,
+)
+
+# Turns waiting for their final answer, by invocation ID
+_pending: "OrderedDict[str, PendingTurn]" = OrderedDict()
+_MAX_PENDING = 1024
+
+_genai_client: Optional[genai.Client] = None
+
+
+def embed_question(question: str) -> List[float]:
+    """
+    Embeds a question and returns the L2-normalised vector.
+    """
+    global _genai_client
+    if _genai_client is None:
+        _genai_client = genai.Client(
+            vertexai=True, project=configs.CLOUD_PROJECT, location=configs.CLOUD_LOCATION
+        )
+    response = _genai_client.models.embed_content(
+        model=configs.answer_cache_settings.embedding_model,
+        contents=[question],
+    )
+    vector = response.embeddings[0].values
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def get_preferred_language(callback_context: CallbackContext) -> str:
+    profile = callback_context.state.get("customer:profile", {})
+    if isinstance(profile, str):
+        try:
+            profile = json.loads(profile)
+        except json.JSONDecodeError:
+            profile = {}
+    return profile.get("preferred_language") or "en"
+
+
+def _text(content: types.Content) -> Optional[str]:
+    """
+    Returns the text of a user message, or None if it carries something else
+    than text (images, tool responses).
+    """
+    if content.role != "user" or not content.parts:
+        return None
+    if any(part.text is None for part in content.parts):
+        return None
+    return " ".join(part.text.strip() for part in content.parts).strip() or None
+
+
+def _new_user_question(llm_request: LlmRequest) -> Optional[str]:
+    """
+    Returns the text of the user message starting the turn, or None if the
+    request follows a tool call or the message carries something else than text.
+    """
+    if not llm_request.contents:
+        return None
+    return _text(llm_request.contents[-1])
+
+
+def _previous_user_question(llm_request: LlmRequest) -> Optional[str]:
+    for content in reversed(llm_request.contents[:-1]):
+        if content.role == "user" and not any(part.function_response for part in content.parts or []):
+            return _text(content) or ""
+    return None
+
+
+def is_advice_question(question: str) -> bool:
+    """
+    Tells if a question looks like a non-personalized decoration or styling
+    question, without calling any model.
+    """
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    if PRODUCT_ID_PATTERN.search(text):
+        return False
+    text = f" {re.sub(r'[^a-z0-9 ]+', ' ', text)} "
+    text = re.sub(r" +", " ", text)
+    if any(f" {word} " in text for word in PERSONAL_WORDS):
+        return False
+    return any(f" {word} " in text for word in ADVICE_WORDS)
+
+
+def cache_key(llm_request: LlmRequest) -> Optional[str]:
+    """
+    Returns the text the turn is cached under: the question, preceded by the
+    previous user message if any, as follow-ups like "and in blue?" only make
+    sense with it. None if the turn is not an advice question.
+    """
+    question = _new_user_question(llm_request)
+    if question is None or not is_advice_question(question):
+        return None
+    previous = _previous_user_question(llm_request)
+    if previous is None:
+        return question
+    if not previous:
+        # The previous message was an image, the question may refer to it
+        return None
+    return f"{previous}\n{question}"
+
+
+async def answer_cache_lookup(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    """
+    Answers the turn from the cache when a similar question was already answered.
+    On a miss, remembers the question so the final answer can be stored.
+    Only advice questions are embedded, other turns skip the cache at no cost.
+    """
+    if not configs.answer_cache_settings.enabled:
+        return None
+
+    question = cache_key(llm_request)
+    if question is None:
+        metrics.inc_counter("answer_cache_skipped")
+        return None
+
+    language = get_preferred_language(callback_context)
+    embedding = await run_blocking(embed_question, question, timeout=configs.answer_cache_settings.embedding_timeout_secs)
+    cached = answer_cache.lookup(language, embedding)
+    if cached is not None:
+        return LlmResponse(content=cached.content, grounding_metadata=cached.grounding_metadata)
+
+    _pending[callback_context.invocation_id] = PendingTurn(language, question, embedding)
+    while len(_pending) > _MAX_PENDING:
+        _pending.popitem(last=False)
+    return None
+
+
+def answer_cache_record_tool(tool_name: str, invocation_id: str):
+    """
+    Records a tool called during a pending turn, to decide if its answer is cacheable.
+    """
+    pending = _pending.get(invocation_id)
+    if pending is not None:
+        pending.tools.append(tool_name)
+
+
+def answer_cache_store(callback_context: CallbackContext, llm_response: LlmResponse):
+    """
+    Stores the final answer of a turn, if it only used advice tools.
+    Turns touching the basket or the customer profile are never cached.
+    """
+    if llm_response.partial or not llm_response.content or not llm_response.content.parts:
+        return
+    if any(part.function_call for part in llm_response.content.parts):
+        return
+
+    pending = _pending.pop(callback_context.invocation_id, None)
+    if pending is None or not pending.tools:
+        return
+
+    cacheable_tools = set(configs.answer_cache_settings.cacheable_tools)
+    if not set(pending.tools) <= cacheable_tools:
+        logger.debug(f"Answer not cached, personalized tools used: {pending.tools}")
+        return
+
+    answer_cache.store(pending.language, CachedAnswer(
+        question=pending.question,
+        embedding=pending.embedding,
+        content=llm_response.content,
+        grounding_metadata=llm_response.grounding_metadata,
+    ))
@@ -0,0 +1,52 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from agent.config import Config
+from agent.shared_libraries import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the bounded thread pool shared by all blocking calls.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=configs.io_settings.pool_size,
+            thread_name_prefix="blocking-io",
+        )
+    return _executor
+
+
+async def run_blocking(func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    Runs a blocking function in the shared thread pool so the event loop keeps
+    serving other sessions.
+
+    Args:
+        func: The blocking function.
+        timeout (float): Seconds to wait for the result. On timeout or
+            cancellation the caller stops waiting, and the call is dropped if
+            it has not started yet.
+
+    Raises:
+        asyncio.TimeoutError: If the call takes longer than `timeout`.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        metrics.inc_counter("blocking_io_timeouts", function=func.__name__)
+        logger.warning(f"{func.__name__} timed out after {timeout}s")
+        raise
@@ -2,19 +2,47 @@ import logging
 import time
 
 from google.adk.agents.callback_context import CallbackContext
-from google.adk.models import LlmRequest
-from typing import Any, Dict
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+from typing import Any, Dict, Optional
 from google.adk.tools import BaseTool
 from google.adk.agents.invocation_context import InvocationContext
+from agent.config import Config
 from agent.entities.customer import Customer
 
-from agent.shared_libraries.image_tools import extract_image_part, upload_image_to_gcs
+from agent.shared_libraries.answer_cache import (
+    answer_cache_lookup,
+    answer_cache_record_tool,
+    answer_cache_store,
+)
+from agent.shared_libraries.blocking_io import run_blocking
+from agent.shared_libraries.catalog import lookup_product_by_ean
+from agent.shared_libraries.prefetch import prefetch_from_tool_response
+from agent.shared_libraries.profiling import start_turn_profile, stop_turn_profile, track_tool_task
+from agent.shared_libraries.token_usage import (
+    SESSION_USAGE_KEY,
+    begin_turn,
+    check_token_budget,
+    end_turn,
+    note_model_call,
+    record_token_usage,
+)
+from agent.shared_libraries.image_tools import (
+    decode_ean13,
+    extract_image_parts,
+    extract_new_image_part,
+    upload_images_to_gcs_async,
+)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-RATE_LIMIT_SECS = 60
-RPM_QUOTA = 10
+configs = Config()
+
+# Overload protection is handled by the adaptive limiter in concurrency.py,
+# this static per-session quota is disabled when RPM_QUOTA is 0.
+RATE_LIMIT_SECS = configs.concurrency_settings.rate_limit_secs
+RPM_QUOTA = configs.concurrency_settings.rpm_quota
 
 
 def rate_limit_callback(
@@ -53,7 +81,7 @@ def rate_limit_callback(
         elapsed_secs,
     )
 
-    if request_count > RPM_QUOTA:
+    if RPM_QUOTA and request_count > RPM_QUOTA:
         delay = RATE_LIMIT_SECS - elapsed_secs + 1
         if delay > 0:
             logger.debug("Sleeping for %i seconds", delay)
@@ -84,42 +112,185 @@ def before_tool(
     tool: BaseTool, args: Dict[str, Any], tool_context: CallbackContext
 ):
     """
-    Callback before a tool is called. Transforms all input args to lowercase.
+    Callback before a tool is called. Transforms all input args to lowercase
+    and records the tool for the answer cache.
     """
+    track_tool_task()
     lowercase_value(args)
+    answer_cache_record_tool(tool.name, tool_context.invocation_id)
+
+
+def after_tool(
+    tool: BaseTool, args: Dict[str, Any], tool_context: CallbackContext, tool_response: Any
+):
+    """
+    Callback after a tool is called. Prefetches the products mentioned in the
+    response, as the next turn usually asks about them.
+    """
+    try:
+        prefetch_from_tool_response(tool_context.session.id, tool_response)
+    except Exception as e:
+        logger.warning(f"Prefetch scheduling failed: {e}")
 
 
 def before_agent(callback_context: InvocationContext):
     """
     Ensures a customer profile is loaded into state before the agent runs.
     Also extracts and uploads any image in the original request to GCS.
+    Starts the profiler if the session asked for it.
     """
+    start_turn_profile(callback_context)
+    begin_turn(callback_context)
+
     if "customer:profile" not in callback_context.state:
         callback_context.state["customer:profile"] = Customer.get_customer("123").to_json()
 
     logger.info("Loaded customer profile: %s", callback_context.state["customer:profile"])
 
 
-def before_model(callback_context: CallbackContext, llm_request: LlmRequest) -> None:
+def after_agent(callback_context: CallbackContext):
+    """
+    Writes the profile of the turn, if it was profiled.
+    """
+    end_turn(callback_context)
+    try:
+        stop_turn_profile(callback_context)
+    except Exception as e:
+        logger.warning(f"Writing the turn profile failed: {e}")
+
+
+async def barcode_callback(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    """
+    Decodes EAN-13 barcodes in a freshly uploaded image and resolves them
+    against the local catalog. When a product is found the model call is
+    skipped and the product is answered directly. The image is decoded in
+    the blocking I/O thread pool.
+
+    Returns:
+        LlmResponse: The answer for the barcode, or None to let the model run.
+    """
+    image_bytes = extract_new_image_part(llm_request)
+    if not image_bytes:
+        return None
+
+    ean_ids = await run_blocking(
+        decode_ean13, image_bytes, timeout=configs.io_settings.barcode_decode_timeout_secs
+    )
+    for ean_id in ean_ids:
+        product = lookup_product_by_ean(ean_id)
+        if product is None:
+            logger.info(f"EAN {ean_id} not found in the catalog snapshot.")
+            continue
+
+        logger.info(f"Barcode {ean_id} resolved to product {product['product_id']}")
+        callback_context.state["barcode_product"] = product
+        text = (
+            f"I found the product matching this barcode: {product.get('label')} "
+            f"(product ID {product['product_id']}), "
+            f"at {product.get('eur_regular_price')} €."
+        )
+        return LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=text)])
+        )
+
+    return None
+
+
+async def before_model(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    # Token budget logic
+    budget_response = check_token_budget(callback_context, llm_request)
+    if budget_response is not None:
+        return budget_response
+    note_model_call(llm_request)
+
     # Rate limiting logic
     logger.info("Starting rate_limit_callback")
     rate_limit_callback(callback_context, llm_request)
     logger.info("Finished rate_limit_callback")
 
+    # Barcode logic, the LLM path is only used when decoding fails
+    try:
+        barcode_response = await barcode_callback(callback_context, llm_request)
+        if barcode_response is not None:
+            return barcode_response
+    except Exception as e:
+        logger.warning(f"Barcode lookup failed: {e}")
+
+    # Answer cache logic, for advice questions already answered
+    try:
+        cached_response = await answer_cache_lookup(callback_context, llm_request)
+        if cached_response is not None:
+            return cached_response
+    except Exception as e:
+        logger.warning(f"Answer cache lookup failed: {e}")
+
     # Image upload logic
     try:
         if llm_request:
-            logger.info("Attempting to upload image to GCS...")
-            image_bytes = extract_image_part(llm_request)
-            if image_bytes:
-                logger.info("Image bytes extracted, uploading...")
-                gcs_uri = upload_image_to_gcs(image_bytes)
-                logger.info(f"Uploaded image to GCS: {gcs_uri}")
-                callback_context.state["uploaded_image_gcs_uri"] = gcs_uri
-                logger.info(f"Image uploaded successfully: {gcs_uri}")
+            logger.info("Attempting to upload images to GCS...")
+            images = extract_image_parts(llm_request, latest_only=True)
+            if images:
+                logger.info(f"{len(images)} image(s) extracted, uploading...")
+                gcs_uris = await upload_images_to_gcs_async(images)
+                callback_context.state["uploaded_image_gcs_uris"] = gcs_uris
+                callback_context.state["uploaded_image_gcs_uri"] = gcs_uris[0]
+                logger.info(f"Images uploaded successfully: {gcs_uris}")
             else:
                 logger.info("No image found in user request.")
         else:
             logger.warning("No original_request found in callback_context.")
     except Exception as e:
         logger.warning(f"Image upload failed: {e}")
+
+
+def after_model(
+    callback_context: CallbackContext, llm_response: LlmResponse
+) -> Optional[LlmResponse]:
+    """
+    Callback after the model answers. Records the tokens used and stores
+    cacheable final answers.
+    """
+    try:
+        session_total = record_token_usage(callback_context, llm_response)
+        if session_total is not None:
+            callback_context.state[SESSION_USAGE_KEY] = session_total
+    except Exception as e:
+        logger.warning(f"Token accounting failed: {e}")
+
+    try:
+        answer_cache_store(callback_context, llm_response)
+    except Exception as e:
+        logger.warning(f"Answer cache store failed: {e}")
+    return None
+
+
+def sub_agent_before_model(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    """
+    Callback before the model of a sub-agent is called: token budget of the
+    turn's session and rate limit.
+    """
+    budget_response = check_token_budget(callback_context, llm_request)
+    if budget_response is not None:
+        return budget_response
+    note_model_call(llm_request)
+    rate_limit_callback(callback_context, llm_request)
+    return None
+
+
+def sub_agent_after_model(
+    callback_context: CallbackContext, llm_response: LlmResponse
+) -> Optional[LlmResponse]:
+    """
+    Callback after the model of a sub-agent answers. Records the tokens used.
+    """
+    try:
+        record_token_usage(callback_context, llm_response)
+    except Exception as e:
+        logger.warning(f"Token accounting failed: {e}")
+    return None
@@ -0,0 +1,380 @@
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from agent.config import Config
+from agent.shared_libraries import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+CATALOG_TABLE = "data-sandbox-410808.datascience_playground.extract_chairs_adk"
+
+# Product IDs per query when downloading changed rows
+_FETCH_BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """
+    One immutable version of the catalog. A refresh builds a new snapshot and
+    swaps the module reference, readers holding the previous one are unaffected.
+    """
+
+    version: int
+    refreshed_at: float
+    products: Dict[str, dict]
+    hashes: Dict[str, str]
+    ean_index: Dict[str, str]
+
+    @property
+    def age_secs(self) -> float:
+        return time.time() - self.refreshed_at if self.refreshed_at else float("inf")
+
+
+EMPTY_SNAPSHOT = CatalogSnapshot(version=0, refreshed_at=0.0, products={}, hashes={}, ean_index={})
+
+_snapshot: Optional[CatalogSnapshot] = None
+_load_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_refresher: Optional[threading.Thread] = None
+_watcher: Optional[threading.Thread] = None
+
+
+def load_catalog_snapshot(path: str) -> CatalogSnapshot:
+    """
+    Loads a local snapshot of `extract_chairs_adk`, stored as one JSON row per line.
+    The first line holds the snapshot metadata: {"_meta": {"version", "refreshed_at"}},
+    and each row carries the `_row_hash` it had in BigQuery.
+
+    Args:
+        path (str): Path of the snapshot file.
+
+    Returns:
+        CatalogSnapshot: The catalog. Empty if the snapshot is missing.
+    """
+    if not os.path.exists(path):
+        logger.warning(f"Catalog snapshot not found at {path}")
+        return EMPTY_SNAPSHOT
+
+    meta = {}
+    products, hashes = {}, {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if "_meta" in row:
+                meta = row["_meta"]
+                continue
+            product_id = str(row["product_id"])
+            hashes[product_id] = row.pop("_row_hash", "")
+            products[product_id] = row
+
+    logger.info(f"Loaded {len(products)} catalog rows from {path} (version {meta.get('version', 0)})")
+    return CatalogSnapshot(
+        version=meta.get("version", 0),
+        refreshed_at=meta.get("refreshed_at", os.path.getmtime(path)),
+        products=products,
+        hashes=hashes,
+        ean_index=build_ean_index(products.values()),
+    )
+
+
+def write_catalog_snapshot(snapshot: CatalogSnapshot, path: str):
+    """
+    Writes a snapshot next to the current file and renames it over it, so a
+    crash mid-write never leaves a truncated catalog.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"_meta": {"version": snapshot.version, "refreshed_at": snapshot.refreshed_at}}) + "\n")
+        for product_id, row in snapshot.products.items():
+            f.write(json.dumps({**row, "_row_hash": snapshot.hashes.get(product_id, "")}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def build_ean_index(rows: Iterable[dict]) -> Dict[str, str]:
+    """
+    Builds an `ean_id -> product_id` hash index from catalog rows.
+    """
+    index = {}
+    for row in rows:
+        ean_id = row.get("ean_id")
+        if ean_id:
+            index[str(ean_id).strip()] = str(row["product_id"])
+    return index
+
+
+def diff_hashes(local: Dict[str, str], remote: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    """
+    Compares the row hashes of the snapshot with the ones of the table.
+
+    Returns:
+        tuple: The new or changed product IDs, and the deleted ones.
+    """
+    changed = [product_id for product_id, row_hash in remote.items() if local.get(product_id) != row_hash]
+    deleted = [product_id for product_id in local if product_id not in remote]
+    return changed, deleted
+
+
+def apply_delta(
+    snapshot: CatalogSnapshot,
+    changed_rows: List[dict],
+    deleted_ids: List[str],
+    remote_hashes: Dict[str, str],
+) -> CatalogSnapshot:
+    """
+    Builds the next version of a snapshot with copy-on-write: the indexes are
+    shallow-copied and patched, unchanged rows are shared with the previous version.
+    """
+    products = dict(snapshot.products)
+    ean_index = dict(snapshot.ean_index)
+
+    for product_id in deleted_ids + [str(row["product_id"]) for row in changed_rows]:
+        previous = products.pop(product_id, None)
+        if previous and previous.get("ean_id"):
+            ean_index.pop(str(previous["ean_id"]).strip(), None)
+
+    for row in changed_rows:
+        product_id = str(row["product_id"])
+        products[product_id] = row
+        if row.get("ean_id"):
+            ean_index[str(row["ean_id"]).strip()] = product_id
+
+    hashes = {product_id: remote_hashes[product_id] for product_id in products if product_id in remote_hashes}
+    return CatalogSnapshot(
+        version=snapshot.version + 1,
+        refreshed_at=time.time(),
+        products=products,
+        hashes=hashes,
+        ean_index=ean_index,
+    )
+
+
+def _to_json_row(row) -> dict:
+    return {
+        key: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        for key, value in row.items()
+    }
+
+
+def fetch_remote_hashes(client) -> Dict[str, str]:
+    """
+    Reads the hash of every row of the catalog table. Only the IDs and hashes
+    are downloaded, the rows themselves are fetched for the changed products only.
+    """
+    query = (
+        "SELECT CAST(product_id AS STRING) AS product_id, "
+        f"TO_HEX(MD5(TO_JSON_STRING(t))) AS row_hash FROM `{CATALOG_TABLE}` AS t"
+    )
+    return {row["product_id"]: row["row_hash"] for row in client.query(query).result()}
+
+
+def fetch_rows(client, product_ids: List[str]) -> List[dict]:
+    """
+    Downloads the catalog rows of the given products.
+    """
+    from google.cloud import bigquery
+
+    rows = []
+    query = f"SELECT * FROM `{CATALOG_TABLE}` WHERE CAST(product_id AS STRING) IN UNNEST(@product_ids)"
+    for start in range(0, len(product_ids), _FETCH_BATCH_SIZE):
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ArrayQueryParameter("product_ids", "STRING", product_ids[start:start + _FETCH_BATCH_SIZE]),
+        ])
+        rows += [_to_json_row(row) for row in client.query(query, job_config=job_config).result()]
+    return rows
+
+
+def publish_snapshot_metrics(snapshot: Optional[CatalogSnapshot] = None):
+    snapshot = snapshot or _snapshot or EMPTY_SNAPSHOT
+    metrics.set_gauge("catalog_snapshot_version", snapshot.version)
+    metrics.set_gauge("catalog_snapshot_age_secs", snapshot.age_secs if snapshot.refreshed_at else -1)
+    metrics.set_gauge("catalog_snapshot_rows", len(snapshot.products))
+
+
+def refresh_catalog(client=None) -> CatalogSnapshot:
+    """
+    Pulls the rows changed since the current snapshot, applies them to a new
+    version and swaps it in. The file on disk is rewritten even if nothing
+    changed, so other processes and the next run see the new refresh time.
+    Does not start the refresher thread, so one-shot jobs can call it.
+
+    Args:
+        client: BigQuery client, a new one is created if None.
+
+    Returns:
+        CatalogSnapshot: The snapshot now being served.
+    """
+    global _snapshot
+    with _refresh_lock:
+        if client is None:
+            from google.cloud import bigquery
+
+            client = bigquery.Client(project=configs.CLOUD_PROJECT)
+
+        current = preload_catalog()
+        start = time.perf_counter()
+        remote_hashes = fetch_remote_hashes(client)
+        changed_ids, deleted_ids = diff_hashes(current.hashes, remote_hashes)
+
+        if not changed_ids and not deleted_ids:
+            _snapshot = replace(current, refreshed_at=time.time())
+        else:
+            changed_rows = fetch_rows(client, changed_ids)
+            _snapshot = apply_delta(current, changed_rows, deleted_ids, remote_hashes)
+            metrics.inc_counter("catalog_rows_changed", len(changed_rows))
+            metrics.inc_counter("catalog_rows_deleted", len(deleted_ids))
+        write_catalog_snapshot(_snapshot, configs.catalog_settings.snapshot_path)
+
+        logger.info(
+            f"Catalog refreshed to version {_snapshot.version}: {len(changed_ids)} changed, "
+            f"{len(deleted_ids)} deleted ({(time.perf_counter() - start) * 1000:.0f} ms)"
+        )
+        publish_snapshot_metrics(_snapshot)
+        return _snapshot
+
+
+def _refresh_loop(interval: float):
+    while True:
+        time.sleep(max(0.0, interval - get_snapshot().age_secs))
+        try:
+            refresh_catalog()
+        except Exception as e:
+            metrics.inc_counter("catalog_refresh_failures")
+            logger.warning(f"Catalog refresh failed, serving version {get_snapshot().version}: {e}")
+            publish_snapshot_metrics()
+            time.sleep(interval)
+
+
+def start_catalog_refresher():
+    """
+    Starts the background thread refreshing the snapshot every
+    `refresh_interval_secs`. Does nothing if the interval is 0.
+    """
+    global _refresher
+    interval = configs.catalog_settings.refresh_interval_secs
+    if interval <= 0 or _refresher is not None:
+        return
+    _refresher = threading.Thread(target=_refresh_loop, args=(interval,), name="catalog-refresh", daemon=True)
+    _refresher.start()
+
+
+def read_snapshot_meta(path: str) -> dict:
+    """
+    Reads the metadata line of a snapshot file, without loading the rows.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        row = json.loads(f.readline() or "{}")
+    return row.get("_meta", {})
+
+
+def reload_catalog_if_changed() -> CatalogSnapshot:
+    """
+    Picks up the snapshot written by the process running the refresher: the
+    rows are only loaded again when the version changed.
+    """
+    global _snapshot
+    path = configs.catalog_settings.snapshot_path
+    meta = read_snapshot_meta(path)
+    current = preload_catalog()
+    if not meta:
+        return current
+    if meta.get("version", 0) != current.version:
+        snapshot = load_catalog_snapshot(path)
+    elif meta.get("refreshed_at", 0.0) != current.refreshed_at:
+        snapshot = replace(current, refreshed_at=meta["refreshed_at"])
+    else:
+        return current
+    with _refresh_lock:
+        _snapshot = snapshot
+    publish_snapshot_metrics(snapshot)
+    return snapshot
+
+
+def _watch_loop(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            reload_catalog_if_changed()
+        except Exception as e:
+            logger.warning(f"Catalog reload failed, serving version {get_snapshot().version}: {e}")
+
+
+def start_catalog_watcher():
+    """
+    Starts the background thread reloading the snapshot file when another
+    process refreshed it, for the workers that do not run the refresher.
+    """
+    global _watcher
+    interval = configs.catalog_settings.reload_check_secs
+    if interval <= 0 or _watcher is not None or _refresher is not None:
+        return
+    _watcher = threading.Thread(target=_watch_loop, args=(interval,), name="catalog-watch", daemon=True)
+    _watcher.start()
+
+
+def preload_catalog() -> CatalogSnapshot:
+    """
+    Loads the snapshot without starting the refresher thread, for a serving
+    process about to fork its workers (one of which then calls
+    `start_catalog_refresher`, the others `start_catalog_watcher`).
+    """
+    global _snapshot
+    with _load_lock:
+        if _snapshot is None:
+            _snapshot = load_catalog_snapshot(configs.catalog_settings.snapshot_path)
+            publish_snapshot_metrics(_snapshot)
+    return _snapshot
+
+
+def get_snapshot() -> CatalogSnapshot:
+    """
+    Returns the snapshot currently served, loaded from disk on first use.
+    """
+    global _snapshot
+    if _snapshot is None:
+        with _load_lock:
+            if _snapshot is None:
+                _snapshot = load_catalog_snapshot(configs.catalog_settings.snapshot_path)
+                publish_snapshot_metrics(_snapshot)
+                start_catalog_refresher()
+    return _snapshot
+
+
+def get_product(product_id: str) -> Optional[dict]:
+    """
+    Returns the catalog row of a product, or None if it is not in the snapshot.
+    """
+    return get_snapshot().products.get(str(product_id))
+
+
+def lookup_product_by_ean(ean_id: str) -> Optional[dict]:
+    """
+    Resolves an EAN code to its catalog row through the in-memory index.
+
+    Args:
+        ean_id (str): EAN-13 code, as decoded from a barcode.
+
+    Returns:
+        dict: The catalog row of the product, or None if the EAN is unknown.
+    """
+    # Both lookups must go to the same version
+    snapshot = get_snapshot()
+    product_id = snapshot.ean_index.get(ean_id)
+    if product_id is None:
+        return None
+    return snapshot.products.get(product_id)
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import queue
+import random
+import threading
+import time
+from typing import AsyncGenerator, Dict, List, Optional, Set
+
+from google.adk.models import Gemini, LlmRequest, LlmResponse
+
+from agent.config import Config
+from agent.shared_libraries import metrics
+from agent.shared_libraries.shared_counters import get_shared_counters, get_shared_slots
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class AIMDLimiter:
+    """
+    Caps the number of in-flight requests to a model. The cap grows additively
+    on success and shrinks multiplicatively on overload (429 / 5xx).
+
+    When the agent is served by several workers, the total number of in-flight
+    requests to the model is also capped to `max_limit` through shared memory,
+    and an overload seen by one worker lowers the limit of all of them. Waiting
+    for a shared slot happens in a thread of the limiter, not on the event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        decrease_factor: float = 0.5,
+        decrease_cooldown_secs: float = 1.0,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown_secs = decrease_cooldown_secs
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._overloads_key = f"overloads:{name}"
+        shared = get_shared_counters()
+        self._seen_overloads = shared.get(self._overloads_key) if shared and self._overloads_key in shared else 0
+        self._condition = asyncio.Condition()
+        self._slot_waiters: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._slot_thread: Optional[threading.Thread] = None
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _publish(self):
+        metrics.set_gauge("model_concurrency_limit", self.limit, model=self.name)
+        metrics.set_gauge("model_in_flight", self._in_flight, model=self.name)
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+            self._publish()
+
+        slots = get_shared_slots()
+        if slots is not None and self.name in slots:
+            try:
+                await self._acquire_shared(slots)
+            except asyncio.CancelledError:
+                async with self._condition:
+                    self._in_flight -= 1
+                    self._publish()
+                    self._condition.notify_all()
+                raise
+
+    async def _acquire_shared(self, slots):
+        if slots.acquire(self.name, self.max_limit, timeout=0):
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._slot_waiters.put((loop, future))
+        if self._slot_thread is None:
+            self._slot_thread = threading.Thread(
+                target=self._wait_for_slots, args=(slots,), name=f"slots-{self.name}", daemon=True
+            )
+            self._slot_thread.start()
+        await future
+
+    def _wait_for_slots(self, slots):
+        """
+        Hands the shared slots to the waiting requests of this worker, in order.
+        """
+        while True:
+            loop, future = self._slot_waiters.get()
+            if future.done():
+                continue
+            slots.acquire(self.name, self.max_limit)
+            loop.call_soon_threadsafe(self._hand_over, slots, future)
+
+    def _hand_over(self, slots, future: asyncio.Future):
+        if future.cancelled():
+            slots.release(self.name)
+        else:
+            future.set_result(None)
+
+    def _overloaded_elsewhere(self, shared) -> bool:
+        overloads = shared.get(self._overloads_key)
+        seen, self._seen_overloads = self._seen_overloads, overloads
+        return overloads > seen
+
+    async def release(self, outcome: str = "success"):
+        """
+        Frees a slot and adapts the limit to the outcome of the request:
+        "success", "overload" or "error" (which leaves the limit unchanged).
+        """
+        slots = get_shared_slots()
+        if slots is not None and self.name in slots:
+            slots.release(self.name)
+        shared = get_shared_counters()
+        if shared is not None and self._overloads_key in shared:
+            if outcome == "overload":
+                self._seen_overloads = shared.add(self._overloads_key)
+            elif self._overloaded_elsewhere(shared):
+                outcome = "overload"
+
+        async with self._condition:
+            self._in_flight -= 1
+            if outcome == "overload":
+                # A burst of errors from the same congestion only counts once
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_cooldown_secs:
+                    self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+                    self._last_decrease = now
+                    logger.info(f"Concurrency limit for {self.name} lowered to {self.limit}")
+            elif outcome == "success":
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._publish()
+            self._condition.notify_all()
+
+
+_limiters: Dict[str, AIMDLimiter] = {}
+
+# Models of the agents, to allocate their shared slots before forking workers
+_models: Set[str] = set()
+
+
+def get_limiter(model: str) -> AIMDLimiter:
+    """
+    Returns the limiter shared by every agent using the given model.
+    """
+    if model not in _limiters:
+        settings = configs.concurrency_settings
+        _limiters[model] = AIMDLimiter(
+            name=model,
+            initial_limit=settings.initial_limit,
+            min_limit=settings.min_limit,
+            max_limit=settings.max_limit,
+            decrease_factor=settings.decrease_factor,
+        )
+    return _limiters[model]
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Checks if an error is a quota (429) or server (5xx) error from the model backend.
+    """
+    return getattr(error, "code", None) in RETRYABLE_STATUS_CODES
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter.
+    """
+    settings = configs.concurrency_settings
+    cap = min(settings.backoff_max_secs, settings.backoff_base_secs * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+class AdaptiveGemini(Gemini):
+    """
+    Gemini model whose calls go through the model's AIMD limiter and are
+    retried with jittered backoff on 429 and 5xx errors.
+    """
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        limiter = get_limiter(self.model)
+        max_retries = configs.concurrency_settings.max_retries
+        attempt = 0
+
+        # The slot is given back before yielding: ADK runs the tools while this
+        # generator is paused, and the sub-agents they call go through the same
+        # limiter. A streamed call only holds it until its first chunk.
+        while True:
+            await limiter.acquire()
+            outcome = "error"
+            responses = super().generate_content_async(llm_request, stream)
+            received = []
+            try:
+                if stream:
+                    async for llm_response in responses:
+                        received.append(llm_response)
+                        break
+                else:
+                    received = [llm_response async for llm_response in responses]
+                outcome = "success"
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                outcome = "overload"
+                metrics.inc_counter("model_overloads", model=self.model)
+                if attempt >= max_retries:
+                    raise
+                metrics.inc_counter("model_retries", model=self.model)
+                logger.warning(f"{self.model} returned {e.code}, retry {attempt + 1}/{max_retries}")
+            finally:
+                await limiter.release(outcome)
+
+            if outcome == "success":
+                break
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+        for llm_response in received:
+            yield llm_response
+        if stream:
+            # Partial streamed responses cannot be replayed, errors past the first chunk are raised
+            async for llm_response in responses:
+                yield llm_response
+
+
+def adaptive_model(model: str) -> AdaptiveGemini:
+    """
+    Builds the model of an agent, e.g. Agent(model=adaptive_model("gemini-2.0-flash")).
+    """
+    _models.add(model)
+    return AdaptiveGemini(model=model)
+
+
+def registered_models() -> List[str]:
+    return sorted(_models)
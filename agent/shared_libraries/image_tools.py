@@ -1,20 +1,65 @@
 from google.adk.models import LlmRequest
 # from google.adk.tools.tool_context import ToolContext
-from typing import Optional
+from typing import List, Optional
+import asyncio
+import io
 import logging
 
 from google.cloud import storage
 import uuid
 
+from agent.config import Config
+from agent.shared_libraries.blocking_io import run_blocking
+
+try:
+    from PIL import Image
+    from pyzbar import pyzbar
+except ImportError:
+    Image = None
+    pyzbar = None
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+configs = Config()
+
+_storage_client: Optional[storage.Client] = None
+
 # import requests
 # import json
 # from google.auth import default
 # from google.auth.transport.requests import Request
 
 
+def _is_image_part(part) -> bool:
+    return bool(getattr(part, "inline_data", None)) and (getattr(part.inline_data, "mime_type", "") or "").startswith("image/")
+
+
+def extract_image_parts(llm_request: LlmRequest, latest_only: bool = False) -> List[bytes]:
+    """
+    Extract every image part from the LLM request.
+
+    Args:
+        latest_only (bool): Only look at the latest user message, so images
+            from previous turns are not processed again.
+
+    Returns:
+        list[bytes]: The image bytes, in order. Empty if none is found.
+    """
+    contents = llm_request.contents or []
+    if latest_only:
+        contents = [c for c in contents[-1:] if c.role == "user"]
+
+    images = [
+        part.inline_data.data
+        for content in contents
+        for part in (content.parts or [])
+        if _is_image_part(part)
+    ]
+    logger.info(f"{len(images)} image(s) found in the request.")
+    return images
+
+
 def extract_image_part(llm_request: LlmRequest) -> Optional[bytes]:
     """
     Extract the first image part from the LLM request.
@@ -22,13 +67,62 @@ def extract_image_part(llm_request: LlmRequest) -> Optional[bytes]:
     Returns:
         Image bytes if found, else None.
     """
-    for content in llm_request.contents:
-        for part in content.parts:
-            if getattr(part, "inline_data", None) and getattr(part.inline_data, "mime_type", "").startswith("image/"):
-                logger.info(f"Image bytes found: {len(part.inline_data.data)} bytes")
-                return part.inline_data.data  # Bytes
-    logger.info("No image bytes found in the request.")
-    return None
+    images = extract_image_parts(llm_request)
+    return images[0] if images else None
+
+
+def extract_new_image_part(llm_request: LlmRequest) -> Optional[bytes]:
+    """
+    Extract the first image part of the latest user message only, so images
+    from previous turns are not processed again.
+
+    Returns:
+        Image bytes if found, else None.
+    """
+    images = extract_image_parts(llm_request, latest_only=True)
+    return images[0] if images else None
+
+
+def is_valid_ean13(code: str) -> bool:
+    """
+    Checks the length and check digit of an EAN-13 code.
+    """
+    if len(code) != 13 or not code.isdigit():
+        return False
+    digits = [int(c) for c in code]
+    checksum = sum(d * (3 if i % 2 else 1) for i, d in enumerate(digits[:12]))
+    return (10 - checksum % 10) % 10 == digits[12]
+
+
+def decode_ean13(image_bytes: bytes) -> List[str]:
+    """
+    Decodes the EAN-13 barcodes present in an image, locally.
+
+    Args:
+        image_bytes (bytes): The raw image data.
+
+    Returns:
+        list[str]: The valid EAN-13 codes found, in reading order. Empty if
+                   none is found or if pyzbar is not installed.
+    """
+    if pyzbar is None:
+        logger.debug("pyzbar is not installed, skipping barcode decoding.")
+        return []
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        symbols = pyzbar.decode(image, symbols=[pyzbar.ZBarSymbol.EAN13])
+    except Exception as e:
+        logger.warning(f"Barcode decoding failed: {e}")
+        return []
+
+    codes = []
+    for symbol in symbols:
+        code = symbol.data.decode("ascii", errors="ignore")
+        if is_valid_ean13(code) and code not in codes:
+            codes.append(code)
+    logger.info(f"Decoded EAN-13 codes: {codes}")
+    return codes
 
 
 def upload_image_to_gcs(image_bytes: bytes, bucket_name: str = "hackathon-adk-images", prefix: str = "uploads/") -> str:
@@ -47,12 +141,44 @@ def upload_image_to_gcs(image_bytes: bytes, bucket_name: str = "hackathon-adk-im
     image_id = str(uuid.uuid4())
     file_name = f"{prefix}{image_id}.jpg"
 
-    # Initialize the client and upload the file
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
+    # Initialize the client once and upload the file
+    global _storage_client
+    if _storage_client is None:
+        _storage_client = storage.Client()
+    bucket = _storage_client.bucket(bucket_name)
     blob = bucket.blob(file_name)
 
-    blob.upload_from_string(image_bytes, content_type="image/jpeg")
+    blob.upload_from_string(
+        image_bytes,
+        content_type="image/jpeg",
+        timeout=configs.io_settings.upload_timeout_secs,
+    )
 
     # Return GCS URI or HTTPS public URL depending on your needs
     return f"gs://{bucket_name}/{file_name}"
+
+
+async def upload_image_to_gcs_async(image_bytes: bytes, bucket_name: str = "hackathon-adk-images", prefix: str = "uploads/") -> str:
+    """
+    Same as `upload_image_to_gcs`, run in the blocking I/O thread pool so the
+    event loop is not frozen during the upload.
+    """
+    return await run_blocking(
+        upload_image_to_gcs,
+        image_bytes,
+        bucket_name,
+        prefix,
+        timeout=configs.io_settings.upload_timeout_secs,
+    )
+
+
+async def upload_images_to_gcs_async(images: List[bytes], bucket_name: str = "hackathon-adk-images", prefix: str = "uploads/") -> List[str]:
+    """
+    Uploads several images concurrently.
+
+    Returns:
+        list[str]: GCS URIs of the uploaded images, in the same order.
+    """
+    return list(await asyncio.gather(
+        *(upload_image_to_gcs_async(image_bytes, bucket_name, prefix) for image_bytes in images)
+    ))
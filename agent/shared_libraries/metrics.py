@@ -0,0 +1,51 @@
+import threading
+from typing import Dict, Tuple
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_gauges: Dict[Tuple[str, Tuple], float] = {}
+
+
+def _key(name: str, labels: dict) -> Tuple[str, Tuple]:
+    return name, tuple(sorted(labels.items()))
+
+
+def inc_counter(name: str, value: float = 1, **labels):
+    """
+    Increments an in-process counter, e.g. inc_counter("model_retries", model="gemini-2.0-flash").
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """
+    Sets an in-process gauge to its current value.
+    """
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def get_counter(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def get_gauge(name: str, **labels) -> float:
+    with _lock:
+        return _gauges.get(_key(name, labels), 0)
+
+
+def snapshot() -> dict:
+    """
+    Returns all metrics as a JSON-serialisable dict, for logs or a debug endpoint.
+    """
+    def _dump(metrics):
+        return [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(metrics.items())
+        ]
+
+    with _lock:
+        return {"counters": _dump(_counters), "gauges": _dump(_gauges)}
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Set
+
+from agent.config import Config
+from agent.shared_libraries import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+# Matches `"product_id": "234579"` in dicts as well as in JSON rendered as text
+PRODUCT_ID_PATTERN = re.compile(r"""['"]?product_id['"]?\s*[:=]\s*['"]?(\w+)""")
+
+Warmer = Callable[[List[str]], Awaitable[None]]
+
+
+def extract_product_ids(tool_response: Any, limit: int) -> List[str]:
+    """
+    Finds the product IDs mentioned in a tool response: SQL rows, customer
+    profile, sub-agent answers...
+
+    Returns:
+        list[str]: The distinct product IDs, in order of appearance.
+    """
+    if isinstance(tool_response, str):
+        text = tool_response
+    else:
+        text = json.dumps(tool_response, default=str, ensure_ascii=False)
+
+    product_ids = []
+    for product_id in PRODUCT_ID_PATTERN.findall(text):
+        if product_id not in product_ids:
+            product_ids.append(product_id)
+            if len(product_ids) >= limit:
+                break
+    return product_ids
+
+
+class Prefetcher:
+    """
+    Warms the review, stock and product caches in the background for the
+    products referenced by tool responses, as the next turn usually asks
+    about them.
+
+    Warmers are registered by the modules owning the caches. The number of
+    prefetches in flight is bounded globally and per session, and a prefetch
+    still pending after `max_age_secs`, waiting for a slot included, is
+    cancelled.
+    """
+
+    def __init__(self, max_in_flight: int, max_per_session: int, max_age_secs: float):
+        self.max_per_session = max_per_session
+        self.max_age_secs = max_age_secs
+        self._warmers: Dict[str, Warmer] = {}
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._tasks: Dict[str, Set[asyncio.Task]] = {}
+        self._in_flight = 0
+
+    def register_warmer(self, name: str, warmer: Warmer):
+        self._warmers[name] = warmer
+
+    def schedule(self, session_id: str, product_ids: List[str]):
+        """
+        Starts the warmers for the given products, unless the session already
+        has too many prefetches in flight.
+        """
+        if not product_ids or not self._warmers:
+            return
+
+        tasks = self._tasks.setdefault(session_id, set())
+        for name, warmer in self._warmers.items():
+            if len(tasks) >= self.max_per_session:
+                metrics.inc_counter("prefetch_dropped", warmer=name)
+                continue
+            task = asyncio.create_task(self._run_with_deadline(name, warmer, product_ids))
+            tasks.add(task)
+            task.add_done_callback(lambda t, s=session_id: self._forget(s, t))
+            metrics.inc_counter("prefetch_scheduled", warmer=name)
+
+    def _forget(self, session_id: str, task: asyncio.Task):
+        tasks = self._tasks.get(session_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[session_id]
+
+    async def _run_with_deadline(self, name: str, warmer: Warmer, product_ids: List[str]):
+        try:
+            await asyncio.wait_for(self._run(name, warmer, product_ids), self.max_age_secs)
+        except asyncio.TimeoutError:
+            metrics.inc_counter("prefetch_expired", warmer=name)
+
+    async def _run(self, name: str, warmer: Warmer, product_ids: List[str]):
+        async with self._semaphore:
+            self._in_flight += 1
+            metrics.set_gauge("prefetch_in_flight", self._in_flight)
+            try:
+                await warmer(product_ids)
+                metrics.inc_counter("prefetch_completed", warmer=name)
+            except asyncio.CancelledError:
+                metrics.inc_counter("prefetch_cancelled", warmer=name)
+                raise
+            except Exception as e:
+                metrics.inc_counter("prefetch_failed", warmer=name)
+                logger.warning(f"Prefetch {name} failed for {product_ids}: {e}")
+            finally:
+                self._in_flight -= 1
+                metrics.set_gauge("prefetch_in_flight", self._in_flight)
+
+    def cancel_session(self, session_id: str):
+        """
+        Cancels the prefetches of a session that was deleted.
+        """
+        for task in self._tasks.pop(session_id, set()):
+            task.cancel()
+
+
+prefetcher = Prefetcher(
+    max_in_flight=configs.prefetch_settings.max_in_flight,
+    max_per_session=configs.prefetch_settings.max_per_session,
+    max_age_secs=configs.prefetch_settings.max_age_secs,
+)
+
+
+def prefetch_from_tool_response(session_id: str, tool_response: Any):
+    """
+    Schedules the prefetch of the products referenced by a tool response.
+    """
+    if not configs.prefetch_settings.enabled:
+        return
+    product_ids = extract_product_ids(
+        tool_response, configs.prefetch_settings.max_products_per_response
+    )
+    if product_ids:
+        logger.debug(f"Prefetching products {product_ids}")
+        prefetcher.schedule(session_id, product_ids)
@@ -0,0 +1,123 @@
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+
+from agent.config import Config
+from agent.shared_libraries import metrics
+from agent.shared_libraries.blocking_io import run_blocking
+from agent.shared_libraries.catalog import fetch_rows, get_snapshot
+from agent.shared_libraries.prefetch import prefetcher
+from agent.shared_libraries.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+# Catalog columns returned to the tools, the images and internal codes are left out
+PRODUCT_DETAIL_FIELDS = (
+    "product_id", "label", "eur_regular_price", "colors", "style", "main_material",
+    "product_material", "height", "width", "depth",
+)
+
+# Rows of the products missing from the snapshot (not built yet, or added to
+# the table since the last refresh), read from BigQuery. Unknown product IDs
+# are cached as None, for less long
+product_cache = TTLCache(
+    "products",
+    max_size=configs.prefetch_settings.cache_max_size,
+    ttl_secs=configs.prefetch_settings.product_cache_ttl_secs,
+)
+
+_client = None
+
+
+def _details(row: dict) -> dict:
+    return {field: row.get(field) for field in PRODUCT_DETAIL_FIELDS}
+
+
+def fetch_product_details(product_ids: List[str], prefetched: bool = False) -> Dict[str, Optional[dict]]:
+    """
+    Reads the details of products missing from the snapshot from BigQuery, and
+    caches them.
+    """
+    global _client
+    if _client is None:
+        from google.cloud import bigquery
+
+        _client = bigquery.Client(project=configs.CLOUD_PROJECT)
+
+    start = time.perf_counter()
+    rows = {str(row["product_id"]): row for row in fetch_rows(_client, product_ids)}
+    details = {}
+    for product_id in product_ids:
+        row = rows.get(product_id)
+        if row is None:
+            product_cache.put(
+                product_id, None, prefetched=prefetched,
+                ttl_secs=configs.prefetch_settings.product_negative_ttl_secs,
+            )
+            details[product_id] = None
+        else:
+            details[product_id] = _details(row)
+            product_cache.put(product_id, details[product_id], prefetched=prefetched)
+    metrics.inc_counter("cache_fetch_secs", time.perf_counter() - start, cache="products")
+    metrics.inc_counter("cache_fetches", cache="products")
+    return details
+
+
+async def get_product_details(product_ids: Iterable[str], prefetched: bool = False) -> Dict[str, Optional[dict]]:
+    """
+    Returns the details of several products: from the catalog snapshot, or
+    from BigQuery for the products it does not have.
+
+    Returns:
+        dict: The details of each product, None for unknown products.
+    """
+    product_ids = list(dict.fromkeys(str(product_id) for product_id in product_ids))
+    products = get_snapshot().products
+    details = {product_id: _details(products[product_id]) for product_id in product_ids if product_id in products}
+
+    missing = [product_id for product_id in product_ids if product_id not in details]
+    if missing:
+        details.update(product_cache.get_many(missing))
+        missing = [product_id for product_id in missing if product_id not in details]
+    if missing:
+        try:
+            details.update(await run_blocking(
+                fetch_product_details, missing, prefetched,
+                timeout=configs.query_settings.query_timeout_secs,
+            ))
+        except Exception as e:
+            logger.warning(f"Could not fetch the details of products {missing}: {e}")
+    return {product_id: details.get(product_id) for product_id in product_ids}
+
+
+async def with_product_details(items: List[dict]) -> List[dict]:
+    """
+    Returns copies of basket or purchase items with the catalog details of
+    their product, under `details`, their label taken from the catalog and
+    their missing basket price filled in.
+    """
+    details = await get_product_details(item["product_id"] for item in items if item.get("product_id"))
+    enriched = []
+    for item in items:
+        item = dict(item)
+        detail = details.get(str(item.get("product_id")))
+        if detail is not None:
+            item["label"] = detail["label"] or item.get("label")
+            item["details"] = detail
+            if "unit_price" in item and not item["unit_price"] and detail["eur_regular_price"] is not None:
+                item["unit_price"] = detail["eur_regular_price"]
+        enriched.append(item)
+    return enriched
+
+
+async def warm_products(product_ids: List[str]):
+    products = get_snapshot().products
+    missing = product_cache.missing(product_id for product_id in product_ids if product_id not in products)
+    if missing:
+        await run_blocking(fetch_product_details, missing, prefetched=True)
+
+
+prefetcher.register_warmer("products", warm_products)
@@ -0,0 +1,218 @@
+import asyncio
+import collections
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+
+from agent.config import Config
+from agent.shared_libraries import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+# Session state keys enabling the profiler: for every turn of the session,
+# or for a single turn (temp: keys are not persisted)
+PROFILE_SESSION_KEY = "profile"
+PROFILE_TURN_KEY = "temp:profile"
+
+# Invocation ID of the capture the current task belongs to, inherited by the
+# tasks it creates (ADK runs each tool call in its own task)
+_current_capture: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_capture", default=None)
+
+
+@dataclass
+class TurnProfile:
+    session_id: str
+    invocation_id: str
+    loop: asyncio.AbstractEventLoop
+    tasks: set
+    thread_id: int
+    started_at: float = field(default_factory=time.monotonic)
+    stacks: collections.Counter = field(default_factory=collections.Counter)
+    samples: int = 0
+    truncated: bool = False
+
+
+class TurnProfiler:
+    """
+    Sampling profiler of single invocations. A background thread samples the
+    stack of the event loop thread and keeps the samples taken while one of the
+    profiled invocation's tasks is running, so concurrent sessions sharing the
+    loop are left out. The thread only runs while a capture is active.
+    """
+
+    def __init__(self, interval_ms: float, max_concurrent: int, max_samples: int, max_duration_secs: float):
+        self.interval = interval_ms / 1000
+        self.max_concurrent = max_concurrent
+        self.max_samples = max_samples
+        self.max_duration_secs = max_duration_secs
+        self._profiles: Dict[str, TurnProfile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        return bool(self._profiles)
+
+    def start(self, session_id: str, invocation_id: str) -> bool:
+        """
+        Starts capturing the current task. Returns False if too many captures
+        are already running.
+        """
+        with self._lock:
+            if len(self._profiles) >= self.max_concurrent:
+                metrics.inc_counter("profiles_rejected")
+                logger.warning(f"Profiling of session {session_id} skipped, {len(self._profiles)} captures running")
+                return False
+            self._profiles[invocation_id] = TurnProfile(
+                session_id=session_id,
+                invocation_id=invocation_id,
+                loop=asyncio.get_running_loop(),
+                tasks={asyncio.current_task()},
+                thread_id=threading.get_ident(),
+            )
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="turn-profiler", daemon=True)
+                self._thread.start()
+        _current_capture.set(invocation_id)
+        metrics.inc_counter("profiles_started")
+        return True
+
+    def track_current_task(self) -> bool:
+        """
+        Adds the current task to the capture it was created from, if any.
+        Called when a tool or a sub-agent starts.
+        """
+        profile = self._profiles.get(_current_capture.get())
+        if profile is None:
+            return False
+        profile.tasks.add(asyncio.current_task())
+        return True
+
+    def stop(self, invocation_id: str) -> Optional[str]:
+        """
+        Stops a capture and writes its output.
+
+        Returns:
+            str: Path of the folded stacks file, None if the invocation was not profiled.
+        """
+        with self._lock:
+            profile = self._profiles.pop(invocation_id, None)
+        if _current_capture.get() == invocation_id:
+            _current_capture.set(None)
+        if profile is None:
+            return None
+        return write_folded_stacks(profile)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles.values())
+
+            frames = sys._current_frames()
+            now = time.monotonic()
+            for profile in profiles:
+                if now - profile.started_at > self.max_duration_secs:
+                    # The invocation failed before after_agent, or is stuck
+                    profile.truncated = True
+                    self.stop(profile.invocation_id)
+                    continue
+                if profile.samples >= self.max_samples:
+                    profile.truncated = True
+                    continue
+                frame = frames.get(profile.thread_id)
+                if frame is None or asyncio.current_task(profile.loop) not in profile.tasks:
+                    continue
+                profile.stacks[_fold(frame)] += 1
+                profile.samples += 1
+
+
+def _fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def write_folded_stacks(profile: TurnProfile) -> str:
+    """
+    Writes the samples in the folded stacks format read by flamegraph.pl and
+    speedscope, most frequent stacks first, up to `max_output_bytes`.
+    """
+    settings = configs.profiling_settings
+    os.makedirs(settings.output_dir, exist_ok=True)
+    name = re.sub(r"[^\w.-]", "_", f"{profile.session_id}_{profile.invocation_id}")
+    path = os.path.join(settings.output_dir, f"{name}.folded")
+
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in profile.stacks.most_common():
+            line = f"{stack} {count}\n"
+            written += len(line.encode("utf-8"))
+            if written > settings.max_output_bytes:
+                profile.truncated = True
+                break
+            f.write(line)
+
+    metrics.inc_counter("profiles_written")
+    logger.info(
+        f"Profile of session {profile.session_id} written to {path}: {profile.samples} samples, "
+        f"{time.monotonic() - profile.started_at:.1f} s{', truncated' if profile.truncated else ''}"
+    )
+    return path
+
+
+turn_profiler = TurnProfiler(
+    interval_ms=configs.profiling_settings.interval_ms,
+    max_concurrent=configs.profiling_settings.max_concurrent,
+    max_samples=configs.profiling_settings.max_samples,
+    max_duration_secs=configs.profiling_settings.max_duration_secs,
+)
+
+
+def profiling_requested(callback_context: CallbackContext) -> bool:
+    state = callback_context.state
+    return bool(state.get(PROFILE_TURN_KEY) or state.get(PROFILE_SESSION_KEY))
+
+
+def start_turn_profile(callback_context: CallbackContext):
+    """
+    Starts profiling the invocation if its session asked for it.
+    Nothing else than a state lookup runs when profiling is off.
+    """
+    # Sub-agents called through AgentTool belong to the capture of the turn
+    if turn_profiler.active and turn_profiler.track_current_task():
+        return
+    if not configs.profiling_settings.enabled or not profiling_requested(callback_context):
+        return
+    session_id = callback_context.session.id
+    turn_profiler.start(session_id, callback_context.invocation_id)
+
+
+def track_tool_task():
+    if turn_profiler.active:
+        turn_profiler.track_current_task()
+
+
+def stop_turn_profile(callback_context: CallbackContext):
+    if not turn_profiler.active:
+        return
+    path = turn_profiler.stop(callback_context.invocation_id)
+    if path is not None:
+        callback_context.state["temp:profile_path"] = path
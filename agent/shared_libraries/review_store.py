@@ -0,0 +1,236 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from agent.config import Config
+from agent.shared_libraries import metrics
+from agent.shared_libraries.blocking_io import run_blocking
+from agent.shared_libraries.prefetch import prefetcher
+from agent.shared_libraries.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+MAGIC = b"MDMREV01"
+HEADER = struct.Struct("<8sQ")
+
+# Themes looked up in the French verbatims, with the words that trigger them.
+THEMES = {
+    "confort": ["confort", "confortable", "assise"],
+    "qualité": ["qualité", "finition", "solide", "robuste"],
+    "montage": ["montage", "monter", "notice", "vis"],
+    "couleur": ["couleur", "teinte", "coloris"],
+    "taille": ["taille", "hauteur", "dimension", "grande", "petite"],
+    "prix": ["prix", "cher", "rapport qualité"],
+    "livraison": ["livraison", "livré", "colis", "carton"],
+    "design": ["design", "joli", "belle", "beau", "style", "élégant"],
+}
+NEGATIVE_WORDS = [
+    "pas ", "mauvais", "déçu", "décevant", "fragile", "cassé", "abîmé",
+    "inconfortable", "problème", "dommage", "instable", "bancal",
+]
+
+
+def _review_lines(verbatims: Optional[str]) -> List[str]:
+    if not verbatims:
+        return []
+    return [line.strip() for line in verbatims.split("\n") if line.strip()]
+
+
+def extract_themes(lines: Iterable[str], top_n: int = 3) -> Dict[str, List[str]]:
+    """
+    Counts the themes mentioned in review lines, split by sentiment.
+
+    Args:
+        lines: One review per item, in French.
+        top_n (int): Number of themes to keep for each sentiment.
+
+    Returns:
+        dict: The most frequent positive and negative themes.
+    """
+    positive, negative = Counter(), Counter()
+    for line in lines:
+        text = line.lower()
+        is_negative = any(word in text for word in NEGATIVE_WORDS)
+        for theme, words in THEMES.items():
+            if any(word in text for word in words):
+                (negative if is_negative else positive)[theme] += 1
+
+    return {
+        "positive_themes": [theme for theme, _ in positive.most_common(top_n)],
+        "negative_themes": [theme for theme, _ in negative.most_common(top_n)],
+    }
+
+
+def aggregate_review_row(row: dict, synthesis_max_chars: int = 400) -> dict:
+    """
+    Reduces a row of `extract_chairs_reviews_adk` to a compact summary.
+    """
+    lines = _review_lines(row.get("verbatims"))
+    synthesis = (row.get("verbatim_synthesis") or "").strip()
+    if len(synthesis) > synthesis_max_chars:
+        synthesis = synthesis[:synthesis_max_chars].rsplit(" ", 1)[0] + "…"
+
+    summary = {
+        "product_id": str(row["product_id"]),
+        "global_rating": row.get("global_rating"),
+        "quality_rating": row.get("quality rating", row.get("quality_rating")),
+        "review_count": len(lines),
+        "synthesis": synthesis,
+    }
+    summary.update(extract_themes(lines))
+    return summary
+
+
+def write_review_store(summaries: Iterable[dict], path: str) -> int:
+    """
+    Writes review summaries to a key-value file indexed by `product_id`.
+
+    Layout: magic, index length, JSON index {product_id: [offset, length]},
+    then the JSON-encoded summaries back to back.
+
+    Returns:
+        int: Number of products written.
+    """
+    index, blobs, offset = {}, [], 0
+    for summary in summaries:
+        blob = json.dumps(summary, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        index[summary["product_id"]] = [offset, len(blob)]
+        blobs.append(blob)
+        offset += len(blob)
+
+    index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(index_bytes)))
+        f.write(index_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Wrote {len(index)} review summaries to {path}")
+    return len(index)
+
+
+class ReviewStore:
+    """
+    Read-only, memory-mapped view over a review aggregates file.
+
+    Raises:
+        ValueError: If the file is not a review aggregates file or is truncated.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            if os.fstat(self._file.fileno()).st_size < HEADER.size:
+                raise ValueError(f"{path} is not a review aggregates file.")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        try:
+            magic, index_length = HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a review aggregates file.")
+            index_start = HEADER.size
+            self._data_start = index_start + index_length
+            data_length = len(self._mmap) - self._data_start
+            if data_length < 0:
+                raise ValueError(f"{path} is truncated.")
+            self._index = json.loads(self._mmap[index_start:self._data_start])
+            if any(offset + length > data_length for offset, length in self._index.values()):
+                raise ValueError(f"{path} is truncated.")
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, product_id: str) -> bool:
+        return str(product_id) in self._index
+
+    def get(self, product_id: str) -> Optional[dict]:
+        entry = self._index.get(str(product_id))
+        if entry is None:
+            return None
+        offset, length = entry
+        start = self._data_start + offset
+        return json.loads(self._mmap[start:start + length])
+
+    def get_many(self, product_ids: Iterable[str]) -> Dict[str, Optional[dict]]:
+        return {str(product_id): self.get(product_id) for product_id in product_ids}
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+_store: Optional[ReviewStore] = None
+
+
+def get_review_store() -> Optional[ReviewStore]:
+    """
+    Returns the shared review store, opened on first use.
+    None if the aggregates file has not been built yet or cannot be read.
+    """
+    global _store
+    if _store is None:
+        path = configs.catalog_settings.review_store_path
+        if not os.path.exists(path):
+            logger.warning(f"Review aggregates not found at {path}")
+            return None
+        try:
+            _store = ReviewStore(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Review aggregates at {path} cannot be read: {e}")
+            return None
+    return _store
+
+
+review_cache = TTLCache(
+    "reviews",
+    max_size=configs.prefetch_settings.cache_max_size,
+    ttl_secs=configs.prefetch_settings.review_cache_ttl_secs,
+)
+
+
+def get_review_summaries(product_ids: Iterable[str], prefetched: bool = False) -> Dict[str, Optional[dict]]:
+    """
+    Returns the review summaries of several products, read through the review cache.
+    Raises FileNotFoundError if the review store has not been built.
+    """
+    product_ids = [str(product_id) for product_id in product_ids]
+    summaries = review_cache.get_many(product_ids)
+    missing = [product_id for product_id in product_ids if product_id not in summaries]
+    if missing:
+        store = get_review_store()
+        if store is None:
+            raise FileNotFoundError("Review aggregates are not available.")
+        start = time.perf_counter()
+        for product_id, summary in store.get_many(missing).items():
+            review_cache.put(product_id, summary, prefetched=prefetched)
+            summaries[product_id] = summary
+        metrics.inc_counter("cache_fetch_secs", time.perf_counter() - start, cache="reviews")
+        metrics.inc_counter("cache_fetches", cache="reviews")
+    return {product_id: summaries[product_id] for product_id in product_ids}
+
+
+async def warm_reviews(product_ids):
+    missing = review_cache.missing(product_ids)
+    if missing and get_review_store() is not None:
+        await run_blocking(get_review_summaries, missing, prefetched=True)
+
+
+prefetcher.register_warmer("reviews", warm_reviews)
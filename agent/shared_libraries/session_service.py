@@ -0,0 +1,440 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+from agent.config import Config
+from agent.shared_libraries import metrics
+from agent.shared_libraries.blocking_io import run_blocking
+from agent.shared_libraries.prefetch import prefetcher
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, id)
+);
+CREATE INDEX IF NOT EXISTS events_by_session
+    ON events (app_name, user_id, session_id, timestamp);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+SessionKey = Tuple[str, str, str]
+
+
+def split_state(state: Dict[str, Any]) -> Tuple[dict, dict, dict]:
+    """
+    Splits a state (or state delta) into app, user and session scoped keys.
+    Temporary keys are dropped.
+    """
+    app_state, user_state, session_state = {}, {}, {}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app_state[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_state[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_state[key] = value
+    return app_state, user_state, session_state
+
+
+def merge_state(app_state: dict, user_state: dict, session_state: dict) -> dict:
+    state = dict(session_state)
+    state.update({State.APP_PREFIX + key: value for key, value in app_state.items()})
+    state.update({State.USER_PREFIX + key: value for key, value in user_state.items()})
+    return state
+
+
+@dataclass
+class PendingWrites:
+    session: Session
+    events: List[Event] = field(default_factory=list)
+    app_delta: dict = field(default_factory=dict)
+    user_delta: dict = field(default_factory=dict)
+
+
+class SQLiteSessionService(BaseSessionService):
+    """
+    Session service backed by SQLite in WAL mode, for self-hosted deployments.
+
+    The events of a turn and their state deltas are buffered in memory and
+    written in a single transaction when the turn ends. Recently used sessions
+    are kept in an in-memory LRU, so loading them does not touch the database.
+    WAL mode lets readers run concurrently with the writer.
+
+    The LRU is per process: with several workers, either route a session to
+    the same worker (session affinity) or set `validate_hot`, so a cached
+    session is checked against its update time in the database before use.
+    The app: and user: state, shared with other sessions, is read again from
+    the database whenever a cached session is loaded.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        hot_sessions: Optional[int] = None,
+        flush_max_events: Optional[int] = None,
+        validate_hot: Optional[bool] = None,
+    ):
+        settings = configs.session_settings
+        self.db_path = db_path or settings.db_path
+        self.hot_sessions = hot_sessions or settings.hot_sessions
+        self.flush_max_events = flush_max_events or settings.flush_max_events
+        self.validate_hot = settings.validate_hot_sessions if validate_hot is None else validate_hot
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._hot: "OrderedDict[SessionKey, Session]" = OrderedDict()
+        self._pending: Dict[SessionKey, PendingWrites] = {}
+        # Writes taken out of _pending and not committed yet
+        self._writing: Dict[SessionKey, PendingWrites] = {}
+        # Keeps the writes of each session in order, dropped once unused
+        self._flush_locks: "weakref.WeakValueDictionary[SessionKey, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+        if os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current thread.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._local.connection = connection
+        return connection
+
+    def _remember(self, key: SessionKey, session: Session):
+        self._hot[key] = session
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_sessions:
+            self._hot.popitem(last=False)
+
+    # Blocking database operations, run in the blocking I/O thread pool
+
+    def _load_scoped_states(self, app_name: str, user_id: str) -> Tuple[dict, dict]:
+        return self._read_scoped_states(self._connection(), app_name, user_id)
+
+    def _read_scoped_states(self, connection, app_name: str, user_id: str) -> Tuple[dict, dict]:
+        row = connection.execute(
+            "SELECT state FROM app_states WHERE app_name = ?", (app_name,)
+        ).fetchone()
+        app_state = json.loads(row[0]) if row else {}
+        row = connection.execute(
+            "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+        ).fetchone()
+        user_state = json.loads(row[0]) if row else {}
+        return app_state, user_state
+
+    def _write_scoped_states(self, connection, app_name: str, user_id: str, app_delta: dict, user_delta: dict):
+        if not app_delta and not user_delta:
+            return
+        app_state, user_state = self._read_scoped_states(connection, app_name, user_id)
+        if app_delta:
+            app_state.update(app_delta)
+            connection.execute(
+                "INSERT OR REPLACE INTO app_states VALUES (?, ?)", (app_name, json.dumps(app_state))
+            )
+        if user_delta:
+            user_state.update(user_delta)
+            connection.execute(
+                "INSERT OR REPLACE INTO user_states VALUES (?, ?, ?)",
+                (app_name, user_id, json.dumps(user_state)),
+            )
+
+    def _insert_session(self, key: SessionKey, state: dict, update_time: float) -> Tuple[dict, dict, dict]:
+        app_name, user_id, session_id = key
+        app_delta, user_delta, session_state = split_state(state)
+        connection = self._connection()
+        with self._write_lock:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                exists = connection.execute(
+                    "SELECT 1 FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+                ).fetchone()
+                if exists:
+                    raise ValueError(f"Session {session_id} already exists.")
+                self._write_scoped_states(connection, app_name, user_id, app_delta, user_delta)
+                connection.execute(
+                    "INSERT INTO sessions VALUES (?, ?, ?, ?, ?)",
+                    (*key, json.dumps(session_state), update_time),
+                )
+                app_state, user_state = self._read_scoped_states(connection, app_name, user_id)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return app_state, user_state, session_state
+
+    def _load_session(self, key: SessionKey) -> Optional[Session]:
+        app_name, user_id, session_id = key
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT state, update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        app_state, user_state = self._read_scoped_states(connection, app_name, user_id)
+        events = [
+            Event.model_validate_json(data)
+            for (data,) in connection.execute(
+                "SELECT data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+                " ORDER BY timestamp", key
+            )
+        ]
+        return Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=merge_state(app_state, user_state, json.loads(row[0])),
+            events=events,
+            last_update_time=row[1],
+        )
+
+    def _write_pending(self, key: SessionKey, pending: PendingWrites):
+        app_name, user_id, session_id = key
+        _, _, session_state = split_state(pending.session.state)
+        connection = self._connection()
+        with self._write_lock:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_scoped_states(connection, app_name, user_id, pending.app_delta, pending.user_delta)
+                connection.execute(
+                    "UPDATE sessions SET state = ?, update_time = ?"
+                    " WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (json.dumps(session_state), pending.session.last_update_time, *key),
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (*key, event.id, event.timestamp, event.model_dump_json(exclude_none=True))
+                        for event in pending.events
+                    ],
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _read_update_time(self, key: SessionKey) -> Optional[float]:
+        row = self._connection().execute(
+            "SELECT update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+        ).fetchone()
+        return row[0] if row else None
+
+    def _list_sessions(self, app_name: str, user_id: str) -> List[Session]:
+        connection = self._connection()
+        app_state, user_state = self._read_scoped_states(connection, app_name, user_id)
+        return [
+            Session(
+                id=session_id,
+                app_name=app_name,
+                user_id=user_id,
+                state=merge_state(app_state, user_state, json.loads(state)),
+                last_update_time=update_time,
+            )
+            for session_id, state, update_time in connection.execute(
+                "SELECT id, state, update_time FROM sessions WHERE app_name = ? AND user_id = ?",
+                (app_name, user_id),
+            )
+        ]
+
+    def _delete_session(self, key: SessionKey):
+        connection = self._connection()
+        with self._write_lock:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+                )
+                connection.execute(
+                    "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    # BaseSessionService interface
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        key = (app_name, user_id, session_id)
+        now = time.time()
+        app_state, user_state, session_state = await run_blocking(
+            self._insert_session, key, state or {}, now
+        )
+        session = Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=merge_state(app_state, user_state, session_state),
+            last_update_time=now,
+        )
+        self._remember(key, session)
+        metrics.inc_counter("session_creates")
+        return session.model_copy(deep=True)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        session = self._hot.get(key)
+        if session is not None and self.validate_hot and key not in self._pending:
+            # Another worker may have written the session since it was cached
+            if await run_blocking(self._read_update_time, key) != session.last_update_time:
+                self._hot.pop(key, None)
+                session = None
+                metrics.inc_counter("session_hot_stale")
+        if session is not None:
+            self._hot.move_to_end(key)
+            metrics.inc_counter("session_hot_hits")
+            await self._refresh_scoped_states(session)
+        else:
+            session = await run_blocking(self._load_session, key)
+            if session is None:
+                return None
+            self._remember(key, session)
+            metrics.inc_counter("session_hot_misses")
+
+        session = session.model_copy(deep=True)
+        # The cached object is the one the runner used, with the temp: keys of its last invocation
+        for key in [k for k in session.state if k.startswith(State.TEMP_PREFIX)]:
+            del session.state[key]
+        if config:
+            if config.after_timestamp:
+                session.events = [e for e in session.events if e.timestamp >= config.after_timestamp]
+            if config.num_recent_events:
+                session.events = session.events[-config.num_recent_events:]
+        return session
+
+    async def _refresh_scoped_states(self, session: Session):
+        """
+        Reads again the app: and user: state of a cached session, which other
+        sessions may have written since, along with the deltas not flushed yet.
+        """
+        app_state, user_state = await run_blocking(self._load_scoped_states, session.app_name, session.user_id)
+        for (app_name, user_id, _), pending in [*self._writing.items(), *self._pending.items()]:
+            if (app_name, user_id) == (session.app_name, session.user_id):
+                app_state.update(pending.app_delta)
+                user_state.update(pending.user_delta)
+        _, _, session_state = split_state(session.state)
+        temp_state = {k: v for k, v in session.state.items() if k.startswith(State.TEMP_PREFIX)}
+        session.state.clear()
+        session.state.update(merge_state(app_state, user_state, session_state))
+        session.state.update(temp_state)
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        for key in [k for k in self._pending if k[:2] == (app_name, user_id)]:
+            await self.flush(key)
+        sessions = await run_blocking(self._list_sessions, app_name, user_id)
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        self._hot.pop(key, None)
+        self._pending.pop(key, None)
+        prefetcher.cancel_session(session_id)
+        await run_blocking(self._delete_session, key)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        event = await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+
+        key = (session.app_name, session.user_id, session.id)
+        self._remember(key, session)
+        pending = self._pending.setdefault(key, PendingWrites(session=session))
+        pending.session = session
+        pending.events.append(event)
+        if event.actions and event.actions.state_delta:
+            app_delta, user_delta, _ = split_state(event.actions.state_delta)
+            pending.app_delta.update(app_delta)
+            pending.user_delta.update(user_delta)
+
+        # One write per turn: the deltas of the turn are coalesced until its final response
+        if event.is_final_response() or len(pending.events) >= self.flush_max_events:
+            await self.flush(key)
+        return event
+
+    async def flush(self, key: Optional[SessionKey] = None):
+        """
+        Writes the buffered events and state of a session, or of all sessions.
+        """
+        for k in [key] if key else list(self._pending):
+            lock = self._flush_locks.get(k)
+            if lock is None:
+                lock = self._flush_locks[k] = asyncio.Lock()
+            async with lock:
+                pending = self._pending.pop(k, None)
+                if pending is None:
+                    continue
+                self._writing[k] = pending
+                try:
+                    await run_blocking(self._write_pending, k, pending)
+                finally:
+                    del self._writing[k]
+                metrics.inc_counter("session_flushes")
+                metrics.inc_counter("session_events_written", len(pending.events))
+
+    async def close(self):
+        """
+        Flushes every buffered write, to call before shutting down.
+        """
+        await self.flush()
@@ -0,0 +1,139 @@
+import mmap
+import multiprocessing
+import struct
+from typing import Dict, Iterable, Optional
+
+_SLOT = struct.Struct("q")
+
+
+class SharedCounters:
+    """
+    Integer counters in an anonymous shared memory map. Created by the serving
+    process before it forks its workers, so every worker reads and updates the
+    same memory.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._slots: Dict[str, int] = {name: i * _SLOT.size for i, name in enumerate(names)}
+        self._buffer = mmap.mmap(-1, max(1, len(self._slots)) * _SLOT.size)
+        self._lock = multiprocessing.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._slots
+
+    def get(self, name: str) -> int:
+        return _SLOT.unpack_from(self._buffer, self._slots[name])[0]
+
+    def add(self, name: str, delta: int = 1) -> int:
+        """
+        Adds to a counter and returns its new value.
+        """
+        offset = self._slots[name]
+        with self._lock:
+            value = _SLOT.unpack_from(self._buffer, offset)[0] + delta
+            _SLOT.pack_into(self._buffer, offset, value)
+        return value
+
+
+class SharedSlots:
+    """
+    Slots of several resources (e.g. the in-flight calls to each model) shared
+    by the workers. The slots held by each worker are counted apart, so the
+    serving process can give back the slots of a worker that died mid-call.
+
+    Waiting for a slot blocks on a cross-process condition, to call from a
+    thread rather than from the event loop.
+    """
+
+    def __init__(self, names: Iterable[str], workers: int):
+        self._names: Dict[str, int] = {name: i for i, name in enumerate(names)}
+        self._workers = workers
+        # Per resource: the total in use, then the slots held by each worker
+        self._buffer = mmap.mmap(-1, max(1, len(self._names)) * (workers + 1) * _SLOT.size)
+        self._condition = multiprocessing.Condition()
+        # Index of the current worker, set after the fork
+        self.worker_index: Optional[int] = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._names
+
+    def _offset(self, name: str, worker: Optional[int] = None) -> int:
+        row = self._names[name] * (self._workers + 1)
+        return (row + (0 if worker is None else worker + 1)) * _SLOT.size
+
+    def _add(self, offset: int, delta: int):
+        _SLOT.pack_into(self._buffer, offset, _SLOT.unpack_from(self._buffer, offset)[0] + delta)
+
+    def in_use(self, name: str, worker: Optional[int] = None) -> int:
+        return _SLOT.unpack_from(self._buffer, self._offset(name, worker))[0]
+
+    def acquire(self, name: str, limit: int, timeout: Optional[float] = None) -> bool:
+        """
+        Takes one of the `limit` slots of a resource, waiting up to `timeout`
+        seconds for one to be released.
+
+        Returns:
+            bool: False if no slot was freed in time.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_use(name) < limit, timeout):
+                return False
+            self._add(self._offset(name), 1)
+            self._add(self._offset(name, self.worker_index or 0), 1)
+        return True
+
+    def release(self, name: str):
+        with self._condition:
+            self._add(self._offset(name), -1)
+            self._add(self._offset(name, self.worker_index or 0), -1)
+            self._condition.notify_all()
+
+    def reclaim(self, worker: int) -> int:
+        """
+        Gives back the slots held by a worker that exited.
+
+        Returns:
+            int: The number of slots given back.
+        """
+        reclaimed = 0
+        with self._condition:
+            for name in self._names:
+                held = self.in_use(name, worker)
+                if held:
+                    self._add(self._offset(name), -held)
+                    self._add(self._offset(name, worker), -held)
+                    reclaimed += held
+            if reclaimed:
+                self._condition.notify_all()
+        return reclaimed
+
+
+_counters: Optional[SharedCounters] = None
+_slots: Optional[SharedSlots] = None
+
+
+def init_shared_counters(models: Iterable[str], workers: int) -> SharedCounters:
+    """
+    Allocates the counters and model slots shared by the workers, to call
+    before forking them.
+    """
+    global _counters, _slots
+    models = sorted(set(models))
+    _counters = SharedCounters(f"overloads:{model}" for model in models)
+    _slots = SharedSlots(models, workers)
+    return _counters
+
+
+def get_shared_counters() -> Optional[SharedCounters]:
+    """
+    Returns the shared counters, or None when the agent runs in a single process.
+    """
+    return _counters
+
+
+def get_shared_slots() -> Optional[SharedSlots]:
+    """
+    Returns the model slots shared by the workers, or None when the agent runs
+    in a single process.
+    """
+    return _slots
@@ -0,0 +1,245 @@
+import contextvars
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from agent.config import Config
+from agent.shared_libraries import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+configs = Config()
+
+# Persisted total of the session, so budgets survive restarts and span workers
+SESSION_USAGE_KEY = "token_usage"
+
+# Rough size of a token, to compare instructions with prompt token counts
+CHARS_PER_TOKEN = 4
+
+# Session of the turn, inherited by the sub-agents called through AgentTool,
+# which run in sessions of their own
+_turn_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("turn_session", default=None)
+
+# Model, hop and instruction size of the model call in progress, from
+# before_model to after_model (both run in the task of the call)
+_model_call: contextvars.ContextVar[Optional[Tuple[str, str, int]]] = contextvars.ContextVar("model_call", default=None)
+
+
+@dataclass
+class UsageTotals:
+    calls: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    instruction_chars: int = 0
+    cost_usd: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+    def add(self, prompt_tokens: int, output_tokens: int, cached_tokens: int, instruction_chars: int, cost_usd: float):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.output_tokens += output_tokens
+        self.cached_tokens += cached_tokens
+        self.instruction_chars += instruction_chars
+        self.cost_usd += cost_usd
+
+
+class TokenLedger:
+    """
+    In-process aggregation of the tokens used per agent, per tool hop (the tool
+    whose response the model call follows) and per session.
+    """
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._by_agent: Dict[str, UsageTotals] = {}
+        self._by_hop: Dict[Tuple[str, str], UsageTotals] = {}
+        self._by_session: "OrderedDict[str, UsageTotals]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        session_id: str,
+        agent: str,
+        hop: str,
+        model: str,
+        usage: types.GenerateContentResponseUsageMetadata,
+        instruction_chars: int,
+    ) -> int:
+        """
+        Records the usage of one model call.
+
+        Returns:
+            int: The total tokens used by the session so far.
+        """
+        prompt_tokens = usage.prompt_token_count or 0
+        output_tokens = usage.candidates_token_count or 0
+        cached_tokens = usage.cached_content_token_count or 0
+        input_price, output_price = configs.token_settings.prices_per_million.get(model, (0.0, 0.0))
+        cost_usd = (prompt_tokens * input_price + output_tokens * output_price) / 1e6
+        values = (prompt_tokens, output_tokens, cached_tokens, instruction_chars, cost_usd)
+
+        with self._lock:
+            self._by_agent.setdefault(agent, UsageTotals()).add(*values)
+            self._by_hop.setdefault((agent, hop), UsageTotals()).add(*values)
+            session = self._by_session.setdefault(session_id, UsageTotals())
+            session.add(*values)
+            self._by_session.move_to_end(session_id)
+            while len(self._by_session) > self.max_sessions:
+                self._by_session.popitem(last=False)
+            session_total = session.total_tokens
+
+        metrics.inc_counter("model_prompt_tokens", prompt_tokens, agent=agent, model=model)
+        metrics.inc_counter("model_output_tokens", output_tokens, agent=agent, model=model)
+        metrics.inc_counter("model_cached_tokens", cached_tokens, agent=agent, model=model)
+        metrics.inc_counter("model_cost_usd", cost_usd, agent=agent, model=model)
+        return session_total
+
+    def session_total(self, session_id: str) -> int:
+        with self._lock:
+            session = self._by_session.get(session_id)
+            return session.total_tokens if session else 0
+
+    def seed_session(self, session_id: str, total_tokens: int):
+        """
+        Restores the persisted total of a session this process has not seen yet.
+        """
+        with self._lock:
+            if session_id not in self._by_session and total_tokens:
+                self._by_session[session_id] = UsageTotals(prompt_tokens=total_tokens)
+
+    def report(self) -> dict:
+        """
+        Ranks the agents, and the hops within them, by tokens used.
+        """
+        with self._lock:
+            by_agent = {agent: UsageTotals(**asdict(totals)) for agent, totals in self._by_agent.items()}
+            by_hop = {key: UsageTotals(**asdict(totals)) for key, totals in self._by_hop.items()}
+
+        grand_total = sum(totals.total_tokens for totals in by_agent.values()) or 1
+
+        def row(totals: UsageTotals) -> dict:
+            return {
+                "calls": totals.calls,
+                "prompt_tokens": totals.prompt_tokens,
+                "output_tokens": totals.output_tokens,
+                "cached_tokens": totals.cached_tokens,
+                "cost_usd": round(totals.cost_usd, 6),
+                "share": round(totals.total_tokens / grand_total, 4),
+                "avg_prompt_tokens": totals.prompt_tokens // max(1, totals.calls),
+                # Part of each prompt taken by the agent's instructions, resent on every call
+                "instruction_share": round(
+                    totals.instruction_chars / CHARS_PER_TOKEN / max(1, totals.prompt_tokens), 4
+                ),
+            }
+
+        agents = []
+        for agent, totals in sorted(by_agent.items(), key=lambda item: -item[1].total_tokens):
+            hops = sorted(
+                ((hop, hop_totals) for (hop_agent, hop), hop_totals in by_hop.items() if hop_agent == agent),
+                key=lambda item: -item[1].total_tokens,
+            )
+            agents.append({"agent": agent, **row(totals), "hops": [{"hop": hop, **row(t)} for hop, t in hops]})
+        return {"total_tokens": grand_total if by_agent else 0, "agents": agents}
+
+
+token_ledger = TokenLedger(max_sessions=configs.token_settings.max_sessions)
+
+
+def _instruction_chars(llm_request: LlmRequest) -> int:
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    if instruction is None:
+        return 0
+    if isinstance(instruction, str):
+        return len(instruction)
+    if isinstance(instruction, types.Content):
+        return sum(len(part.text or "") for part in instruction.parts or [])
+    return len(str(instruction))
+
+
+def _hop(llm_request: LlmRequest) -> str:
+    """
+    Names the step of the turn a model call belongs to: the tools whose
+    responses it reads, or the user message.
+    """
+    content = llm_request.contents[-1] if llm_request.contents else None
+    names = [
+        part.function_response.name
+        for part in (content.parts or [] if content else [])
+        if part.function_response
+    ]
+    return ",".join(sorted(set(names))) if names else "user_message"
+
+
+def accounting_session_id(callback_context: CallbackContext) -> str:
+    return _turn_session.get() or callback_context.session.id
+
+
+def begin_turn(callback_context: CallbackContext):
+    """
+    Binds the turn to its session, unless it is a sub-agent of a running turn.
+    """
+    if _turn_session.get() is not None:
+        return
+    session_id = callback_context.session.id
+    _turn_session.set(session_id)
+    token_ledger.seed_session(session_id, callback_context.state.get(SESSION_USAGE_KEY, 0))
+
+
+def end_turn(callback_context: CallbackContext):
+    _turn_session.set(None)
+
+
+def check_token_budget(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """
+    Skips the model call once the session has used its token budget.
+    """
+    budget = configs.token_settings.session_budget
+    if not budget:
+        return None
+    session_id = accounting_session_id(callback_context)
+    if token_ledger.session_total(session_id) < budget:
+        return None
+
+    metrics.inc_counter("token_budget_exceeded", agent=callback_context.agent_name)
+    logger.warning(f"Session {session_id} reached its token budget of {budget}")
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(
+        text="This conversation has reached its usage limit, please start a new conversation."
+    )]))
+
+
+def note_model_call(llm_request: LlmRequest):
+    """
+    Remembers what the model call is about, for `record_token_usage`.
+    """
+    _model_call.set((llm_request.model or "unknown", _hop(llm_request), _instruction_chars(llm_request)))
+
+
+def record_token_usage(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[int]:
+    """
+    Records the tokens of a model call.
+
+    Returns:
+        int: The session total, or None if the response carries no usage.
+    """
+    if llm_response.partial or llm_response.usage_metadata is None:
+        return None
+    model, hop, instruction_chars = _model_call.get() or ("unknown", "unknown", 0)
+    return token_ledger.record(
+        session_id=accounting_session_id(callback_context),
+        agent=callback_context.agent_name,
+        hop=hop,
+        model=model,
+        usage=llm_response.usage_metadata,
+        instruction_chars=instruction_chars,
+    )
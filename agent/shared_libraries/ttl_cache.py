@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Tuple
+
+from agent.shared_libraries import metrics
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl_secs`.
+
+    Entries written by the prefetcher are flagged, so the first hit on each of
+    them is counted in `cache_prefetch_hits`.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl_secs: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_secs = ttl_secs
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: Hashable, now: float) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value, prefetched = entry
+        if expires_at < now:
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        if prefetched:
+            self._entries[key] = (expires_at, value, False)
+            metrics.inc_counter("cache_prefetch_hits", cache=self.name)
+        return True, value
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Returns (found, value). A cached None is a found value.
+        """
+        with self._lock:
+            found, value = self._lookup(key, time.monotonic())
+        metrics.inc_counter("cache_hits" if found else "cache_misses", cache=self.name)
+        return found, value
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Returns the cached values of the given keys. Missing keys are left out.
+        """
+        keys = list(keys)
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                hit, value = self._lookup(key, now)
+                if hit:
+                    found[key] = value
+        metrics.inc_counter("cache_hits", len(found), cache=self.name)
+        metrics.inc_counter("cache_misses", len(keys) - len(found), cache=self.name)
+        return found
+
+    def put(self, key: Hashable, value: Any, prefetched: bool = False, ttl_secs: float = None):
+        with self._lock:
+            expires_at = time.monotonic() + (self.ttl_secs if ttl_secs is None else ttl_secs)
+            self._entries[key] = (expires_at, value, prefetched)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                metrics.inc_counter("cache_evictions", cache=self.name)
+            metrics.set_gauge("cache_size", len(self._entries), cache=self.name)
+
+    def missing(self, keys: Iterable[Hashable]) -> list:
+        """
+        Returns the keys without a valid entry, without touching the LRU order.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                key for key in keys
+                if key not in self._entries or self._entries[key][0] < now
+            ]
@@ -4,13 +4,20 @@ from google.adk import Agent
 # from google.adk.agents.llm_agent import LlmAgent
 from google.genai import types
 from ...config import Config
+from ...shared_libraries.concurrency import adaptive_model
 from ...shared_libraries.callbacks import (
-    rate_limit_callback,
+    sub_agent_before_model,
+    sub_agent_after_model,
     before_agent,
     before_tool,
 )
+from .prompts import get_bq_client_prompt, get_bq_prompt
 from .tools import (
-    connector_tool
+    bound_connector_request,
+    bound_connector_response,
+    connector_tool,
+    execute_sql,
+    next_page,
 )
 
 warnings.filterwarnings("ignore", category=UserWarning, module=".*pydantic.*")
@@ -20,18 +27,29 @@ configs = Config()
 # configure logging __name__
 logger = logging.getLogger(__name__)
 
+if configs.query_settings.executor == "client":
+    executor_settings = dict(
+        instruction=get_bq_client_prompt(),
+        tools=[execute_sql, next_page],
+        before_tool_callback=before_tool,
+    )
+else:
+    executor_settings = dict(
+        instruction=get_bq_prompt(),
+        tools=[connector_tool],
+        before_tool_callback=[before_tool, bound_connector_request],
+        after_tool_callback=bound_connector_response,
+    )
+
 bq_executor_agent = Agent(
-    model="gemini-2.0-flash",
+    model=adaptive_model("gemini-2.0-flash"),
     global_instruction=(
         "You are a backend agent designed to execute SQL queries on BigQuery and return results as structured JSON. Your responses will be processed by other systems."
     ),
-    instruction=(
-        "Use the BigQuery connector tool to execute the SQL query passed to you."
-    ),
     name="big_query_agent",
-    tools=[connector_tool],
-    before_tool_callback=before_tool,
     before_agent_callback=before_agent,
-    before_model_callback=rate_limit_callback,
-    generate_content_config=types.GenerateContentConfig(temperature=0.2)
+    before_model_callback=sub_agent_before_model,
+    after_model_callback=sub_agent_after_model,
+    generate_content_config=types.GenerateContentConfig(temperature=0.2),
+    **executor_settings,
 )
@@ -0,0 +1,416 @@
+"""Static cost and safety checks of the generated SQL, run before execution."""
+
+import functools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+
+from ...config import Config
+
+logger = logging.getLogger(__name__)
+
+configs = Config()
+
+PROJECT = "data-sandbox-410808"
+DATASET = "datascience_playground"
+
+TABLE_SCHEMAS = {
+    "extract_chairs_adk": [
+        "product_id", "ean_id", "label", "category", "colors", "eur_regular_price",
+        "style", "product_type", "main_material", "product_material", "height",
+        "width", "depth", "weight", "img_url", "img_gcs_uri",
+    ],
+    "extract_chairs_reviews_adk": [
+        "product_id", "global_rating", "quality rating", "verbatims", "verbatim_synthesis",
+    ],
+}
+
+FORBIDDEN_STATEMENTS = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop,
+    exp.Alter, exp.Command,
+)
+
+# Rules rewriting the AST, the SQL must then be generated again
+REWRITE_RULES = {"qualify_tables", "expand_star", "prune_columns", "prune_unused_columns", "cap_limit", "drop_empty_statements"}
+
+# Parsed from a lone `;` followed by a comment, not in every sqlglot version
+EMPTY_STATEMENTS = tuple(getattr(exp, name) for name in ("Semicolon",) if hasattr(exp, name))
+
+_table_stats: Optional[dict] = None
+
+
+class SQLGuardError(Exception):
+    """Raised when a query is rejected."""
+
+
+@dataclass
+class GuardResult:
+    sql: str
+    rules: List[str] = field(default_factory=list)
+    estimated_bytes: Optional[int] = None
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+
+    @property
+    def allowed(self) -> bool:
+        return self.error is None
+
+
+def load_table_stats() -> Optional[dict]:
+    """
+    Loads the table statistics: {table: {"rows": int, "columns": {column: avg_bytes}}}.
+    None if the file has not been generated.
+    """
+    global _table_stats
+    if _table_stats is None:
+        path = configs.query_settings.table_stats_path
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            _table_stats = json.load(f)
+    return _table_stats
+
+
+def _reject(result: GuardResult, rule: str, message: str):
+    result.rules.append(rule)
+    raise SQLGuardError(message)
+
+
+def _allowed_columns(table: str) -> List[str]:
+    allowed = set(configs.query_settings.allowed_columns)
+    return [column for column in TABLE_SCHEMAS[table] if column in allowed]
+
+
+def _column(name: str, table: Optional[str] = None) -> exp.Column:
+    return exp.column(name, table=table, quoted=" " in name)
+
+
+def _sources(select: exp.Select, tables: Dict[str, str]) -> List[str]:
+    """
+    Returns the aliases of the allowed tables read by a SELECT.
+    """
+    from_ = select.args.get("from_") or select.args.get("from")
+    nodes = ([from_.this] if from_ else []) + [join.this for join in select.args.get("joins") or []]
+    return [
+        node.alias_or_name for node in nodes
+        if isinstance(node, exp.Table) and node.alias_or_name in tables
+    ]
+
+
+def _index(tree: exp.Expression) -> Dict[type, list]:
+    """
+    Groups the nodes of the AST by type in a single walk, the checks below
+    then avoid walking the tree again.
+    """
+    index = {}
+    for node in tree.walk():
+        index.setdefault(type(node), []).append(node)
+    return index
+
+
+def _check_tables(index: Dict[type, list], result: GuardResult) -> Dict[str, str]:
+    """
+    Enforces the two-table allow-list. Tables named without their project or
+    dataset are qualified, as BigQuery would resolve them against the default
+    dataset of the job.
+
+    Returns:
+        dict: Table name of each alias.
+    """
+    cte_names = {cte.alias_or_name for cte in index.get(exp.CTE, [])}
+    tables = {}
+    for table in index.get(exp.Table, []):
+        if not table.db and table.name in cte_names:
+            continue
+        if (
+            table.name not in TABLE_SCHEMAS
+            or (table.db and table.db != DATASET)
+            or (table.catalog and table.catalog != PROJECT)
+        ):
+            _reject(result, "table_allow_list", f"Table {table.sql(dialect='bigquery')} is not allowed.")
+        if not table.db or not table.catalog:
+            table.set("db", exp.to_identifier(DATASET))
+            table.set("catalog", exp.to_identifier(PROJECT))
+            if "qualify_tables" not in result.rules:
+                result.rules.append("qualify_tables")
+        tables[table.alias_or_name] = table.name
+    return tables
+
+
+def _conjuncts(condition: Optional[exp.Expression]) -> List[exp.Expression]:
+    """
+    Splits a condition on its top-level ANDs: `a AND (b AND c)` gives a, b, c.
+    """
+    if condition is None:
+        return []
+    condition = condition.unnest()
+    if isinstance(condition, exp.And):
+        return _conjuncts(condition.left) + _conjuncts(condition.right)
+    return [condition]
+
+
+def _check_cross_joins(index: Dict[type, list], result: GuardResult):
+    """
+    Rejects joins without an equality between a column of the joined table and
+    a column of another table of the FROM, as a top-level AND term of the ON
+    clause or of the WHERE clause, or a USING clause.
+    """
+    for select in index.get(exp.Select, []):
+        from_ = select.args.get("from_") or select.args.get("from")
+        aliases = {from_.this.alias_or_name} if from_ else set()
+        where = select.args.get("where")
+        for join in select.args.get("joins") or []:
+            joined = join.this.alias_or_name
+            aliases.add(joined)
+            # UNNEST of a column of the row is not a cross product of tables
+            if join.args.get("using") or isinstance(join.this, exp.Unnest):
+                continue
+            conditions = _conjuncts(join.args.get("on")) + _conjuncts(where.this if where else None)
+            join_condition = any(
+                isinstance(eq, exp.EQ)
+                and isinstance(eq.left, exp.Column) and isinstance(eq.right, exp.Column)
+                and {eq.left.table, eq.right.table} <= aliases
+                and joined in (eq.left.table, eq.right.table)
+                and eq.left.table != eq.right.table
+                for eq in conditions
+            )
+            if not join_condition:
+                _reject(result, "cross_join", "Joins must have a condition on product_id.")
+
+
+def _expand_stars(index: Dict[type, list], tables: Dict[str, str], result: GuardResult):
+    """
+    Replaces `*` and `t.*` on the allowed tables by their whitelisted columns.
+    """
+    for select in index.get(exp.Select, []):
+        sources = _sources(select, tables)
+        expressions = []
+        expanded = False
+        for expression in select.expressions:
+            if isinstance(expression, exp.Star) and sources:
+                qualify = len(sources) > 1
+                for alias in sources:
+                    expressions += [
+                        _column(name, alias if qualify else None)
+                        for name in _allowed_columns(tables[alias])
+                    ]
+                expanded = True
+            elif (
+                isinstance(expression, exp.Column)
+                and isinstance(expression.this, exp.Star)
+                and expression.table in tables
+            ):
+                expressions += [
+                    _column(name, expression.table)
+                    for name in _allowed_columns(tables[expression.table])
+                ]
+                expanded = True
+            else:
+                expressions.append(expression)
+        if expanded:
+            select.set("expressions", expressions)
+            result.rules.append("expand_star")
+
+
+def _prune_columns(tree: exp.Expression, index: Dict[type, list], result: GuardResult):
+    """
+    Drops the non-whitelisted columns from the final projection, and the
+    columns of CTEs and subqueries that are never used by the outer query.
+    """
+    blocked = _blocked_columns()
+
+    if isinstance(tree, exp.Select):
+        kept = [
+            expression for expression in tree.expressions
+            if not (isinstance(expression.unalias(), exp.Column) and expression.unalias().name in blocked)
+        ]
+        if not kept:
+            _reject(result, "prune_columns", "The query only selects columns that cannot be returned.")
+        if len(kept) < len(tree.expressions):
+            tree.set("expressions", kept)
+            result.rules.append("prune_columns")
+
+    for scope in index.get(exp.CTE, []) + index.get(exp.Subquery, []):
+        body = scope.this
+        if isinstance(scope, exp.Subquery) and not isinstance(scope.parent, (exp.From, exp.Join)):
+            continue
+        if not isinstance(body, exp.Select) or any(isinstance(e, exp.Star) for e in body.expressions):
+            continue
+        outside = [
+            node for node in index.get(exp.Column, []) + index.get(exp.Star, [])
+            if not _is_inside(node, scope)
+        ]
+        if any(isinstance(node, exp.Star) or isinstance(node.this, exp.Star) for node in outside):
+            continue
+        used = {node.name for node in outside}
+        kept = [e for e in body.expressions if e.alias_or_name in used]
+        if kept and len(kept) < len(body.expressions):
+            body.set("expressions", kept)
+            result.rules.append("prune_unused_columns")
+
+
+def _blocked_columns() -> set:
+    allowed = set(configs.query_settings.allowed_columns)
+    return {column for columns in TABLE_SCHEMAS.values() for column in columns} - allowed
+
+
+def _check_columns(index: Dict[type, list], result: GuardResult):
+    """
+    Rejects the queries still using a non-whitelisted column once the final
+    projection is pruned: in a union, a subquery, an expression or a filter.
+    """
+    blocked = _blocked_columns()
+    for column in index.get(exp.Column, []):
+        if column.name in blocked:
+            _reject(result, "blocked_column", f"Column {column.name} cannot be used.")
+
+
+def _is_inside(node: exp.Expression, scope: exp.Expression) -> bool:
+    parent = node.parent
+    while parent is not None:
+        if parent is scope:
+            return True
+        parent = parent.parent
+    return False
+
+
+def _enforce_limit(tree: exp.Expression, result: GuardResult) -> exp.Expression:
+    """
+    Adds a LIMIT when missing, and caps it to the maximum number of rows.
+    """
+    max_rows = configs.query_settings.max_rows
+    limit = tree.args.get("limit")
+    if limit is None:
+        result.rules.append("add_limit")
+        return tree.limit(max_rows, copy=False)
+
+    if not isinstance(limit, exp.Limit):
+        _reject(result, "cap_limit", "Unsupported LIMIT clause.")
+    # Parameters and expressions cannot be checked, they are replaced by the cap
+    value = limit.expression
+    if not (isinstance(value, exp.Literal) and value.is_int and int(value.this) <= max_rows):
+        limit.set("expression", exp.Literal.number(max_rows))
+        result.rules.append("cap_limit")
+    return tree
+
+
+def _estimate_cost(index: Dict[type, list], tables: Dict[str, str], result: GuardResult):
+    """
+    Estimates the bytes scanned from the table statistics. BigQuery scans every
+    row of each referenced column, whatever the filters. Without statistics,
+    the estimate is left to a dry run (`check_dry_run_cost`).
+    """
+    stats = load_table_stats()
+    if stats is None:
+        result.rules.append("cost_dry_run")
+        return
+
+    columns = {alias: set() for alias in tables}
+    for column in index.get(exp.Column, []):
+        if isinstance(column.this, exp.Star):
+            continue
+        for alias, table in tables.items():
+            if column.table in (alias, "") and column.name in TABLE_SCHEMAS[table]:
+                columns[alias].add(column.name)
+
+    estimated_bytes = 0
+    for alias, table in tables.items():
+        table_stats = stats.get(table, {})
+        column_bytes = table_stats.get("columns", {})
+        scanned = columns[alias] or {TABLE_SCHEMAS[table][0]}
+        estimated_bytes += table_stats.get("rows", 0) * sum(column_bytes.get(c, 0) for c in scanned)
+    result.estimated_bytes = int(estimated_bytes)
+
+    if estimated_bytes > configs.query_settings.max_bytes_scanned:
+        _reject(
+            result, "cost_budget",
+            f"The query would scan about {estimated_bytes / 1e6:.0f} MB, over the budget of "
+            f"{configs.query_settings.max_bytes_scanned / 1e6:.0f} MB. Select fewer columns.",
+        )
+
+
+@functools.lru_cache(maxsize=1024)
+def _guard(query: str) -> Tuple[str, Tuple[str, ...], Optional[int], Optional[str]]:
+    result = GuardResult(sql=query)
+    try:
+        parsed = sqlglot.parse(query, read="bigquery")
+        statements = [s for s in parsed if s is not None and not isinstance(s, EMPTY_STATEMENTS)]
+        if len(statements) < len(parsed):
+            result.rules.append("drop_empty_statements")
+        if len(statements) != 1:
+            _reject(result, "single_statement", "Only one SQL statement can be executed.")
+        tree = statements[0]
+        if not isinstance(tree, exp.Query) or tree.find(*FORBIDDEN_STATEMENTS):
+            _reject(result, "read_only", "Only SELECT queries can be executed.")
+
+        index = _index(tree)
+        tables = _check_tables(index, result)
+        _check_cross_joins(index, result)
+        _expand_stars(index, tables, result)
+        if "expand_star" in result.rules:
+            index = _index(tree)
+        _prune_columns(tree, index, result)
+        if REWRITE_RULES.intersection(result.rules):
+            index = _index(tree)
+        _check_columns(index, result)
+        tree = _enforce_limit(tree, result)
+        _estimate_cost(index, tables, result)
+
+        # Generating the SQL costs as much as parsing it, only do it for AST rewrites
+        if REWRITE_RULES.intersection(result.rules):
+            result.sql = tree.sql(dialect="bigquery")
+        elif "add_limit" in result.rules:
+            result.sql = f"{query.strip().rstrip(';').rstrip()}\nLIMIT {configs.query_settings.max_rows}"
+    except sqlglot.errors.ParseError as e:
+        result.rules.append("parse_error")
+        result.error = f"The query is not valid: {e}"
+    except SQLGuardError as e:
+        result.error = str(e)
+    return result.sql, tuple(result.rules), result.estimated_bytes, result.error
+
+
+def guard_sql(query: str) -> GuardResult:
+    """
+    Parses a generated query and checks it before execution: read-only single
+    statement, allowed tables, no cross join, whitelisted columns, LIMIT and
+    estimated cost (left to `check_dry_run_cost` without table statistics). The query is rewritten when possible, rejected otherwise.
+    Verdicts are memoized, as the same queries are often generated again.
+
+    Returns:
+        GuardResult: The SQL to execute, the rules that fired and the error if rejected.
+    """
+    start = time.perf_counter()
+    sql, rules, estimated_bytes, error = _guard(query)
+    result = GuardResult(sql=sql, rules=list(rules), estimated_bytes=estimated_bytes, error=error)
+    result.elapsed_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"SQL guard rules fired: {result.rules} ({result.elapsed_ms:.2f} ms)")
+    return result
+
+
+def check_dry_run_cost(client, sql: str) -> int:
+    """
+    Estimates the bytes scanned by a query with a BigQuery dry run, used when
+    the table statistics are missing.
+
+    Returns:
+        int: The bytes the query would process.
+
+    Raises:
+        SQLGuardError: If the query is over the byte budget.
+    """
+    from google.cloud import bigquery
+
+    job = client.query(sql, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False))
+    estimated_bytes = job.total_bytes_processed or 0
+    if estimated_bytes > configs.query_settings.max_bytes_scanned:
+        raise SQLGuardError(
+            f"The query would scan about {estimated_bytes / 1e6:.0f} MB, over the budget of "
+            f"{configs.query_settings.max_bytes_scanned / 1e6:.0f} MB. Select fewer columns."
+        )
+    return estimated_bytes
@@ -1,12 +1,311 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+from typing import Any, Callable, Dict, List, Optional
+
+from google.adk.agents.readonly_context import ReadonlyContext
 from google.adk.tools.application_integration_tool.application_integration_toolset import ApplicationIntegrationToolset
+from google.adk.tools.application_integration_tool.integration_connector_tool import IntegrationConnectorTool
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.adk.tools.tool_context import ToolContext
+from google.cloud import bigquery
+
+from ...config import Config
+from ...shared_libraries.blocking_io import run_blocking
 from .prompts import get_bq_prompt
+from .sql_guard import DATASET, PROJECT, TABLE_SCHEMAS, GuardResult, SQLGuardError, check_dry_run_cost, guard_sql
+
+logger = logging.getLogger(__name__)
+
+configs = Config()
+
+# Every column of the two tables, used to tell table columns from computed ones
+TABLE_COLUMNS = {column for columns in TABLE_SCHEMAS.values() for column in columns}
+
+_client: Optional[bigquery.Client] = None
+
+_token_key = (configs.query_settings.page_token_secret or secrets.token_hex(32)).encode("utf-8")
+
+
+def _get_client() -> bigquery.Client:
+    global _client
+    if _client is None:
+        _client = bigquery.Client(project=configs.CLOUD_PROJECT)
+    return _client
+
+
+def project_fields(schema: List[bigquery.SchemaField]) -> List[bigquery.SchemaField]:
+    """
+    Keeps the whitelisted table columns and the computed columns (aggregates, aliases).
+    """
+    allowed = set(configs.query_settings.allowed_columns)
+    return [
+        field for field in schema
+        if field.name in allowed or field.name not in TABLE_COLUMNS
+    ]
+
+
+def _sign(payload: bytes) -> str:
+    return hmac.new(_token_key, payload, hashlib.sha256).hexdigest()
+
+
+def _encode_token(table: str, page_token: str, offset: int) -> str:
+    payload = base64.urlsafe_b64encode(
+        json.dumps({"table": table, "page_token": page_token, "offset": offset}).encode("utf-8")
+    )
+    return f"{payload.decode('ascii')}.{_sign(payload)}"
+
+
+def is_query_results_table(table: str) -> bool:
+    """
+    Tells if a table is the anonymous results table of a query of this project:
+    those live in hidden datasets, whose name starts with `_`.
+    """
+    parts = table.split(".")
+    return len(parts) == 3 and parts[0] == configs.CLOUD_PROJECT and parts[1].startswith("_") and parts[2].startswith("anon")
+
+
+def _decode_token(token: str, is_valid_table: Callable[[str], bool] = is_query_results_table) -> dict:
+    """
+    Checks the signature of a page token and the table it points to.
+    Raises ValueError if the token was not issued by `_encode_token`.
+    """
+    payload, _, signature = token.encode("ascii").partition(b".")
+    if not hmac.compare_digest(_sign(payload), signature.decode("ascii")):
+        raise ValueError("Invalid page token.")
+    decoded = json.loads(base64.urlsafe_b64decode(payload))
+    if not is_valid_table(decoded["table"]):
+        raise ValueError("Invalid page token.")
+    return decoded
+
+
+def _fetch_page(table: str, page_token: Optional[str], offset: int) -> dict:
+    """
+    Reads one page of a query result table through the server-side cursor,
+    only downloading the projected columns.
+    """
+    settings = configs.query_settings
+    client = _get_client()
+    schema = client.get_table(table).schema
+    fields = project_fields(schema)
+
+    page_size = min(settings.page_size, settings.max_rows - offset)
+    iterator = client.list_rows(
+        table,
+        selected_fields=fields,
+        page_size=page_size,
+        page_token=page_token,
+    )
+    page = next(iterator.pages, None)
+    rows = [
+        {key: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+         for key, value in row.items()}
+        for row in (page or [])
+    ][:page_size]
+
+    returned = offset + len(rows)
+    next_page_token = None
+    if iterator.next_page_token and returned < settings.max_rows:
+        next_page_token = _encode_token(table, iterator.next_page_token, returned)
+
+    return {
+        "status": "success",
+        "rows": rows,
+        "total_rows": iterator.total_rows,
+        "returned_rows": returned,
+        "dropped_columns": [f.name for f in schema if f not in fields],
+        "truncated": iterator.total_rows is not None and iterator.total_rows > settings.max_rows,
+        "next_page_token": next_page_token,
+    }
+
+
+def _run_query(guard: GuardResult) -> dict:
+    client = _get_client()
+    if guard.estimated_bytes is None:
+        try:
+            guard.estimated_bytes = check_dry_run_cost(client, guard.sql)
+        except SQLGuardError as e:
+            return {"status": "error", "message": str(e), "guard_rules": guard.rules + ["cost_budget"]}
+
+    # BigQuery fails the query rather than going over the budget, whatever the estimate
+    job_config = bigquery.QueryJobConfig(maximum_bytes_billed=configs.query_settings.max_bytes_scanned)
+    job = client.query(guard.sql, job_config=job_config)
+    job.result(max_results=0)
+    table = f"{job.destination.project}.{job.destination.dataset_id}.{job.destination.table_id}"
+    return _fetch_page(table, None, 0)
+
+
+async def execute_sql(query: str) -> dict:
+    """
+    Executes a BigQuery SQL query and returns the first page of results.
+    The query is checked and rewritten by the SQL guard first.
+
+    Args:
+        query: The SQL query generated by the sql_generator_agent.
+
+    Returns:
+        dict: The rows of the first page, the total number of rows and a
+              `next_page_token` to pass to `next_page` if more rows are available.
+    """
+    guard = guard_sql(query)
+    if not guard.allowed:
+        return {"status": "error", "message": guard.error, "guard_rules": guard.rules}
+
+    try:
+        response = await run_blocking(_run_query, guard, timeout=configs.query_settings.query_timeout_secs)
+        response.setdefault("guard_rules", guard.rules)
+        return response
+    except Exception as e:
+        logger.warning(f"Query failed: {e}")
+        return {"status": "error", "message": str(e)}
+
+
+async def next_page(next_page_token: str) -> dict:
+    """
+    Returns the next page of results of a previously executed SQL query.
+
+    Args:
+        next_page_token: The `next_page_token` returned by `execute_sql` or `next_page`.
+
+    Returns:
+        dict: The rows of the page and the token of the following page, if any.
+    """
+    try:
+        token = _decode_token(next_page_token)
+        return await run_blocking(
+            _fetch_page, token["table"], token["page_token"], token["offset"],
+            timeout=configs.query_settings.query_timeout_secs,
+        )
+    except Exception as e:
+        logger.warning(f"Could not fetch next page: {e}")
+        return {"status": "error", "message": str(e)}
+
+
+def _build_connector_toolset() -> ApplicationIntegrationToolset:
+    return ApplicationIntegrationToolset(
+        project=PROJECT,
+        location="europe-west1",
+        connection="bq-test-adk",
+        entity_operations={f"{DATASET}.{table}": ["LIST"] for table in TABLE_SCHEMAS},
+        tool_instructions=get_bq_prompt(),
+    )
+
+
+class ConnectorToolset(BaseToolset):
+    """
+    The Integration Connector listing the rows of the two tables. The
+    connection is fetched from the Connectors API on first use rather than
+    at import, in the blocking I/O pool.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._toolset: Optional[ApplicationIntegrationToolset] = None
+
+    async def get_tools(self, readonly_context: Optional[ReadonlyContext] = None) -> List[BaseTool]:
+        if self._toolset is None:
+            self._toolset = await run_blocking(
+                _build_connector_toolset, timeout=configs.query_settings.query_timeout_secs
+            )
+        return await self._toolset.get_tools(readonly_context)
+
+    async def close(self) -> None:
+        if self._toolset is not None:
+            await self._toolset.close()
+
+
+connector_tool = ConnectorToolset()
+
+
+def _connector_table(tool: BaseTool) -> Optional[str]:
+    """
+    Returns the table listed by a connector tool, whose name ends with the entity.
+    """
+    if not isinstance(tool, IntegrationConnectorTool):
+        return None
+    return next((table for table in TABLE_SCHEMAS if tool.name.endswith(table)), None)
+
+
+def _offset_key(tool_context: ToolContext) -> str:
+    return f"temp:connector_offset:{tool_context.function_call_id}"
+
+
+def bound_connector_request(
+    tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext
+) -> Optional[dict]:
+    """
+    Callback before a connector tool is called. Checks the filter with the
+    SQL guard, caps the page size to the row budget left and swaps the signed
+    page token for the connector one.
+    """
+    table = _connector_table(tool)
+    if table is None:
+        return None
+
+    settings = configs.query_settings
+    filter_clause = args.get("filter_clause")
+    if filter_clause:
+        guard = guard_sql(f"SELECT product_id FROM `{PROJECT}.{DATASET}.{table}` WHERE {filter_clause}")
+        if not guard.allowed:
+            return {"status": "error", "message": guard.error, "guard_rules": guard.rules}
+
+    offset = 0
+    if args.get("page_token"):
+        try:
+            token = _decode_token(args["page_token"], lambda name: name == table)
+        except Exception as e:
+            logger.warning(f"Could not fetch next page: {e}")
+            return {"status": "error", "message": str(e)}
+        args["page_token"] = token["page_token"]
+        offset = token["offset"]
+
+    if offset >= settings.max_rows:
+        return {"status": "error", "message": f"Results are capped to {settings.max_rows} rows."}
+    requested = int(args.get("page_size") or settings.page_size)
+    args["page_size"] = min(requested, settings.page_size, settings.max_rows - offset)
+    tool_context.state[_offset_key(tool_context)] = offset
+    return None
+
+
+def bound_connector_response(
+    tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext, tool_response: Any
+) -> Optional[dict]:
+    """
+    Callback after a connector tool is called. Projects the rows on the
+    whitelisted columns, drops the rows over the page size and signs the
+    token of the next page, if the row budget is not spent. Errors and
+    authentication requests are returned as is.
+    """
+    table = _connector_table(tool)
+    if table is None or not isinstance(tool_response, dict) or "connectorOutputPayload" not in tool_response:
+        return None
+
+    settings = configs.query_settings
+    allowed = set(settings.allowed_columns)
+    payload = tool_response["connectorOutputPayload"]
+    rows = payload if isinstance(payload, list) else [payload]
+
+    dropped = sorted({key for row in rows for key in row if key not in allowed and key in TABLE_COLUMNS})
+    rows = [
+        {key: value for key, value in row.items() if key in allowed or key not in TABLE_COLUMNS}
+        for row in rows
+    ][:args.get("page_size", settings.page_size)]
+
+    returned = tool_context.state.get(_offset_key(tool_context), 0) + len(rows)
+    has_more = bool(tool_response.get("nextPageToken"))
+    next_page_token = None
+    if has_more and returned < settings.max_rows:
+        next_page_token = _encode_token(table, tool_response["nextPageToken"], returned)
 
-connector_tool = ApplicationIntegrationToolset(
-    project="data-sandbox-410808",
-    location="europe-west1",
-    connection="bq-test-adk",
-    entity_operations={
-        "datascience_playground.extract_chairs_adk": ["LIST"],
-        "datascience_playground.extract_chairs_reviews_adk": ["LIST"],},
-    tool_instructions=get_bq_prompt()
-)
+    return {
+        "status": "success",
+        "rows": rows,
+        "returned_rows": returned,
+        "dropped_columns": dropped,
+        "truncated": has_more and returned >= settings.max_rows,
+        "next_page_token": next_page_token,
+    }
@@ -4,6 +4,8 @@ from vertexai.preview import rag
 
 from dotenv import load_dotenv
 from .prompts import return_instructions_root
+from ...shared_libraries.concurrency import adaptive_model
+from ...shared_libraries.callbacks import sub_agent_before_model, sub_agent_after_model
 
 load_dotenv()
 
@@ -22,10 +24,12 @@ ask_vertex_retrieval = VertexAiRagRetrieval(
 )
 
 rag_agent = Agent(
-    model='gemini-2.0-flash-001',
+    model=adaptive_model('gemini-2.0-flash-001'),
     name='ask_rag_agent',
     instruction=return_instructions_root(),
     tools=[
         ask_vertex_retrieval,
-    ]
+    ],
+    before_model_callback=sub_agent_before_model,
+    after_model_callback=sub_agent_after_model,
 )
\ No newline at end of file
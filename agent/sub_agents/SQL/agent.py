@@ -2,9 +2,11 @@ import logging
 import warnings
 from google.adk import Agent
 from ...config import Config
-from .prompts import create_sql_prompt
+from ...shared_libraries.concurrency import adaptive_model
+from .prompt_builder import sql_instruction
 from ...shared_libraries.callbacks import (
-    rate_limit_callback,
+    sub_agent_before_model,
+    sub_agent_after_model,
     before_agent,
     before_tool,
 )
@@ -17,11 +19,12 @@ logger = logging.getLogger(__name__)
 
 
 sql_generator_agent = Agent(
-    model="gemini-2.0-flash-001",
+    model=adaptive_model("gemini-2.0-flash-001"),
     global_instruction="You help a customer of Maisons du Monde to choose a chair.",
-    instruction=create_sql_prompt(),
+    instruction=sql_instruction,
     name="sql_agent",
     before_tool_callback=before_tool,
     before_agent_callback=before_agent,
-    before_model_callback=rate_limit_callback,
+    before_model_callback=sub_agent_before_model,
+    after_model_callback=sub_agent_after_model,
 )
@@ -0,0 +1,163 @@
+"""Assembles the SQL generator prompt from the sections relevant to a request."""
+
+import functools
+import logging
+import re
+import unicodedata
+from typing import FrozenSet, Optional
+
+from google.adk.agents.readonly_context import ReadonlyContext
+
+from .prompts import (
+    COLORS,
+    ENUM_SECTIONS,
+    ENUMS_HEADER,
+    EXAMPLES,
+    HEADER,
+    INSTRUCTIONS,
+    MAIN_MATERIALS,
+    PRODUCT_MATERIALS,
+    STYLES,
+    TABLE_SECTIONS,
+    create_sql_prompt,
+    format_example,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_EXAMPLES = 3
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercases and strips accents, so `Doré` matches `dore`.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _values(values) -> set:
+    """
+    Vocabulary of a French value list: the values and their parts, e.g.
+    `Epuré - Contemporain` gives `epure - contemporain`, `epure` and `contemporain`.
+    """
+    words = set()
+    for value in values:
+        value = normalize(value)
+        words.add(value)
+        words.update(part.strip() for part in re.split(r"[-/|]", value) if len(part.strip()) > 2)
+    return words
+
+
+VOCABULARY = {
+    "reviews": {
+        "review", "reviews", "rating", "ratings", "rated", "note", "avis", "verbatim", "verbatims",
+        "feedback", "opinion", "opinions", "comment", "comments", "quality", "satisfaction", "satisfied",
+        "star", "stars", "synthesis", "customers say", "complaint", "complaints", "best rated",
+    },
+    "colors": _values(COLORS) | {
+        "color", "colors", "colour", "colours", "couleur", "black", "white", "khaki", "green", "grey",
+        "gray", "brown", "gold", "golden", "yellow", "light wood", "dark wood", "ochre", "pink", "silver",
+        "blue", "navy", "teal", "cream", "chalk", "red", "orange", "purple", "taupe",
+    },
+    "style": _values(STYLES) | {
+        "style", "styles", "classic", "scandinavian", "scandi", "nordic", "contemporary", "modern",
+        "minimalist", "minimal", "refined", "traditional", "artistic", "country", "rustic", "farmhouse",
+        "industrial", "loft", "bohemian", "boho", "ethnic", "exotic", "travel", "vintage",
+    },
+    "main_material": _values(MAIN_MATERIALS) | {
+        "material", "materials", "matiere", "made of", "wood", "wooden", "plastic", "steel", "metal", "iron",
+    },
+    "product_material": (_values(PRODUCT_MATERIALS) - {"none"}) | {
+        "material", "materials", "matiere", "made of", "fabric", "upholstery", "upholstered", "textile",
+        "velvet", "suede", "coated", "rattan", "cane", "wicker", "linen", "leather", "leatherette",
+    },
+    "price": {
+        "price", "prices", "prix", "cheap", "cheaper", "cheapest", "expensive", "euro", "euros", "eur",
+        "budget", "cost", "affordable", "less than", "under",
+    },
+    "dimensions": {
+        "height", "width", "depth", "weight", "tall", "high", "wide", "deep", "heavy", "cm", "size",
+        "dimension", "dimensions", "kg", "grams",
+    },
+}
+
+PRODUCT_ID_PATTERN = re.compile(r"\b\d{6}\b|product id")
+
+
+@functools.lru_cache(maxsize=4096)
+def select_sections(question: str) -> Optional[FrozenSet[str]]:
+    """
+    Matches a request against the catalog vocabulary.
+
+    Returns:
+        frozenset: The sections the request needs, or None if nothing was
+                   recognized and the full prompt should be used.
+    """
+    text = f" {re.sub(r'[^a-z0-9€ ]+', ' ', normalize(question))} "
+    sections = {
+        section for section, words in VOCABULARY.items()
+        if any(f" {word} " in text for word in words)
+    }
+    if PRODUCT_ID_PATTERN.search(text):
+        sections.add("product_id")
+    if not sections:
+        return None
+    # Product data is needed by nearly every request, and to join the reviews
+    sections.add("products")
+    return frozenset(sections)
+
+
+def _select_examples(sections: FrozenSet[str]) -> list:
+    scored = []
+    for index, (tags, question, sql) in enumerate(EXAMPLES):
+        if "reviews" in tags and "reviews" not in sections:
+            continue
+        score = len((tags - {"products"}) & sections)
+        if score:
+            scored.append((-score, index))
+    if not scored:
+        scored = [(0, 0)]
+    return [EXAMPLES[index] for _, index in sorted(scored)[:MAX_EXAMPLES]]
+
+
+@functools.lru_cache(maxsize=256)
+def assemble_sql_prompt(sections: FrozenSet[str]) -> str:
+    """
+    Builds the prompt variant of a set of sections. Variants are cached, there
+    are only a few dozen of them.
+    """
+    enums = [ENUM_SECTIONS[name] for name in ENUM_SECTIONS if name in sections]
+    return (
+        HEADER
+        + "".join(TABLE_SECTIONS[name] for name in TABLE_SECTIONS if name in sections)
+        + (ENUMS_HEADER + "".join(enums) if enums else "")
+        + INSTRUCTIONS
+        + "".join(format_example(question, sql) for _, question, sql in _select_examples(sections))
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def full_sql_prompt() -> str:
+    return create_sql_prompt()
+
+
+def build_sql_prompt(question: Optional[str]) -> str:
+    """
+    Returns the prompt with only the tables, value lists and examples relevant
+    to the request, or the full prompt when the request is not recognized.
+    """
+    sections = select_sections(question) if question else None
+    if sections is None:
+        return full_sql_prompt()
+    return assemble_sql_prompt(sections)
+
+
+def sql_instruction(readonly_context: ReadonlyContext) -> str:
+    """
+    Instruction provider of the SQL generator agent, reading the request sent
+    through the AgentTool call.
+    """
+    content = readonly_context.user_content
+    question = " ".join(part.text for part in (content.parts or []) if part.text) if content else None
+    return build_sql_prompt(question)
@@ -1,84 +1,102 @@
-def create_sql_prompt():
-    return """
+HEADER = """
     You are a highly specialized BigQuery SQL Query Generator Agent.
     Your sole purpose is to translate user requests into accurate, executable BigQuery SQL queries.
     These queries will be used by another agent to retrieve data.
 
     **DO NOT execute the queries yourself. Only generate and return the SQL query as a string.**
 
-    You have access to the following two tables in the `datascience_playground` dataset:
+    You have access to the following tables in the `datascience_playground` dataset:
+"""
 
+TABLE_SECTIONS = {
+    "products": """
     ---
 
-    1. **`datascience_playground.extract_chairs_adk` (for chair product information)**  
-    * **Description:** Contains detailed information about various chair products.  
+    **`datascience_playground.extract_chairs_adk` (for chair product information)**
+    * **Description:** Contains detailed information about various chair products.
     * **Schema:**
-        - `product_id` (STRING): Unique product identifier.  
-        - `ean_id` (STRING): EAN of the product.  
-        - `label` (STRING): Product name.  
-        - `category` (STRING): Product category.  
-        - `colors` (STRING): Product colors, separated by '|' (in **French**).  
-        - `eur_regular_price` (FLOAT): Price in euros (without discount).  
-        - `style` (STRING): Product style, delimited by '-' (in **French**).  
+        - `product_id` (STRING): Unique product identifier.
+        - `ean_id` (STRING): EAN of the product.
+        - `label` (STRING): Product name.
+        - `category` (STRING): Product category.
+        - `colors` (STRING): Product colors, separated by '|' (in **French**).
+        - `eur_regular_price` (FLOAT): Price in euros (without discount).
+        - `style` (STRING): Product style, delimited by '-' (in **French**).
         - `product_type` (STRING): Product type used by the purchasing department (in **French**).
-        - `main_material` (STRING): Main material (in **French**).  
-        - `product_material` (STRING): Material used in the product (in **French**).  
-        - `height`, `width`, `depth` (FLOAT): Dimensions in centimeters.  
-        - `weight` (FLOAT): Product weight in grams.  
+        - `main_material` (STRING): Main material (in **French**).
+        - `product_material` (STRING): Material used in the product (in **French**).
+        - `height`, `width`, `depth` (FLOAT): Dimensions in centimeters.
+        - `weight` (FLOAT): Product weight in grams.
         - `img_url`, `img_gcs_uri` (STRING): Product image references.
-
+""",
+    "reviews": """
     ---
 
-    2. **`datascience_playground.extract_chairs_reviews_adk` (for chair product reviews)**  
+    **`datascience_playground.extract_chairs_reviews_adk` (for chair product reviews)**
     * **Description:** Contains customer review content.
     * **Schema:**
         - `product_id` (STRING): Product identifier (foreign key to `extract_chairs_adk`).
         - `global_rating` (FLOAT): Average global rating of the product.
         - `quality rating` (FLOAT): Average quality rating of the product.
-        - `verbatims` (STRING): Raw user feedback, separated by `\n`.
+        - `verbatims` (STRING): Raw user feedback, separated by `\\n`.
         - `verbatim_synthesis` (STRING): Summary of key positive and negative points from reviews (in **French**).
+""",
+}
 
+ENUMS_HEADER = """
     ---
 
     **IMPORTANT: The values in the following fields are in French. Use these exact values for comparisons and filters.**
+"""
+
+COLORS = [
+    "Noir", "Beige", "Blanc", "Kaki", "Vert", "Terracotta", "Gris clair", "Anthracite", "Marron", "Doré", "Jaune",
+    "Bois clair", "Bois moyen", "Bois foncé", "Ecureuil", "Ocre", "Gris chiné", "Camel", "Blush", "Argent", "Bleu",
+    "Bleu nuit", "Bleu pétrole", "Bleu canard", "Cappuccino", "Craie", "Vieux rose", "Greige", "Sapin", "Olive",
+]
+
+STYLES = [
+    "Chic - Classique", "Scandicraft - Contemporain", "Epuré - Contemporain", "Tradi - Classique",
+    "Arty - Contemporain", "Campagne - Classique", "Neo indus - Autre", "Bohème - Ethnique",
+    "Exo chic - Ethnique", "Craft voyage - Ethnique",
+]
+
+MAIN_MATERIALS = ["Bois", "PP - Polypropylène", "Acier"]
 
+PRODUCT_MATERIALS = ["Polyester", "Velours", "Suédine / Textile enduit", "Rotin", "Lin", "Cuir", "None"]
+
+
+def _bullets(values) -> str:
+    return "\n".join(f"    - `{value}`" for value in values)
+
+
+ENUM_SECTIONS = {
+    "colors": f"""
     ### `colors` (Examples):
-    `Noir`, `Beige`, `Blanc`, `Kaki`, `Vert`, `Terracotta`, `Gris clair`, `Anthracite`, `Marron`, `Doré`, `Jaune`,
-    `Bois clair`, `Bois moyen`, `Bois foncé`, `Ecureuil`, `Ocre`, `Gris chiné`, `Camel`, `Blush`, `Argent`, `Bleu`,
-    `Bleu nuit`, `Bleu pétrole`, `Bleu canard`, `Cappuccino`, `Craie`, `Vieux rose`, `Greige`, `Sapin`, `Olive`, etc.
+    {", ".join(f"`{color}`" for color in COLORS)}, etc.
 
     Values can be **composite** and **delimited with `|`**, e.g.:
     - `Beige | Noir`
     - `Blanc | Bois moyen`
     - `Beige | Bois foncé | Marron`
     - `Bois moyen | Gris clair`
-
+""",
+    "style": f"""
     ### `style` (Full list):
-    - `Chic - Classique`
-    - `Scandicraft - Contemporain`
-    - `Epuré - Contemporain`
-    - `Tradi - Classique`
-    - `Arty - Contemporain`
-    - `Campagne - Classique`
-    - `Neo indus - Autre`
-    - `Bohème - Ethnique`
-    - `Exo chic - Ethnique`
-    - `Craft voyage - Ethnique`
-
+{_bullets(STYLES)}
+""",
+    "main_material": f"""
     ### `main_material` (Full list):
-    - `Bois`
-    - `PP - Polypropylène`
-    - `Acier`
-
+{_bullets(MAIN_MATERIALS)}
+""",
+    "product_material": f"""
     ### `product_material` (Full list):
-    - `Polyester`
-    - `Velours`
-    - `Suédine / Textile enduit`
-    - `Rotin`
-    - `Lin`
-    - `Cuir`
+{_bullets(PRODUCT_MATERIALS[:-1])}
     - `None` (when no data is available)
+""",
+}
 
+INSTRUCTIONS = """
     ---
 
     **Instructions for Query Generation:**
@@ -95,45 +113,53 @@ def create_sql_prompt():
     ---
 
     **Examples of User Requests and Expected SQL Output:**
+"""
 
-    * **User:** "Show me the name and price of a chair with product ID '242785'."
-        **SQL:**
-        ```
+# Each example lists the sections it illustrates, to pick the ones matching a request
+EXAMPLES = [
+    ({"products", "product_id"}, "Show me the name and price of a chair with product ID '242785'.", """
         SELECT label, eur_regular_price
         FROM datascience_playground.extract_chairs_adk
-        WHERE product_id = '242785'
-        ```
-
-    * **User:** "List all chairs that are black."
-        **SQL:**
-        ```
+        WHERE product_id = '242785'"""),
+    ({"products", "colors"}, "List all chairs that are black.", """
         SELECT product_id, label, colors
         FROM datascience_playground.extract_chairs_adk
-        WHERE INSTR(colors, 'Noir') > 0
-        ```
-
-    * **User:** "What are the synthesis of reviews for product '216400'?"
-        **SQL:**
-        ```
+        WHERE INSTR(colors, 'Noir') > 0"""),
+    ({"reviews", "product_id"}, "What are the synthesis of reviews for product '216400'?", """
         SELECT verbatim_synthesis
         FROM datascience_playground.extract_chairs_reviews_adk
-        WHERE product_id = '216400'
-        ```
-
-    * **User:** "Find chairs made of wood with a price smaller than 500 euros."
-        **SQL:**
-        ```
+        WHERE product_id = '216400'"""),
+    ({"products", "main_material", "price"}, "Find chairs made of wood with a price smaller than 500 euros.", """
         SELECT product_id, label, eur_regular_price, main_material
         FROM datascience_playground.extract_chairs_adk
-        WHERE main_material = 'Bois' AND eur_regular_price < 500
-        ```
-
-    * **User:** "Get the product name and a summary of reviews for product '230479'."
-        **SQL:**
-        ```
+        WHERE main_material = 'Bois' AND eur_regular_price < 500"""),
+    ({"products", "reviews", "product_id"}, "Get the product name and a summary of reviews for product '230479'.", """
         SELECT t1.label, t2.verbatim_synthesis
         FROM datascience_playground.extract_chairs_adk AS t1
         JOIN datascience_playground.extract_chairs_reviews_adk AS t2
         ON t1.product_id = t2.product_id
-        WHERE t1.product_id = '230479'
-    ```"""
+        WHERE t1.product_id = '230479'"""),
+]
+
+
+def format_example(question: str, sql: str) -> str:
+    return f"""
+    * **User:** "{question}"
+        **SQL:**
+        ```{sql}
+        ```
+"""
+
+
+def create_sql_prompt():
+    """
+    The full prompt, with every table, value list and example.
+    """
+    return (
+        HEADER
+        + "".join(TABLE_SECTIONS.values())
+        + ENUMS_HEADER
+        + "".join(ENUM_SECTIONS.values())
+        + INSTRUCTIONS
+        + "".join(format_example(question, sql) for _, question, sql in EXAMPLES)
+    )
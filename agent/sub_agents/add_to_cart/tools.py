@@ -1,7 +1,24 @@
+import time
+from typing import Dict, List
+
 from google.adk.tools.tool_context import ToolContext
 
+from ...config import Config
+from ...shared_libraries import metrics
+from ...shared_libraries.prefetch import prefetcher
+from ...shared_libraries.product_cache import get_product_details
+from ...shared_libraries.ttl_cache import TTLCache
+
+configs = Config()
+
+stock_cache = TTLCache(
+    "stock",
+    max_size=configs.prefetch_settings.cache_max_size,
+    ttl_secs=configs.prefetch_settings.stock_cache_ttl_secs,
+)
 
-def add_product(
+
+async def add_product(
     product_id: str,
     product_name: str,
     in_stock: bool = True,
@@ -26,17 +43,24 @@ def add_product(
 
     basket = profile.get("basket", [])
 
+    # The label and price come from the catalog, the name given by the model is a fallback
+    detail = (await get_product_details([product_id]))[str(product_id)]
+    label = detail["label"] if detail and detail["label"] else product_name
+    unit_price = detail["eur_regular_price"] if detail and detail["eur_regular_price"] is not None else 0.0
+
     # Check if product is already in basket
     for item in basket:
         if item["product_id"] == product_id:
             item["quantity"] += quantity
+            if not item.get("unit_price"):
+                item["unit_price"] = unit_price
             break
     else:
         basket.append({
             "product_id": product_id,
-            "label": product_name,
+            "label": label,
             "quantity": quantity,
-            "unit_price": 0.0,
+            "unit_price": unit_price,
         })
 
     profile["basket"] = basket
@@ -45,15 +69,48 @@ def add_product(
     return {
         "status": "success",
         "product_id": product_id,
-        "product_name": product_name,
+        "product_name": label,
+        "unit_price": unit_price,
         "quantity_added": quantity,
         "current_basket": basket
     }
 
 
+def fetch_stock(product_ids: List[str]) -> Dict[str, bool]:
+    """
+    Mock function to check if products are available in stock.
+    """
+    return {product_id: True for product_id in product_ids}
+
+
+def get_stock(product_ids: List[str], prefetched: bool = False) -> Dict[str, bool]:
+    """
+    Returns the stock availability of several products, read through the stock cache.
+    """
+    stock = stock_cache.get_many(product_ids)
+    missing = [product_id for product_id in product_ids if product_id not in stock]
+    if missing:
+        start = time.perf_counter()
+        for product_id, in_stock in fetch_stock(missing).items():
+            stock_cache.put(product_id, in_stock, prefetched=prefetched)
+            stock[product_id] = in_stock
+        metrics.inc_counter("cache_fetch_secs", time.perf_counter() - start, cache="stock")
+        metrics.inc_counter("cache_fetches", cache="stock")
+    return stock
+
+
 def is_product_in_stock(product_id: str) -> dict:
     """
-    Mock function to check if a product is available in stock.
+    Checks if a product is available in stock.
     """
 
-    return {"product_id": product_id, "in_stock": True}
+    return {"product_id": product_id, "in_stock": get_stock([product_id])[product_id]}
+
+
+async def warm_stock(product_ids: List[str]):
+    missing = stock_cache.missing(product_ids)
+    if missing:
+        get_stock(missing, prefetched=True)
+
+
+prefetcher.register_warmer("stock", warm_stock)
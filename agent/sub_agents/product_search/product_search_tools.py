@@ -2,51 +2,105 @@
 We already deployed the ADK agent, therefore we'll anonymise our project names and buckets here."""
 
 from __future__ import annotations
-import requests
+import asyncio
+import httpx
 import json
+import re
 from google.auth import default
 from google.auth.transport.requests import Request
 from google.adk.tools.tool_context import ToolContext
 import logging
 
+from ...config import Config
+from ...shared_libraries.blocking_io import run_blocking
+from ...shared_libraries.product_cache import get_product_details
 
-def product_similarity(tool_context: ToolContext) -> dict:
+configs = Config()
+
+VISION_URL = "https://vision.googleapis.com/v1/images:annotate"
+# Maximum number of images accepted by one annotate call
+VISION_MAX_BATCH = 16
+
+# Product IDs of the catalog are numeric
+CATALOG_PRODUCT_ID = re.compile(r"\d+")
+
+_credentials = None
+_http_client: httpx.AsyncClient | None = None
+
+
+async def product_similarity(tool_context: ToolContext) -> dict:
     """
-    Calls the Vision Product Search API with the uploaded image's GCS URI
-    stored in the callback_context.state.
+    Calls the Vision Product Search API with the GCS URIs of the images uploaded
+    in the latest message, stored in the callback_context.state.
+    Similar products are grouped per image.
     """
     logging.info("[Product Similarity Tool] Invoked.")
 
     try:
         logging.info(f"[Product Similarity Tool] tool_context.state contents: {tool_context.state}")
 
-        # Extract GCS URI from state
-        gcs_uri = tool_context.state.get("uploaded_image_gcs_uri")
-        logging.info(f"[Product Similarity Tool] GCS URI received: {gcs_uri}")
+        # Extract GCS URIs from state
+        gcs_uris = tool_context.state.get("uploaded_image_gcs_uris")
+        if not gcs_uris and tool_context.state.get("uploaded_image_gcs_uri"):
+            gcs_uris = [tool_context.state.get("uploaded_image_gcs_uri")]
+        logging.info(f"[Product Similarity Tool] GCS URIs received: {gcs_uris}")
 
-        if not gcs_uri:
+        if not gcs_uris:
             return {"status": "error", "message": "No uploaded image found in context."}
 
-        response_text = get_mkp_products(gcs_uri)
-        logging.info(f"[Product Similarity Tool] API raw response: {response_text}")
-
-        list_similar_products = quick_parse(response_text)
-        logging.info(f"[Product Similarity Tool] Parsed similar products: {list_similar_products}")
-
-        return {"status": "success", "similar_products": list_similar_products}
-
+        similar_products = await search_similar_products(gcs_uris)
+        logging.info(f"[Product Similarity Tool] Parsed similar products: {similar_products}")
+
+        # Prices and labels from the catalog, without another SQL query. Only
+        # the Vision products found in the catalog under the same ID are kept
+        details = await get_product_details(
+            product_id for group in similar_products for product_id in group["product_ids"]
+        )
+        for group in similar_products:
+            product_ids = group.pop("product_ids")
+            group["products"] = [
+                details[product_id] for product_id in product_ids
+                if details[product_id] and str(details[product_id]["product_id"]) == product_id
+            ]
+            if len(group["products"]) < len(product_ids):
+                logging.info(
+                    f"[Product Similarity Tool] {len(product_ids) - len(group['products'])} "
+                    f"products of {group['image']} not found in the catalog."
+                )
+
+        return {"status": "success", "similar_products": similar_products}
+
+    except httpx.HTTPStatusError as e:
+        logging.warning(f"[Product Similarity Tool] Vision API error {e.response.status_code}: {e.response.text[:500]}")
+        return {"status": "error", "message": f"Vision API returned HTTP {e.response.status_code}."}
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        logging.warning(f"[Product Similarity Tool] Vision API call failed: {e}")
+        return {"status": "error", "message": f"Vision API call failed: {e}"}
     except Exception as e:
         logging.exception("[Product Similarity Tool] Exception occurred:")
         return {"status": "error", "message": str(e)}
 
 
-def get_json(link):
+def vision_product_id(product: dict) -> str | None:
     """
-    Generates the request in JSON format.
+    Returns the catalog product ID of a Vision product: its `product_id` label
+    if set, else the ID ending its resource name (projects/.../products/<id>).
+    None if it is not a catalog product ID.
+    """
+    labels = {label.get('key'): label.get('value') for label in product.get('productLabels', [])}
+    product_id = labels.get('product_id') or product.get('name', '').rsplit('/', 1)[-1]
+    return product_id if CATALOG_PRODUCT_ID.fullmatch(product_id or '') else None
+
+
+def get_json(links):
+    """
+    Generates the request in JSON format, with one entry per image.
 
     Args:
-        link (str): GCS URI of the image.
+        links (str | list[str]): GCS URI(s) of the image(s).
     """
+    if isinstance(links, str):
+        links = [links]
     return {"requests": [
       {
         "image": {
@@ -70,61 +124,98 @@ def get_json(link):
           }
         }
       }
+      for link in links
     ]
     }
 
 
-def get_mkp_products(link):
-
+async def _get_access_token() -> str:
+    """
+    Returns a valid access token, refreshing the shared credentials in the
+    blocking I/O thread pool only when they expired.
     """
-    Queries the Google Cloud Vision AI Product Search API to find products similar to a GCS image.
-    Handles Google Cloud authentication, builds, and sends the API request.
+    global _credentials
+    if _credentials is None:
+        _credentials, _ = await run_blocking(default)
+    if not _credentials.valid:
+        await run_blocking(
+            _credentials.refresh, Request(),
+            timeout=configs.io_settings.vision_connect_timeout_secs,
+        )
+    return _credentials.token
+
+
+async def get_mkp_products_async(links):
+    """
+    Queries the Google Cloud Vision AI Product Search API to find products
+    similar to GCS images. The API is called with a shared httpx client so
+    other sessions keep being served while the request is in flight.
 
     Args:
-        link (str): Google Cloud Storage (GCS) URI of the image.
+        links (str | list[str]): GCS URI(s) of the image(s), sent in one annotate call.
 
     Returns:
         str: Raw JSON response from the Google Cloud Vision API.
-    """
-
-    url = "https://vision.googleapis.com/v1/images:annotate"
 
-    credentials, project = default()
-
-    credentials.refresh(Request())
-    access_token = credentials.token
+    Raises:
+        httpx.HTTPStatusError: If the API answered with an error status.
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=httpx.Timeout(
+            configs.io_settings.vision_read_timeout_secs,
+            connect=configs.io_settings.vision_connect_timeout_secs,
+        ))
 
     headers = {
-        "Authorization": f"Bearer {access_token}",
+        "Authorization": f"Bearer {await _get_access_token()}",
         "x-goog-user-project": "OUR PROJECT",
         "Content-Type": "application/json; charset=utf-8"
     }
 
-    data = get_json(link)
-    response = requests.post(url, headers=headers, json=data, timeout=(5, 30))
+    response = await _http_client.post(VISION_URL, headers=headers, json=get_json(links))
+    response.raise_for_status()
 
     return response.text
 
 
-def quick_parse(response_text):
+async def search_similar_products(links):
     """
-    Parses a JSON string of product search results into a list of product names.
-
-    Extracts the product display name from the results.
+    Searches the products similar to several images with batched annotate calls.
+    A product found for several images is only kept for the image where it scored best.
 
     Args:
-        response_text (str): JSON string of search results.
+        links (list[str]): GCS URIs of the images.
 
     Returns:
-        list[str]: A list of product display names.
-                   Returns an empty list if the structure is not found.
+        list[dict]: One entry per image, with its GCS URI, similar product names and their product IDs.
     """
-    data = json.loads(response_text)
+    batches = [links[i:i + VISION_MAX_BATCH] for i in range(0, len(links), VISION_MAX_BATCH)]
+    response_texts = await asyncio.gather(*(get_mkp_products_async(batch) for batch in batches))
+
+    responses = []
+    for response_text in response_texts:
+        logging.info(f"[Product Similarity Tool] API raw response: {response_text}")
+        responses.extend(json.loads(response_text).get('responses', []))
 
-    product_names = []
-    for response in data.get('responses', []):
+    # Best score and image of each product, across images
+    best = {}
+    for image_index, response in enumerate(responses):
         for result in response.get('productSearchResults', {}).get('results', []):
-            if 'product' in result and 'displayName' in result['product']:
-                product_names.append(result['product']['displayName'])
+            name = result.get('product', {}).get('displayName')
+            if name is None:
+                continue
+            score = result.get('score', 0)
+            product_id = vision_product_id(result['product'])
+            if name not in best or score > best[name][0]:
+                best[name] = (score, image_index, product_id)
+
+    grouped = [{"image": link, "similar_products": [], "product_ids": []} for link in links]
+    for name, (score, image_index, product_id) in sorted(best.items(), key=lambda item: -item[1][0]):
+        if image_index < len(grouped):
+            grouped[image_index]["similar_products"].append(name)
+            if product_id:
+                grouped[image_index]["product_ids"].append(product_id)
+
+    return grouped
 
-    return product_names
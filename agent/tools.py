@@ -1,14 +1,18 @@
 from google.adk.tools.tool_context import ToolContext
 from pydantic import BaseModel
+from typing import List
 import json
 
+from .shared_libraries.product_cache import with_product_details
+from .shared_libraries.review_store import get_review_summaries
+
 
 class CustomerProfileUpdate(BaseModel):
     field: str
     value: str
 
 
-def get_customer_profile(tool_context: ToolContext) -> dict:
+async def get_customer_profile(tool_context: ToolContext) -> dict:
     """
     Retrieves the customer's stored profile information.
 
@@ -16,10 +20,23 @@ def get_customer_profile(tool_context: ToolContext) -> dict:
         tool_context: Provided automatically by ADK.
 
     Returns:
-        dict: The customer's profile data and returning user status.
+        dict: The customer's profile data and returning user status. Basket
+              and purchase items carry the catalog details of their product.
     """
     profile = tool_context.state.get("customer:profile", {})
 
+    if isinstance(profile, str):
+        try:
+            profile = json.loads(profile)
+        except json.JSONDecodeError:
+            return {"status": "error", "message": "Invalid profile format"}
+
+    if profile:
+        profile = dict(profile)
+        for key in ("basket", "purchase_history"):
+            if profile.get(key):
+                profile[key] = await with_product_details(profile[key])
+
     return {
         "status": "success",
         "profile": profile,
@@ -54,4 +71,26 @@ def update_customer_profile(update: CustomerProfileUpdate, tool_context: ToolCon
         "status": "success",
         "field": update.field,
         "value": update.value
-    }
\ No newline at end of file
+    }
+
+
+def get_review_summary(product_ids: List[str]) -> dict:
+    """
+    Retrieves precomputed review summaries for one or several products:
+    ratings, number of reviews, main positive and negative themes and a short synthesis.
+
+    Args:
+        product_ids: The product IDs to look up.
+
+    Returns:
+        dict: The review summary of each product, None for products without reviews.
+    """
+    try:
+        reviews = get_review_summaries(product_ids)
+    except FileNotFoundError:
+        return {"status": "error", "message": "Review summaries are not available."}
+
+    return {
+        "status": "success",
+        "reviews": reviews,
+    }
@@ -0,0 +1,139 @@
+"""Concurrency benchmark of the image path of a turn.
+
+Simulates concurrent sessions sending an image, which is uploaded to GCS and
+searched with Vision Product Search, while other sessions only need the event
+loop. The real upload and search functions run against a stub storage client
+and a mocked Vision transport with the given latencies. Compares the blocking
+calls made inline on the event loop with the async path: uploads through
+`run_blocking` and the search through the shared httpx client.
+
+Usage:
+    python -m benchmarks.bench_blocking_io [--sessions 32] [--upload-latency 0.3] [--vision-latency 0.8]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+
+from agent.shared_libraries import image_tools
+from agent.sub_agents.product_search import product_search_tools
+
+IMAGE = b"\xff\xd8\xff" + bytes(200_000)
+
+
+def vision_response(request: httpx.Request) -> httpx.Response:
+    images = json.loads(request.content)["requests"]
+    return httpx.Response(200, json={"responses": [
+        {"productSearchResults": {"results": [
+            {"product": {"name": f"projects/p/locations/l/products/{242785 + i}", "displayName": f"Chaise {i}"}, "score": 0.9 - i / 100}
+            for i in range(10)
+        ]}}
+        for _ in images
+    ]})
+
+
+class SlowBlob:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def upload_from_string(self, data, content_type=None, timeout=None):
+        time.sleep(self.latency)
+
+
+class SlowStorageClient:
+    """
+    Stands for the GCS client, whose uploads block the calling thread.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def bucket(self, name: str):
+        return self
+
+    def blob(self, name: str) -> SlowBlob:
+        return SlowBlob(self.latency)
+
+
+class ValidCredentials:
+    valid = True
+    token = "token"
+
+
+def blocking_vision_client(latency: float) -> httpx.Client:
+    def handler(request: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        return vision_response(request)
+
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def async_vision_client(latency: float) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return vision_response(request)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def image_session(offload: bool, blocking_client: httpx.Client):
+    if offload:
+        uris = await image_tools.upload_images_to_gcs_async([IMAGE])
+        await product_search_tools.search_similar_products(uris)
+    else:
+        uri = image_tools.upload_image_to_gcs(IMAGE)
+        blocking_client.post(product_search_tools.VISION_URL, json=product_search_tools.get_json(uri)).json()
+
+
+async def text_session(latencies: list):
+    # A turn that only needs the event loop, e.g. a cached answer
+    start = time.perf_counter()
+    await asyncio.sleep(0.01)
+    latencies.append(time.perf_counter() - start)
+
+
+async def run(sessions: int, offload: bool, vision_latency: float) -> dict:
+    blocking_client = blocking_vision_client(vision_latency)
+    # The shared httpx client is bound to the event loop that creates it
+    product_search_tools._http_client = async_vision_client(vision_latency)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        coroutine
+        for _ in range(sessions)
+        for coroutine in (image_session(offload, blocking_client), text_session(latencies))
+    ))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "mode": "async" if offload else "inline",
+        "sessions_per_sec": 2 * sessions / elapsed,
+        "text_p50_ms": 1000 * latencies[len(latencies) // 2],
+        "text_max_ms": 1000 * latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--upload-latency", type=float, default=0.3)
+    parser.add_argument("--vision-latency", type=float, default=0.8)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    image_tools._storage_client = SlowStorageClient(args.upload_latency)
+    product_search_tools._credentials = ValidCredentials()
+    for offload in (False, True):
+        result = asyncio.run(run(args.sessions, offload, args.vision_latency))
+        print(
+            f"{result['mode']:>6}: {result['sessions_per_sec']:8.1f} sessions/s, "
+            f"text turn p50 {result['text_p50_ms']:8.1f} ms, max {result['text_max_ms']:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
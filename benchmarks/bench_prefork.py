@@ -0,0 +1,119 @@
+"""Scaling benchmark of the preforked serving mode.
+
+Loads a synthetic catalog once, forks 1 to N workers and has each run the
+CPU-bound part of a turn for a fixed duration: parsing a page of SQL results,
+guarding a generated query and resolving the products it references. Reports
+the aggregate throughput and the memory of each worker, private (USS) versus
+shared with the parent.
+
+Usage:
+    python -m benchmarks.bench_prefork [--max-workers 8] [--duration 5] [--products 50000]
+"""
+
+import argparse
+import gc
+import json
+import os
+import time
+
+from agent.shared_libraries import catalog
+from agent.shared_libraries.prefetch import extract_product_ids
+from agent.sub_agents.BigQuery.sql_guard import _guard
+
+QUERIES = [
+    "SELECT product_id, label, eur_regular_price FROM `data-sandbox-410808.datascience_playground.extract_chairs_adk` WHERE style = '{}'",
+    "SELECT c.product_id, c.label, r.global_rating FROM `data-sandbox-410808.datascience_playground.extract_chairs_adk` c "
+    "JOIN `data-sandbox-410808.datascience_playground.extract_chairs_reviews_adk` r ON c.product_id = r.product_id WHERE c.colors = '{}'",
+]
+
+
+def build_catalog(products: int) -> catalog.CatalogSnapshot:
+    rows = {
+        str(i): {
+            "product_id": str(i), "ean_id": f"{i:013d}", "label": f"Chair {i}",
+            "style": "scandinavian", "colors": "oak", "eur_regular_price": 49.9 + i % 300,
+        }
+        for i in range(products)
+    }
+    return catalog.CatalogSnapshot(
+        version=1, refreshed_at=time.time(), products=rows,
+        hashes={}, ean_index=catalog.build_ean_index(rows.values()),
+    )
+
+
+def handle_request(i: int, products: int) -> int:
+    # Distinct queries so the guard memoization does not hide the parse cost
+    query = QUERIES[i % len(QUERIES)].format(f"style {i}")
+    _guard.__wrapped__(query)
+    page = json.dumps({"rows": [
+        {"product_id": str((i * 25 + j) % products), "label": f"Chair {j}", "eur_regular_price": 99.0}
+        for j in range(25)
+    ]})
+    ids = extract_product_ids(json.loads(page), limit=25)
+    return sum(catalog.get_product(product_id) is not None for product_id in ids)
+
+
+def memory_kb(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Private_Clean:", "Private_Dirty:"):
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {"rss": values["Rss"], "uss": values["Private_Clean"] + values["Private_Dirty"]}
+
+
+def run(workers: int, duration: float, products: int) -> dict:
+    pipes = []
+    for worker in range(workers):
+        read_fd, write_fd = os.pipe()
+        if os.fork() == 0:
+            os.close(read_fd)
+            done, deadline = 0, time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                handle_request(worker * 10_000_000 + done, products)
+                done += 1
+            os.write(write_fd, json.dumps({"done": done, **memory_kb(os.getpid())}).encode())
+            os._exit(0)
+        os.close(write_fd)
+        pipes.append(read_fd)
+
+    results = []
+    for read_fd in pipes:
+        with os.fdopen(read_fd) as f:
+            results.append(json.loads(f.read()))
+    for _ in range(workers):
+        os.wait()
+
+    return {
+        "workers": workers,
+        "requests_per_sec": sum(r["done"] for r in results) / duration,
+        "worker_rss_mb": max(r["rss"] for r in results) / 1024,
+        "worker_private_mb": max(r["uss"] for r in results) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--products", type=int, default=50_000)
+    args = parser.parse_args()
+
+    catalog._snapshot = build_catalog(args.products)
+    gc.collect()
+    gc.freeze()
+    print(f"cores: {os.cpu_count()}, parent rss: {memory_kb(os.getpid())['rss'] / 1024:.0f} MB")
+
+    workers = 1
+    while workers <= args.max_workers:
+        result = run(workers, args.duration, args.products)
+        print(
+            f"{result['workers']:>2} workers: {result['requests_per_sec']:8.0f} req/s, "
+            f"worker rss {result['worker_rss_mb']:.0f} MB, private {result['worker_private_mb']:.1f} MB"
+        )
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Throughput benchmark of the session services.
+
+Compares session create, load and update (one turn of three events with
+state deltas) for ADK's in-memory and database services and the local
+SQLite service.
+
+Usage:
+    python -m benchmarks.bench_session_service [--sessions 500] [--turns 5]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import DatabaseSessionService, InMemorySessionService
+from google.genai import types
+
+from agent.entities.customer import Customer
+from agent.shared_libraries.session_service import SQLiteSessionService
+
+APP_NAME = "agent"
+
+
+def turn_events(turn: int):
+    invocation_id = f"turn-{turn}"
+    return [
+        Event(
+            author="user",
+            invocation_id=invocation_id,
+            content=types.Content(role="user", parts=[types.Part(text="Show me black chairs")]),
+        ),
+        Event(
+            author="agent",
+            invocation_id=invocation_id,
+            actions=EventActions(state_delta={"request_count": turn, "timer_start": time.time()}),
+        ),
+        Event(
+            author="agent",
+            invocation_id=invocation_id,
+            content=types.Content(role="model", parts=[types.Part(text="Here are black chairs.")]),
+            actions=EventActions(state_delta={"uploaded_image_gcs_uri": f"gs://bucket/{turn}.jpg"}),
+        ),
+    ]
+
+
+async def run(name: str, make_service, sessions: int, turns: int):
+    service = make_service()
+    profile = Customer.get_customer("123").to_json()
+    ids = [f"session-{i}" for i in range(sessions)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        service.create_session(
+            app_name=APP_NAME, user_id="user", session_id=session_id,
+            state={"customer:profile": profile},
+        )
+        for session_id in ids
+    ))
+    create = sessions / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for turn in range(turns):
+        for session_id in ids:
+            session = await service.get_session(app_name=APP_NAME, user_id="user", session_id=session_id)
+            for event in turn_events(turn):
+                await service.append_event(session, event)
+    update = sessions * turns / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for session_id in ids:
+        await service.get_session(app_name=APP_NAME, user_id="user", session_id=session_id)
+    load = sessions / (time.perf_counter() - start)
+
+    print(f"{name:>10}: create {create:9.0f}/s, turn update {update:9.0f}/s, load {load:9.0f}/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        services = {
+            "in-memory": InMemorySessionService,
+            "database": lambda: DatabaseSessionService(
+                db_url=f"sqlite+aiosqlite:///{os.path.join(tmp, 'adk.db')}"
+            ),
+            "sqlite": lambda: SQLiteSessionService(db_path=os.path.join(tmp, "sessions.db")),
+        }
+        for name, make_service in services.items():
+            asyncio.run(run(name, make_service, args.sessions, args.turns))
+
+
+if __name__ == "__main__":
+    main()
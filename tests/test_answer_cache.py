@@ -0,0 +1,45 @@
+import pytest
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from agent.shared_libraries.answer_cache import cache_key, is_advice_question
+
+
+def _request(*messages) -> LlmRequest:
+    return LlmRequest(contents=[
+        types.Content(role=role, parts=[types.Part(text=text)]) for role, text in messages
+    ])
+
+
+@pytest.mark.parametrize("question", [
+    "How to mix scandinavian chairs with a wooden table?",
+    "Des idées pour décorer un salon bohème ?",
+])
+def test_advice_questions_use_the_cache(question):
+    assert is_advice_question(question)
+
+
+@pytest.mark.parametrize("question", [
+    "Hello!",
+    "Add the chair 242785 to my basket",
+    "What is the price of the Luna chair?",
+    "How do I match the chair in my basket with my table?",
+])
+def test_other_questions_skip_the_cache(question):
+    assert not is_advice_question(question)
+
+
+def test_first_question_is_its_own_key():
+    question = "How to mix scandinavian chairs with a wooden table?"
+
+    assert cache_key(_request(("user", question))) == question
+
+
+def test_follow_up_is_keyed_with_the_previous_question():
+    request = _request(
+        ("user", "How to decorate a bohemian living room?"),
+        ("model", "Use natural materials..."),
+        ("user", "How can I match it with a black table?"),
+    )
+
+    assert cache_key(request) == "How to decorate a bohemian living room?\nHow can I match it with a black table?"
@@ -0,0 +1,164 @@
+import asyncio
+import base64
+import json
+
+import pytest
+from google.adk.tools.application_integration_tool.integration_connector_tool import IntegrationConnectorTool
+
+from agent.sub_agents.BigQuery import tools
+
+RESULTS_TABLE = f"{tools.configs.CLOUD_PROJECT}._3f2a9c.anon5b1e"
+
+
+def test_page_token_round_trip():
+    token = tools._encode_token(RESULTS_TABLE, "cursor", 25)
+
+    assert tools._decode_token(token) == {"table": RESULTS_TABLE, "page_token": "cursor", "offset": 25}
+
+
+def test_unsigned_page_token_is_rejected():
+    payload = json.dumps({"table": "other-project.hr.salaries", "page_token": None, "offset": 0})
+    token = base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+    with pytest.raises(ValueError):
+        tools._decode_token(token)
+
+
+def test_page_token_with_another_table_is_rejected():
+    payload, signature = tools._encode_token(RESULTS_TABLE, "cursor", 25).split(".")
+    forged = base64.urlsafe_b64encode(
+        json.dumps({"table": "other-project.hr.salaries", "page_token": "cursor", "offset": 25}).encode("utf-8")
+    ).decode("ascii")
+
+    with pytest.raises(ValueError):
+        tools._decode_token(f"{forged}.{signature}")
+
+
+def test_signed_token_must_point_to_a_results_table():
+    token = tools._encode_token(f"{tools.configs.CLOUD_PROJECT}.datascience_playground.extract_chairs_adk", None, 0)
+
+    with pytest.raises(ValueError):
+        tools._decode_token(token)
+
+
+class StubToolContext:
+    def __init__(self, function_call_id: str):
+        self.state = {}
+        self.function_call_id = function_call_id
+
+
+def connector_list_tool(table: str) -> IntegrationConnectorTool:
+    return IntegrationConnectorTool(
+        name=f"connector_list_datascience_playground_{table}",
+        description="",
+        connection_name="bq-test-adk",
+        connection_host="",
+        connection_service_name="",
+        entity=f"datascience_playground.{table}",
+        operation="LIST_ENTITIES",
+        action=None,
+        rest_api_tool=None,
+    )
+
+
+def list_rows(tool, args, response, context=None):
+    """
+    Calls the connector tool through the bounding callbacks, the connector
+    answering with `response`.
+    """
+    context = context or StubToolContext("call-1")
+    rejected = tools.bound_connector_request(tool, args, context)
+    if rejected is not None:
+        return rejected
+    return tools.bound_connector_response(tool, args, context, response)
+
+
+def test_connector_rows_are_projected_and_capped_to_the_page_size():
+    chairs = connector_list_tool("extract_chairs_adk")
+    args = {"filter_clause": "style = 'scandinave'", "page_size": 500}
+    payload = [{"product_id": i, "label": f"Chaise {i}", "img_url": "https://img"} for i in range(40)]
+
+    response = list_rows(chairs, args, {"connectorOutputPayload": payload, "nextPageToken": "cursor"})
+
+    assert args["page_size"] == tools.configs.query_settings.page_size
+    assert len(response["rows"]) == tools.configs.query_settings.page_size
+    assert response["rows"][0] == {"product_id": 0, "label": "Chaise 0"}
+    assert response["dropped_columns"] == ["img_url"]
+    assert response["returned_rows"] == tools.configs.query_settings.page_size
+    assert not response["truncated"]
+
+
+def test_connector_page_token_is_signed_and_unwrapped_on_the_next_call():
+    chairs = connector_list_tool("extract_chairs_adk")
+    first = list_rows(chairs, {}, {"connectorOutputPayload": [{"product_id": 1}], "nextPageToken": "cursor"})
+    assert first["next_page_token"] != "cursor"
+
+    args = {"page_token": first["next_page_token"]}
+    second = list_rows(chairs, args, {"connectorOutputPayload": [{"product_id": 2}]}, StubToolContext("call-2"))
+
+    assert args["page_token"] == "cursor"
+    assert second["returned_rows"] == 2
+    assert second["next_page_token"] is None
+
+
+def test_connector_page_token_of_another_table_is_rejected():
+    chairs = connector_list_tool("extract_chairs_adk")
+    reviews = connector_list_tool("extract_chairs_reviews_adk")
+    token = list_rows(chairs, {}, {"connectorOutputPayload": [{"product_id": 1}], "nextPageToken": "cursor"})["next_page_token"]
+
+    response = list_rows(reviews, {"page_token": token}, {"connectorOutputPayload": []})
+
+    assert response["status"] == "error"
+
+
+def test_connector_pagination_stops_at_max_rows(monkeypatch):
+    monkeypatch.setattr(tools.configs.query_settings, "max_rows", 30)
+    chairs = connector_list_tool("extract_chairs_adk")
+    token = tools._encode_token("extract_chairs_adk", "cursor", 25)
+    args = {"page_token": token}
+    payload = [{"product_id": i} for i in range(25)]
+
+    response = list_rows(chairs, args, {"connectorOutputPayload": payload, "nextPageToken": "next"})
+
+    assert args["page_size"] == 5
+    assert len(response["rows"]) == 5
+    assert response["truncated"]
+    assert response["next_page_token"] is None
+
+
+def test_connector_filter_on_a_blocked_column_is_rejected():
+    chairs = connector_list_tool("extract_chairs_adk")
+
+    response = list_rows(chairs, {"filter_clause": "img_url LIKE '%cdn%'"}, {"connectorOutputPayload": []})
+
+    assert response["status"] == "error"
+    assert response["guard_rules"]
+
+
+def test_connector_errors_are_returned_as_is():
+    chairs = connector_list_tool("extract_chairs_adk")
+    error = {"error": "Connection refused"}
+
+    assert list_rows(chairs, {}, error) is None
+
+
+def test_connector_toolset_is_built_on_first_use(monkeypatch):
+    built = []
+
+    class StubToolset:
+        async def get_tools(self, readonly_context=None):
+            return ["list_chairs"]
+
+    def build():
+        built.append(True)
+        return StubToolset()
+
+    monkeypatch.setattr(tools, "_build_connector_toolset", build)
+    toolset = tools.ConnectorToolset()
+    assert built == []
+
+    async def scenario():
+        return [await toolset.get_tools(), await toolset.get_tools()]
+
+    assert asyncio.run(scenario()) == [["list_chairs"], ["list_chairs"]]
+    assert built == [True]
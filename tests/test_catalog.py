@@ -0,0 +1,34 @@
+from agent.shared_libraries import catalog
+
+
+def test_refresh_without_changes_saves_the_refresh_time_and_starts_no_thread(tmp_path, monkeypatch):
+    path = tmp_path / "catalog_snapshot.jsonl"
+    snapshot = catalog.CatalogSnapshot(
+        version=3, refreshed_at=1000.0, hashes={"242785": "abc"}, ean_index={},
+        products={"242785": {"product_id": "242785", "label": "CHAISE LUNA"}},
+    )
+    catalog.write_catalog_snapshot(snapshot, str(path))
+    monkeypatch.setattr(catalog.configs.catalog_settings, "snapshot_path", str(path))
+    monkeypatch.setattr(catalog, "_snapshot", None)
+    monkeypatch.setattr(catalog, "fetch_remote_hashes", lambda client: {"242785": "abc"})
+
+    refreshed = catalog.refresh_catalog(client=object())
+
+    assert catalog._refresher is None
+    assert refreshed.version == 3 and refreshed.refreshed_at > 1000.0
+    assert catalog.read_snapshot_meta(str(path)) == {"version": 3, "refreshed_at": refreshed.refreshed_at}
+
+
+def test_lookup_product_by_ean(monkeypatch):
+    rows = [
+        {"product_id": "242785", "ean_id": " 3760000000000 ", "label": "CHAISE LUNA"},
+        {"product_id": "111111", "ean_id": None, "label": "FAUTEUIL OSLO"},
+    ]
+    snapshot = catalog.CatalogSnapshot(
+        version=1, refreshed_at=1000.0, hashes={}, ean_index=catalog.build_ean_index(rows),
+        products={row["product_id"]: row for row in rows},
+    )
+    monkeypatch.setattr(catalog, "_snapshot", snapshot)
+
+    assert catalog.lookup_product_by_ean("3760000000000")["label"] == "CHAISE LUNA"
+    assert catalog.lookup_product_by_ean("4006381333931") is None
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from google.adk.models import Gemini, LlmRequest, LlmResponse
+from google.genai import errors, types
+
+from agent.shared_libraries import concurrency
+
+
+def _quota_error() -> errors.ClientError:
+    return errors.ClientError(429, {"error": {"code": 429, "message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}})
+
+
+class FakeModel:
+    """
+    Stands for the Gemini backend: fails with 429 while overloaded, and
+    records the number of concurrent calls.
+    """
+
+    def __init__(self, failures: int = 0, latency: float = 0.0):
+        self.failures = failures
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.limiter = None
+        self.over_limit = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        if self.limiter is not None and self.in_flight > self.limiter.limit:
+            self.over_limit += 1
+        try:
+            await asyncio.sleep(self.latency)
+            if self.failures:
+                self.failures -= 1
+                raise _quota_error()
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="ok")]))
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    fake = FakeModel()
+
+    async def generate_content_async(self, llm_request, stream=False):
+        async for response in fake.generate_content_async(llm_request, stream):
+            yield response
+
+    monkeypatch.setattr(Gemini, "generate_content_async", generate_content_async)
+    monkeypatch.setattr(concurrency, "_limiters", {})
+    monkeypatch.setattr(concurrency, "backoff_delay", lambda attempt: 0)
+    return fake
+
+
+async def _call(model: concurrency.AdaptiveGemini) -> list:
+    return [response async for response in model.generate_content_async(LlmRequest())]
+
+
+def test_limit_backs_off_on_429_and_recovers(fake_model):
+    model = concurrency.AdaptiveGemini(model="fake-model")
+    limiter = concurrency.get_limiter("fake-model")
+    initial = limiter.limit
+    fake_model.failures = 2
+
+    async def scenario():
+        responses = await _call(model)
+        lowered = limiter.limit
+        for _ in range(20):
+            await _call(model)
+        return responses, lowered
+
+    responses, lowered = asyncio.run(scenario())
+
+    assert responses[0].content.parts[0].text == "ok"
+    assert fake_model.calls == 23
+    assert lowered < initial
+    assert limiter.limit > lowered
+    assert limiter.in_flight == 0
+
+
+def test_gives_up_after_max_retries(fake_model):
+    model = concurrency.AdaptiveGemini(model="fake-model")
+    fake_model.failures = 100
+
+    with pytest.raises(errors.ClientError):
+        asyncio.run(_call(model))
+
+    assert fake_model.calls == concurrency.configs.concurrency_settings.max_retries + 1
+    assert concurrency.get_limiter("fake-model").in_flight == 0
+
+
+def test_concurrent_calls_stay_under_the_limit(fake_model):
+    model = concurrency.AdaptiveGemini(model="fake-model")
+    limiter = concurrency.get_limiter("fake-model")
+    fake_model.limiter = limiter
+    fake_model.latency = 0.01
+
+    async def scenario():
+        await asyncio.gather(*(_call(model) for _ in range(4 * limiter.limit)))
+
+    asyncio.run(scenario())
+
+    assert fake_model.max_in_flight > 1
+    assert fake_model.over_limit == 0
+
+
+def test_sub_agent_calls_while_the_root_generator_is_paused(fake_model):
+    model = concurrency.AdaptiveGemini(model="fake-model")
+    limiter = concurrency.get_limiter("fake-model")
+    limiter._limit = limiter.min_limit = 1
+
+    async def scenario():
+        # The root turn is paused on its response while ADK runs a tool, whose
+        # sub-agent calls the same model
+        root = model.generate_content_async(LlmRequest())
+        await root.__anext__()
+        assert limiter.in_flight == 0
+        responses = await asyncio.wait_for(_call(model), timeout=1)
+        await root.aclose()
+        return responses
+
+    responses = asyncio.run(scenario())
+
+    assert responses[0].content.parts[0].text == "ok"
+    assert limiter.in_flight == 0
+
+
+def test_streamed_calls_give_the_slot_back_after_the_first_chunk(fake_model):
+    model = concurrency.AdaptiveGemini(model="fake-model")
+    limiter = concurrency.get_limiter("fake-model")
+
+    async def scenario():
+        stream = model.generate_content_async(LlmRequest(), stream=True)
+        first = await stream.__anext__()
+        in_flight = limiter.in_flight
+        rest = [response async for response in stream]
+        return first, in_flight, rest
+
+    first, in_flight, rest = asyncio.run(scenario())
+
+    assert first.content.parts[0].text == "ok"
+    assert in_flight == 0 and rest == []
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from agent.shared_libraries import image_tools
+
+
+class StubBlob:
+    def __init__(self, name: str, uploads: dict):
+        self.name = name
+        self.uploads = uploads
+
+    def upload_from_string(self, data, content_type=None, timeout=None):
+        self.uploads[self.name] = data
+
+
+class StubBucket:
+    def __init__(self, uploads: dict):
+        self.uploads = uploads
+
+    def blob(self, name: str) -> StubBlob:
+        return StubBlob(name, self.uploads)
+
+
+class StubStorageClient:
+    def __init__(self):
+        self.uploads = {}
+        self.buckets = []
+
+    def bucket(self, name: str) -> StubBucket:
+        self.buckets.append(name)
+        return StubBucket(self.uploads)
+
+
+def test_upload_image_to_gcs_returns_uri(monkeypatch):
+    client = StubStorageClient()
+    monkeypatch.setattr(image_tools, "_storage_client", client)
+
+    uri = image_tools.upload_image_to_gcs(b"image", bucket_name="bucket", prefix="uploads/")
+
+    assert uri.startswith("gs://bucket/uploads/") and uri.endswith(".jpg")
+    assert client.uploads == {uri[len("gs://bucket/"):]: b"image"}
+
+
+def test_upload_images_to_gcs_async_returns_uris_in_order(monkeypatch):
+    client = StubStorageClient()
+    monkeypatch.setattr(image_tools, "_storage_client", client)
+
+    uris = asyncio.run(image_tools.upload_images_to_gcs_async([b"first", b"second"], bucket_name="bucket"))
+
+    assert len(uris) == 2 and all(uri.startswith("gs://bucket/uploads/") for uri in uris)
+    assert [client.uploads[uri[len("gs://bucket/"):]] for uri in uris] == [b"first", b"second"]
+
+
+@pytest.mark.parametrize("code, valid", [
+    ("4006381333931", True),
+    # Check digit 0, from a checksum already a multiple of 10
+    ("3760000000000", True),
+    ("4006381333932", False),
+    ("400638133393", False),
+    ("40063813339310", False),
+    ("400638133393A", False),
+    ("", False),
+])
+def test_is_valid_ean13(code, valid):
+    assert image_tools.is_valid_ean13(code) is valid
+
+
+class StubSymbol:
+    def __init__(self, data: str):
+        self.data = data.encode("ascii")
+
+
+class StubPyzbar:
+    """
+    Stands for pyzbar, returning the given barcodes for any image.
+    """
+
+    class ZBarSymbol:
+        EAN13 = "EAN13"
+
+    def __init__(self, codes):
+        self.codes = codes
+
+    def decode(self, image, symbols=None):
+        return [StubSymbol(code) for code in self.codes]
+
+
+class StubImage:
+    @staticmethod
+    def open(stream):
+        return stream
+
+
+def test_decode_ean13_without_pyzbar_finds_nothing(monkeypatch):
+    monkeypatch.setattr(image_tools, "pyzbar", None)
+
+    assert image_tools.decode_ean13(b"image") == []
+
+
+def test_decode_ean13_without_barcode_finds_nothing(monkeypatch):
+    monkeypatch.setattr(image_tools, "Image", StubImage)
+    monkeypatch.setattr(image_tools, "pyzbar", StubPyzbar([]))
+
+    assert image_tools.decode_ean13(b"image") == []
+
+
+def test_decode_ean13_keeps_valid_codes_once_in_order(monkeypatch):
+    monkeypatch.setattr(image_tools, "Image", StubImage)
+    monkeypatch.setattr(image_tools, "pyzbar", StubPyzbar(["4006381333932", "3760000000000", "4006381333931", "3760000000000"]))
+
+    assert image_tools.decode_ean13(b"image") == ["3760000000000", "4006381333931"]
@@ -0,0 +1,28 @@
+import asyncio
+
+from agent.shared_libraries.prefetch import Prefetcher
+
+
+def test_pending_prefetches_expire_without_the_session_ending():
+    async def scenario():
+        prefetcher = Prefetcher(max_in_flight=1, max_per_session=4, max_age_secs=0.05)
+        warmed = []
+
+        async def slow_warmer(product_ids):
+            await asyncio.sleep(10)
+
+        async def warmer(product_ids):
+            warmed.extend(product_ids)
+
+        prefetcher.register_warmer("slow", slow_warmer)
+        prefetcher.schedule("session-1", ["242785"])
+        await asyncio.sleep(0.2)
+        assert prefetcher._tasks == {}
+
+        # The slot held by the expired prefetch is free again
+        prefetcher._warmers = {"products": warmer}
+        prefetcher.schedule("session-2", ["111111"])
+        await asyncio.sleep(0.05)
+        assert warmed == ["111111"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from agent.shared_libraries import catalog, product_cache
+from agent.shared_libraries.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def bigquery_rows(monkeypatch):
+    snapshot = catalog.CatalogSnapshot(
+        version=1, refreshed_at=0.0, hashes={}, ean_index={},
+        products={"242785": {"product_id": "242785", "label": "CHAISE LUNA", "eur_regular_price": 129.0}},
+    )
+    queried = []
+
+    def fetch_rows(client, product_ids):
+        queried.append(list(product_ids))
+        return [{"product_id": "111111", "label": "CHAISE NOVA", "eur_regular_price": 89.0}]
+
+    monkeypatch.setattr(catalog, "_snapshot", snapshot)
+    monkeypatch.setattr(product_cache, "fetch_rows", fetch_rows)
+    monkeypatch.setattr(product_cache, "_client", object())
+    monkeypatch.setattr(product_cache, "product_cache", TTLCache("products", max_size=10, ttl_secs=60))
+    return queried
+
+
+def test_details_come_from_the_snapshot_then_bigquery(bigquery_rows):
+    details = asyncio.run(product_cache.get_product_details(["242785", "111111", "999999"]))
+
+    assert details["242785"]["eur_regular_price"] == 129.0
+    assert details["111111"]["label"] == "CHAISE NOVA"
+    assert details["999999"] is None
+    assert bigquery_rows == [["111111", "999999"]]
+
+
+def test_products_missing_from_the_snapshot_are_queried_once(bigquery_rows):
+    for _ in range(2):
+        asyncio.run(product_cache.get_product_details(["111111", "999999"]))
+
+    assert len(bigquery_rows) == 1
+
+
+def test_basket_items_get_their_catalog_price(bigquery_rows):
+    items = asyncio.run(product_cache.with_product_details([
+        {"product_id": "242785", "label": "CHS LUNA VEL OCRE", "quantity": 1, "unit_price": 0.0},
+    ]))
+
+    assert items[0]["label"] == "CHAISE LUNA" and items[0]["unit_price"] == 129.0
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from agent.sub_agents.product_search import product_search_tools
+
+
+class StubToolContext:
+    def __init__(self, state: dict):
+        self.state = state
+
+
+class ValidCredentials:
+    valid = True
+    token = "token"
+
+
+@pytest.fixture
+def call_vision(monkeypatch):
+    """
+    Runs a coroutine of the tools with the Vision API answering through `handler`.
+    """
+    monkeypatch.setattr(product_search_tools, "_credentials", ValidCredentials())
+
+    def call(handler, coroutine_function, *args):
+        async def scenario():
+            # The shared client must be created on the loop running the test
+            monkeypatch.setattr(
+                product_search_tools, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            )
+            return await coroutine_function(*args)
+
+        return asyncio.run(scenario())
+
+    return call
+
+
+def test_vision_error_status_is_returned_as_an_error(call_vision):
+    result = call_vision(
+        lambda request: httpx.Response(503, text="<html>Service Unavailable</html>"),
+        product_search_tools.product_similarity, StubToolContext({"uploaded_image_gcs_uris": ["gs://b/a.jpg"]}),
+    )
+
+    assert result == {"status": "error", "message": "Vision API returned HTTP 503."}
+
+
+def test_vision_non_json_body_is_returned_as_an_error(call_vision):
+    result = call_vision(
+        lambda request: httpx.Response(200, text="<html>Sign in</html>"),
+        product_search_tools.product_similarity, StubToolContext({"uploaded_image_gcs_uris": ["gs://b/a.jpg"]}),
+    )
+
+    assert result["status"] == "error" and result["message"].startswith("Vision API call failed")
+
+
+def _results(*products):
+    return {"productSearchResults": {"results": [
+        {"product": {"name": f"projects/p/locations/l/products/{product_id}", "displayName": name}, "score": score}
+        for name, product_id, score in products
+    ]}}
+
+
+def test_products_found_for_several_images_keep_their_best_score(call_vision):
+    responses = {
+        "gs://b/living.jpg": _results(("CHAISE LUNA", "242785", 0.62), ("FAUTEUIL OSLO", "111111", 0.81)),
+        "gs://b/kitchen.jpg": _results(("TABOURET NOVA", "222222", 0.55), ("CHAISE LUNA", "242785", 0.93)),
+    }
+    batches = []
+
+    def handler(request):
+        batches.append(1)
+        images = [image["image"]["source"]["gcsImageUri"] for image in json.loads(request.content)["requests"]]
+        return httpx.Response(200, json={"responses": [responses[image] for image in images]})
+
+    grouped = call_vision(handler, product_search_tools.search_similar_products, list(responses))
+
+    assert len(batches) == 1
+    assert grouped == [
+        {"image": "gs://b/living.jpg", "similar_products": ["FAUTEUIL OSLO"], "product_ids": ["111111"]},
+        {"image": "gs://b/kitchen.jpg", "similar_products": ["CHAISE LUNA", "TABOURET NOVA"], "product_ids": ["242785", "222222"]},
+    ]
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import time
+from typing import AsyncGenerator
+
+import pytest
+from google.adk.agents import Agent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from agent.shared_libraries import profiling
+
+
+def parse_catalog_page(duration: float):
+    # CPU-bound work of the turn, on the event loop
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        sum(i * i for i in range(1000))
+
+
+class BusyLlm(BaseLlm):
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        parse_catalog_page(0.2)
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="Here are the chairs.")]))
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling.configs.profiling_settings, "output_dir", str(tmp_path))
+    profiler = profiling.TurnProfiler(interval_ms=1, max_concurrent=2, max_samples=20000, max_duration_secs=30)
+    monkeypatch.setattr(profiling, "turn_profiler", profiler)
+    return profiler
+
+
+async def run_turn(state: dict) -> list:
+    agent = Agent(
+        name="root_agent",
+        model=BusyLlm(model="fake"),
+        before_agent_callback=profiling.start_turn_profile,
+        after_agent_callback=profiling.stop_turn_profile,
+    )
+    runner = Runner(agent=agent, app_name="app", session_service=InMemorySessionService())
+    await runner.session_service.create_session(app_name="app", user_id="user", session_id="session-1", state=state)
+    message = types.Content(role="user", parts=[types.Part(text="Show me chairs")])
+    return [event async for event in runner.run_async(user_id="user", session_id="session-1", new_message=message)]
+
+
+def folded_files(directory) -> list:
+    return [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".folded")]
+
+
+def test_profiled_turn_writes_folded_stacks(profiler, tmp_path):
+    asyncio.run(run_turn({profiling.PROFILE_SESSION_KEY: True}))
+
+    [path] = folded_files(tmp_path)
+    assert os.path.basename(path).startswith("session-1_")
+    lines = open(path, encoding="utf-8").read().splitlines()
+    counts = [int(line.rsplit(" ", 1)[1]) for line in lines]
+    assert counts == sorted(counts, reverse=True) and sum(counts) > 10
+    assert any("parse_catalog_page (test_profiling.py" in line for line in lines)
+    assert not profiler.active
+
+
+def test_turn_without_profile_key_is_not_profiled(profiler, tmp_path):
+    asyncio.run(run_turn({}))
+
+    assert folded_files(tmp_path) == []
+
+
+def test_output_is_capped(profiler, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling.configs.profiling_settings, "max_output_bytes", 2000)
+
+    asyncio.run(run_turn({profiling.PROFILE_SESSION_KEY: True}))
+
+    [path] = folded_files(tmp_path)
+    content = open(path, encoding="utf-8").read()
+    assert len(content.encode("utf-8")) <= 2000
+    # Only whole stacks are written
+    assert content == "" or content.endswith("\n")
+
+
+def test_third_concurrent_capture_is_rejected(profiler):
+    async def scenario():
+        started = [profiler.start("session-1", f"invocation-{i}") for i in range(3)]
+        for i in range(3):
+            profiler.stop(f"invocation-{i}")
+        return started
+
+    assert asyncio.run(scenario()) == [True, True, False]
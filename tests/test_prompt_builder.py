@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+from google.genai import types
+
+from agent.sub_agents.SQL import prompt_builder
+from agent.sub_agents.SQL.prompts import ENUM_SECTIONS, TABLE_SECTIONS
+
+
+@pytest.mark.parametrize("question, sections", [
+    ("What are the best rated chairs?", {"products", "reviews"}),
+    ("Black scandinavian chairs", {"products", "colors", "style"}),
+    ("Chaises en velours doré", {"products", "colors", "product_material"}),
+    ("Wooden chairs made of metal", {"products", "main_material", "product_material"}),
+    ("Chairs under 100 euros, at most 80 cm high", {"products", "price", "dimensions"}),
+    ("What do customers say about product 242785?", {"products", "reviews", "product_id"}),
+])
+def test_vocabulary_selects_sections(question, sections):
+    assert prompt_builder.select_sections(question) == frozenset(sections)
+
+
+def test_unrecognized_request_selects_nothing():
+    assert prompt_builder.select_sections("Something nice for my grandmother") is None
+
+
+def test_prompt_keeps_only_the_selected_sections():
+    prompt = prompt_builder.build_sql_prompt("Black chairs")
+
+    assert TABLE_SECTIONS["products"] in prompt and TABLE_SECTIONS["reviews"] not in prompt
+    assert ENUM_SECTIONS["colors"] in prompt
+    assert all(ENUM_SECTIONS[name] not in prompt for name in ("style", "main_material", "product_material"))
+    assert len(prompt) < len(prompt_builder.full_sql_prompt())
+
+
+def _context(text):
+    content = types.Content(role="user", parts=[types.Part(text=text)]) if text is not None else None
+    return SimpleNamespace(user_content=content)
+
+
+@pytest.mark.parametrize("text", [None, "", "Something nice for my grandmother"])
+def test_instruction_falls_back_to_the_full_prompt(text):
+    assert prompt_builder.sql_instruction(_context(text)) == prompt_builder.full_sql_prompt()
+
+
+def test_instruction_reads_the_agent_tool_request():
+    assert prompt_builder.sql_instruction(_context("Best rated chairs")) == prompt_builder.assemble_sql_prompt(
+        frozenset({"products", "reviews"})
+    )
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from agent.jobs import build_review_store
+from agent.shared_libraries import review_store
+from agent.shared_libraries.ttl_cache import TTLCache
+from agent.tools import get_review_summary
+
+REVIEWS = [
+    {
+        "product_id": 242785, "global_rating": 4.5, "quality rating": 4.0,
+        "verbatims": "Très confortable et belle couleur\nMontage facile, notice claire\nPas solide, déçu de la finition",
+        "verbatim_synthesis": "Chaise confortable au beau design.",
+    },
+    {"product_id": 111111, "global_rating": 3.0, "verbatims": "", "verbatim_synthesis": None},
+]
+
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = tmp_path / "review_aggregates.kv"
+    monkeypatch.setattr(review_store.configs.catalog_settings, "review_store_path", str(path))
+    monkeypatch.setattr(review_store, "_store", None)
+    monkeypatch.setattr(review_store, "review_cache", TTLCache("reviews", max_size=10, ttl_secs=60))
+    yield path
+    if review_store._store is not None:
+        review_store._store.close()
+
+
+def test_built_store_round_trip(store_path, tmp_path, monkeypatch):
+    reviews_path = tmp_path / "reviews.jsonl"
+    reviews_path.write_text("\n".join(json.dumps(row, ensure_ascii=False) for row in REVIEWS), encoding="utf-8")
+    monkeypatch.setattr("sys.argv", ["build_review_store", "--input", str(reviews_path), "--output", str(store_path)])
+
+    build_review_store.main()
+    summaries = review_store.get_review_summaries(["242785", 111111, "999999"])
+
+    assert summaries["242785"] == {
+        "product_id": "242785", "global_rating": 4.5, "quality_rating": 4.0, "review_count": 3,
+        "synthesis": "Chaise confortable au beau design.",
+        "positive_themes": ["confort", "couleur", "design"], "negative_themes": ["qualité"],
+    }
+    assert summaries["111111"]["review_count"] == 0 and summaries["111111"]["synthesis"] == ""
+    assert summaries["999999"] is None
+    assert len(review_store.get_review_store()) == 2
+
+
+def test_missing_store_degrades(store_path):
+    assert get_review_summary(["242785"]) == {"status": "error", "message": "Review summaries are not available."}
+
+
+@pytest.mark.parametrize("content", [
+    b"",
+    b"MDMREV",
+    b"NOTAREVIEWFILE" + bytes(32),
+])
+def test_unreadable_store_degrades(store_path, content):
+    store_path.write_bytes(content)
+
+    assert get_review_summary(["242785"])["status"] == "error"
+
+
+def test_truncated_store_degrades(store_path):
+    review_store.write_review_store([review_store.aggregate_review_row(row) for row in REVIEWS], str(store_path))
+    store_path.write_bytes(store_path.read_bytes()[:-10])
+
+    with pytest.raises(ValueError):
+        review_store.ReviewStore(str(store_path))
+    assert get_review_summary(["242785"])["status"] == "error"
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from agent.shared_libraries.session_service import SQLiteSessionService
+
+
+def final_event(state_delta: dict) -> Event:
+    return Event(
+        author="agent",
+        invocation_id="invocation",
+        actions=EventActions(state_delta=state_delta),
+        content=types.Content(role="model", parts=[types.Part(text="ok")]),
+    )
+
+
+def test_cached_sessions_see_the_user_state_written_by_other_sessions(tmp_path):
+    async def scenario():
+        service = SQLiteSessionService(db_path=str(tmp_path / "sessions.db"), validate_hot=False)
+        await service.create_session(app_name="app", user_id="user", session_id="a")
+        b = await service.create_session(app_name="app", user_id="user", session_id="b")
+        await service.get_session(app_name="app", user_id="user", session_id="a")
+
+        await service.append_event(b, final_event({"user:store": "lyon", "app:version": 2, "cart": 1}))
+        a = await service.get_session(app_name="app", user_id="user", session_id="a")
+
+        assert a.state == {"user:store": "lyon", "app:version": 2}
+
+    asyncio.run(scenario())
+
+
+def test_a_slow_flush_does_not_hold_back_other_sessions(tmp_path):
+    async def scenario():
+        service = SQLiteSessionService(db_path=str(tmp_path / "sessions.db"), flush_max_events=100)
+        a = await service.create_session(app_name="app", user_id="user", session_id="a")
+        b = await service.create_session(app_name="app", user_id="user", session_id="b")
+        release = threading.Event()
+        write_pending = service._write_pending
+
+        def slow_write(key, pending):
+            if key[2] == "a":
+                release.wait(5)
+            write_pending(key, pending)
+
+        service._write_pending = slow_write
+        slow = asyncio.create_task(service.append_event(a, final_event({"step": 1})))
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(service.append_event(b, final_event({"step": 1})), 1)
+        assert not slow.done()
+
+        release.set()
+        await slow
+        session = await service.get_session(app_name="app", user_id="user", session_id="a")
+        assert session.state == {"step": 1}
+
+    asyncio.run(scenario())
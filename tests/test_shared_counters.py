@@ -0,0 +1,55 @@
+import asyncio
+import os
+
+from agent.shared_libraries import concurrency, shared_counters
+
+
+def test_slots_of_a_dead_worker_are_reclaimed():
+    slots = shared_counters.SharedSlots(["model-a", "model-b"], workers=2)
+
+    pid = os.fork()
+    if pid == 0:
+        slots.worker_index = 1
+        held = all(slots.acquire("model-a", limit=2, timeout=0) for _ in range(2))
+        os._exit(0 if held else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert status == 0
+    assert slots.in_use("model-a") == 2 and not slots.acquire("model-a", limit=2, timeout=0)
+    assert slots.in_use("model-b") == 0
+
+    assert slots.reclaim(1) == 2
+    assert slots.in_use("model-a") == 0 and slots.acquire("model-a", limit=2, timeout=0)
+
+
+def test_limiter_waits_for_a_slot_released_by_another_worker(monkeypatch):
+    monkeypatch.setattr(shared_counters, "_counters", shared_counters.SharedCounters(["overloads:model-a"]))
+    monkeypatch.setattr(shared_counters, "_slots", shared_counters.SharedSlots(["model-a"], workers=2))
+    slots = shared_counters.get_shared_slots()
+    slots.worker_index = 0
+
+    held_read, held_write = os.pipe()
+    release_read, release_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        slots.worker_index = 1
+        slots.acquire("model-a", limit=1)
+        os.write(held_write, b"1")
+        os.read(release_read, 1)
+        slots.release("model-a")
+        os._exit(0)
+    os.read(held_read, 1)
+
+    async def scenario():
+        limiter = concurrency.AIMDLimiter("model-a", initial_limit=4, min_limit=1, max_limit=1)
+        acquire = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.05)
+        blocked = not acquire.done()
+        os.write(release_write, b"1")
+        await asyncio.wait_for(acquire, 5)
+        await limiter.release()
+        return blocked
+
+    assert asyncio.run(scenario())
+    os.waitpid(pid, 0)
+    assert slots.in_use("model-a") == 0
@@ -0,0 +1,71 @@
+import pytest
+
+from agent.sub_agents.BigQuery.sql_guard import guard_sql
+
+PRODUCTS = "datascience_playground.extract_chairs_adk"
+REVIEWS = "datascience_playground.extract_chairs_reviews_adk"
+
+
+@pytest.mark.parametrize("query", [
+    f"SELECT a.label FROM {PRODUCTS} a JOIN {REVIEWS} b ON TRUE",
+    f"SELECT a.label FROM {PRODUCTS} a JOIN {REVIEWS} b ON a.product_id = b.product_id OR 1 = 1",
+    f"SELECT a.label FROM {PRODUCTS} a, {REVIEWS} b WHERE a.product_id = b.product_id OR 1 = 1",
+    f"SELECT a.label FROM {PRODUCTS} a, {REVIEWS} b",
+])
+def test_joins_without_equality_are_rejected(query):
+    result = guard_sql(query)
+
+    assert not result.allowed and "cross_join" in result.rules
+
+
+@pytest.mark.parametrize("query", [
+    f"SELECT a.label FROM {PRODUCTS} a JOIN {REVIEWS} b ON a.product_id = b.product_id",
+    f"SELECT a.label FROM {PRODUCTS} a JOIN {REVIEWS} b USING (product_id)",
+    f"SELECT a.label FROM {PRODUCTS} a, {REVIEWS} b WHERE a.product_id = b.product_id AND b.global_rating > 4",
+    f"SELECT label, color FROM {PRODUCTS}, UNNEST(SPLIT(colors, '|')) AS color",
+])
+def test_joins_with_equality_are_allowed(query):
+    assert guard_sql(query).allowed
+
+
+@pytest.mark.parametrize("query", [
+    f"SELECT img_url FROM {PRODUCTS} UNION ALL SELECT img_url FROM {PRODUCTS}",
+    f"SELECT * FROM (SELECT img_url, verbatims FROM {PRODUCTS})",
+    f"SELECT CONCAT(img_url, '') AS x FROM {PRODUCTS}",
+])
+def test_blocked_columns_are_rejected_anywhere(query):
+    result = guard_sql(query)
+
+    assert not result.allowed and "blocked_column" in result.rules
+
+
+def test_blocked_columns_are_pruned_from_the_projection():
+    result = guard_sql(f"SELECT label, img_url FROM {PRODUCTS}")
+
+    assert result.allowed and "img_url" not in result.sql
+
+
+def test_parameter_limit_is_capped():
+    result = guard_sql(f"SELECT label FROM {PRODUCTS} LIMIT @n")
+
+    assert result.allowed and "@n" not in result.sql and "cap_limit" in result.rules
+
+
+def test_trailing_comment_after_semicolon_is_one_statement():
+    result = guard_sql(f"SELECT label FROM {PRODUCTS}; -- comment")
+
+    assert result.allowed and result.sql.count("SELECT") == 1 and "LIMIT" in result.sql
+
+
+@pytest.mark.parametrize("table", ["extract_chairs_adk", "datascience_playground.extract_chairs_adk"])
+def test_partially_qualified_tables_are_qualified(table):
+    result = guard_sql(f"SELECT label FROM {table}")
+
+    assert result.allowed and "qualify_tables" in result.rules
+    assert "FROM `data-sandbox-410808`.datascience_playground.extract_chairs_adk" in result.sql
+
+
+def test_tables_of_other_datasets_are_rejected():
+    result = guard_sql("SELECT label FROM other_dataset.extract_chairs_adk")
+
+    assert not result.allowed and "table_allow_list" in result.rules
@@ -0,0 +1,105 @@
+import asyncio
+from typing import AsyncGenerator
+
+import pytest
+from google.adk.agents import Agent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+
+from agent.shared_libraries import token_usage
+from agent.shared_libraries.callbacks import sub_agent_after_model, sub_agent_before_model
+
+
+class ScriptedLlm(BaseLlm):
+    """
+    Answers each call with the next scripted part, with the given token usage.
+    """
+
+    script: list
+    prompt_tokens: int = 100
+    output_tokens: int = 10
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[self.script.pop(0)]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=self.prompt_tokens, candidates_token_count=self.output_tokens,
+            ),
+        )
+
+
+def build_runner() -> Runner:
+    sub_agent = Agent(
+        name="sql_agent",
+        model=ScriptedLlm(model="gemini-2.0-flash", script=[types.Part(text="SELECT 1")], prompt_tokens=300, output_tokens=20),
+        instruction="Write SQL.",
+        before_agent_callback=token_usage.begin_turn,
+        before_model_callback=sub_agent_before_model,
+        after_model_callback=sub_agent_after_model,
+    )
+    root_agent = Agent(
+        name="root_agent",
+        model=ScriptedLlm(model="gemini-2.0-flash", script=[
+            types.Part(function_call=types.FunctionCall(name="sql_agent", args={"request": "chairs"})),
+            types.Part(text="Here are the chairs."),
+        ]),
+        instruction="Help the customer.",
+        tools=[AgentTool(sub_agent)],
+        before_agent_callback=token_usage.begin_turn,
+        after_agent_callback=token_usage.end_turn,
+        before_model_callback=sub_agent_before_model,
+        after_model_callback=sub_agent_after_model,
+    )
+    return Runner(agent=root_agent, app_name="app", session_service=InMemorySessionService())
+
+
+async def run_turn(runner: Runner, session_id: str) -> list:
+    if await runner.session_service.get_session(app_name="app", user_id="user", session_id=session_id) is None:
+        await runner.session_service.create_session(app_name="app", user_id="user", session_id=session_id)
+    message = types.Content(role="user", parts=[types.Part(text="Show me chairs")])
+    return [
+        part.text
+        async for event in runner.run_async(user_id="user", session_id=session_id, new_message=message)
+        for part in (event.content.parts if event.content else [])
+        if part.text
+    ]
+
+
+@pytest.fixture
+def ledger(monkeypatch):
+    ledger = token_usage.TokenLedger(max_sessions=10)
+    monkeypatch.setattr(token_usage, "token_ledger", ledger)
+    return ledger
+
+
+def test_nested_sub_agent_calls_count_per_agent_hop_and_root_session(ledger):
+    texts = asyncio.run(run_turn(build_runner(), "session-1"))
+
+    assert texts[-1] == "Here are the chairs."
+    # Both root calls and the sub-agent call count towards the root session
+    assert ledger.session_total("session-1") == 110 + 320 + 110
+    report = ledger.report()
+    assert [agent["agent"] for agent in report["agents"]] == ["sql_agent", "root_agent"]
+    sql_agent, root_agent = report["agents"]
+    assert sql_agent["calls"] == 1 and sql_agent["prompt_tokens"] == 300
+    assert [hop["hop"] for hop in sql_agent["hops"]] == ["user_message"]
+    assert {hop["hop"]: hop["calls"] for hop in root_agent["hops"]} == {"user_message": 1, "sql_agent": 1}
+    assert report["total_tokens"] == 540
+    assert root_agent["share"] == pytest.approx(220 / 540, abs=1e-4)
+    assert sql_agent["instruction_share"] > 0
+
+
+def test_session_stops_calling_the_model_past_its_budget(ledger, monkeypatch):
+    monkeypatch.setattr(token_usage.configs.token_settings, "session_budget", 500)
+    runner = build_runner()
+
+    asyncio.run(run_turn(runner, "session-1"))
+    texts = asyncio.run(run_turn(runner, "session-1"))
+
+    assert texts == ["This conversation has reached its usage limit, please start a new conversation."]
+    assert ledger.session_total("session-1") == 540
+    # Other sessions keep their own budget
+    assert asyncio.run(run_turn(build_runner(), "session-2"))[-1] == "Here are the chairs."